@@ -0,0 +1,10 @@
+"""性能計測用のスクリプト群
+
+pyarrow が同名のパッケージ benchmarks を持つため、通常のパッケージとしてリポジトリ直下から実行する
+
+    python -m benchmarks.synthetic_dataset    # 合成データの作成(benchmarks/synthetic)
+    python -m benchmarks.page_pipeline        # ページ単位の計測と基準値との比較
+    python -m benchmarks.common_primitives    # src/common.py の関数の計測
+    python -m benchmarks.load_test            # 複数セッションの負荷試験
+
+"""
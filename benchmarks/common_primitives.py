@@ -0,0 +1,296 @@
+import os
+import sys
+import gc
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from pathlib import Path
+from datetime import datetime as dt
+import numpy as np
+import pandas as pd
+import src.common as cmn
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+BASEPATH = Path(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_PATH = BASEPATH.joinpath('output', 'common_primitives.json')    # 計測結果
+PLOT_PATH = BASEPATH.joinpath('output', 'common_primitives.png')    # スケーリング曲線
+SIZES = [10 ** i for i in range(1, 8)]    # 入力件数(10～10^7)
+BUDGET = 10.0    # 1回の計測がこの時間[s]を超えたらそれより大きい件数は計測しない
+MIN_TIME = 0.2    # 1件数あたりの計測時間の下限[s](短いときは繰り返して最短を取る)
+FIT_FROM = 1000    # スケーリング指数の算出に用いる最小の件数(呼び出しの固定費を除く)
+JOIN_DST_ROWS = 10_000    # 最近傍結合の結合先(気象観測点等)の行数
+LON_RANGE = (122.0, 154.0)    # 日本の経度の範囲
+LAT_RANGE = (20.0, 46.0)    # 日本の緯度の範囲
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def make_points(rng: np.random.Generator, n: int) -> tuple:
+    """入力点作成処理
+
+    Args:
+        rng (Generator): 乱数生成器
+        n (int): 件数
+
+    Returns:
+        tuple: 経度(ndarray), 緯度(ndarray)
+
+    """
+    return (rng.uniform(*LON_RANGE, n), rng.uniform(*LAT_RANGE, n))
+
+def make_cases(rng: np.random.Generator) -> dict:
+    """計測対象作成処理
+
+    スカラー版(Pythonのループで1件ずつ呼ぶ)と配列版を対にして、同じ入力で計測する
+    各計測対象は件数を受け取って入力を作り、その入力で計測する関数(引数なし)を返す
+
+    Args:
+        rng (Generator): 乱数生成器
+
+    Returns:
+        dict: 計測対象名 → 入力作成関数
+
+    """
+    def points(n):
+        return make_points(rng, n)
+
+    def meshes(n):
+        (lon, lat) = points(n)
+        return cmn.calc_grid_array(lon, lat, level=3)
+
+    def haversine_scalar(n):
+        (lon, lat) = points(n)
+        args = list(zip(lat.tolist(), lon.tolist()))
+        return lambda: [cmn.haversine(la, 38.0, lo, 140.0) for la, lo in args]
+
+    def haversine_array(n):
+        (lon, lat) = points(n)
+        return lambda: cmn.haversine(lat, 38.0, lon, 140.0)
+
+    def grid3rd_scalar(n):
+        args = list(zip(*[a.tolist() for a in points(n)]))
+        return lambda: [cmn.calc_grid3rd(lo, la) for lo, la in args]
+
+    def grid1st_scalar(n):
+        args = list(zip(*[a.tolist() for a in points(n)]))
+        return lambda: [cmn.calc_grid1st(lo, la) for lo, la in args]
+
+    def grid_array(n):
+        (lon, lat) = points(n)
+        return lambda: cmn.calc_grid_array(lon, lat, level=3)
+
+    def grid2lonlat_scalar(n):
+        codes = meshes(n).tolist()
+        return lambda: [cmn.calc_grid2lonlat(code) for code in codes]
+
+    def grid2bounds_array(n):
+        codes = meshes(n)
+        return lambda: cmn.calc_grid2bounds_array(codes)
+
+    def next2point_scalar(n):
+        codes = meshes(n).tolist()
+        return lambda: [cmn.calc_next2point(code, right=True, up=True) for code in codes]
+
+    def next2point_array(n):
+        codes = meshes(n)
+        return lambda: cmn.calc_next2point_array(codes, dlon=1, dlat=1)
+
+    def abc_scalar(n):
+        ratios = np.sort(rng.random(n)).tolist()
+        return lambda: [cmn.abc_categorizer(ratio) for ratio in ratios]
+
+    def abc_vectorize(n):
+        ratios = np.sort(rng.random(n))
+        categorize = np.vectorize(cmn.abc_categorizer, otypes=[object])
+        return lambda: categorize(ratios)
+
+    def combin(n):
+        (lon, lat) = points(n)
+        src = pd.DataFrame({'lat': lat, 'lon': lon})
+        (dst_lon, dst_lat) = make_points(np.random.default_rng(0), JOIN_DST_ROWS)
+        dst = pd.DataFrame({'lat': dst_lat, 'lon': dst_lon, 'value': np.arange(JOIN_DST_ROWS)})
+        cmn.data_combin_b2w_2p_in_latlon(src.head(1), dst, ['value'])    # BallTreeを作成済みにする
+        return lambda: cmn.data_combin_b2w_2p_in_latlon(src, dst, ['value'])
+
+    return {
+        'haversine[scalar]': haversine_scalar,
+        'haversine[array]': haversine_array,
+        'calc_grid1st[scalar]': grid1st_scalar,
+        'calc_grid3rd[scalar]': grid3rd_scalar,
+        'calc_grid_array': grid_array,
+        'calc_grid2lonlat[scalar]': grid2lonlat_scalar,
+        'calc_grid2bounds_array': grid2bounds_array,
+        'calc_next2point[scalar]': next2point_scalar,
+        'calc_next2point_array': next2point_array,
+        'abc_categorizer[scalar]': abc_scalar,
+        'abc_categorizer[np.vectorize]': abc_vectorize,
+        'data_combin_b2w_2p_in_latlon': combin
+    }
+
+def measure(func, min_time: float=MIN_TIME) -> dict:
+    """計測処理
+
+    Args:
+        func (callable): 計測する関数(引数なし)
+        min_time (float): 計測時間の下限[s]
+
+    Returns:
+        dict: seconds(最短の1回の時間[s]), repeat(繰り返し回数), peak_bytes(1回の最大メモリ確保量)
+
+    """
+    gc.collect()
+    times = []
+    total = 0.0
+    while total < min_time or not times:
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+
+    # メモリの追跡は実行を遅くするため、時間とは別の1回で計測する
+    tracemalloc.start()
+    try:
+        func()
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': min(times), 'repeat': len(times), 'peak_bytes': peak}
+
+def scaling_exponent(sizes: list, seconds: list, fit_from: int=FIT_FROM):
+    """スケーリング指数算出処理
+
+    log(時間) = k × log(件数) + c の k を最小二乗法で求める(1で線形、1より大きいと超線形)
+
+    Args:
+        sizes (list): 件数
+        seconds (list): 時間[s]
+        fit_from (int): 算出に用いる最小の件数
+
+    Returns:
+        float | None: スケーリング指数(2点未満のときNone)
+
+    """
+    points = [(n, t) for n, t in zip(sizes, seconds) if n >= fit_from and t > 0]
+    if len(points) < 2:
+        points = [(n, t) for n, t in zip(sizes, seconds) if t > 0]
+    if len(points) < 2:
+        return None
+
+    (n, t) = np.log(np.array(points, dtype=np.float64)).T
+    return float(np.polyfit(n, t, 1)[0])
+
+def run(cases: list=None, sizes: list=SIZES, budget: float=BUDGET, seed: int=0) -> dict:
+    """全計測処理
+
+    Args:
+        cases (list): 計測対象名(Noneのとき全て)
+        sizes (list): 入力件数
+        budget (float): 1回の計測がこの時間[s]を超えたらそれより大きい件数は計測しない
+        seed (int): 乱数のシード
+
+    Returns:
+        dict: 計測対象名 → sizes, seconds, throughput, peak_bytes, exponent, skipped
+
+    """
+    factories = make_cases(np.random.default_rng(seed))
+    results = {}
+    for name in cases or list(factories):
+        record = {'sizes': [], 'seconds': [], 'throughput': [], 'peak_bytes': [], 'skipped': []}
+        for n in sizes:
+            if record['seconds'] and record['seconds'][-1] * n / record['sizes'][-1] > budget:
+                # 直前の件数からの線形の見積もりで予算を超える件数は計測しない
+                record['skipped'].append(n)
+                continue
+
+            stats = measure(factories[name](n))
+            record['sizes'].append(n)
+            record['seconds'].append(stats['seconds'])
+            record['throughput'].append(n / stats['seconds'])
+            record['peak_bytes'].append(stats['peak_bytes'])
+            print(
+                f'{name:32s} n={n:>9,d} {stats["seconds"] * 1000:12.3f}ms '
+                f'{n / stats["seconds"]:14,.0f}/s peak={stats["peak_bytes"] / 2 ** 20:9.1f}MB',
+                flush=True
+            )
+
+        record['exponent'] = scaling_exponent(record['sizes'], record['seconds'])
+        results[name] = record
+
+    return results
+
+def plot(results: dict, path: Path=PLOT_PATH):
+    """スケーリング曲線描画処理
+
+    Args:
+        results (dict): run の返り値
+        path (Path): 出力先の画像パス
+
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    (fig, (left, right)) = plt.subplots(1, 2, figsize=(14, 6))
+    for name, record in results.items():
+        style = '--' if '[scalar]' in name else '-'
+        left.loglog(record['sizes'], record['seconds'], style, marker='o', label=name)
+        right.loglog(record['sizes'], record['throughput'], style, marker='o', label=name)
+    left.set_xlabel('n')
+    left.set_ylabel('seconds')
+    right.set_xlabel('n')
+    right.set_ylabel('items / s')
+    right.legend(fontsize='small')
+    fig.tight_layout()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(path, dpi=100)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='src/common.py の地理計算の件数に対するスケーリングを計測する')
+    parser.add_argument('--cases', nargs='+', default=None, help='計測対象(既定は全て)')
+    parser.add_argument('--max-size', type=int, default=SIZES[-1], help='最大の入力件数')
+    parser.add_argument('--budget', type=float, default=BUDGET, help='1回の計測時間の上限[s]')
+    parser.add_argument('--seed', type=int, default=0, help='乱数のシード')
+    parser.add_argument('--output', default=str(OUTPUT_PATH), help='計測結果のJSON')
+    parser.add_argument('--plot', action='store_true', help='スケーリング曲線の画像も出力する')
+    args = parser.parse_args()
+
+    results = run(
+        cases=args.cases,
+        sizes=[n for n in SIZES if n <= args.max_size],
+        budget=args.budget,
+        seed=args.seed
+    )
+    print()
+    for name, record in results.items():
+        exponent = '-' if record['exponent'] is None else f'{record["exponent"]:.2f}'
+        best = max(record['throughput']) if record['throughput'] else 0
+        print(f'{name:32s} exponent={exponent:>5s} max throughput={best:14,.0f}/s')
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        json.dumps(
+            {
+                'meta': {
+                    'created_at': dt.now().isoformat(timespec='seconds'),
+                    'python': sys.version.split()[0],
+                    'platform': platform.platform(),
+                    'cpu_count': os.cpu_count(),
+                    'numpy': np.__version__,
+                    'pandas': pd.__version__
+                },
+                'results': results
+            },
+            ensure_ascii=False,
+            indent=1
+        ),
+        encoding='utf-8'
+    )
+    if args.plot:
+        plot(results)
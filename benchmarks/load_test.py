@@ -0,0 +1,589 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import platform
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from datetime import datetime as dt
+
+BASEPATH = Path(os.path.dirname(os.path.abspath(__file__)))
+APP_ROOT = BASEPATH.parent
+# 解析結果・目撃情報の参照先は src の読み込み時に決まるため、既定では合成データを参照させる
+os.environ.setdefault('WHM_DATA_ROOT', str(BASEPATH.joinpath('synthetic')))
+
+import numpy as np
+import pandas as pd
+import requests
+from tornado.websocket import websocket_connect
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ClientState_pb2 import ClientState
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+import src.store.result_store as rs
+import src.geo.geocoder as gc
+import benchmarks.synthetic_dataset as sd
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+OUTPUT_PATH = BASEPATH.joinpath('output', 'load_test.json')    # 計測結果
+SERVER_LOG_PATH = BASEPATH.joinpath('output', 'load_test_server.log')    # 起動したサーバの出力
+LOAD_SCALE = {    # 合成データがないときに作成する規模(東北6県・本番相当のメッシュ数)
+    'prefectures': 6,
+    'meshes': 8000,
+    'periods': 3,
+    'horizons': 2,
+    'sightings_per_year': 50000,
+    'seed': 0
+}
+PAGES = {    # ページ名 → スクリプトのパス(app.pyからの相対パス)
+    'macro': 'pages/macro_wild_hazard_map.py',
+    'micro': 'pages/micro_wild_hazard_map.py',
+    'alarm': 'pages/alarm_list.py',
+    'statistics': 'pages/statistics_information.py',
+    'sighting': 'pages/sighting_information.py'
+}
+DEFAULT_PAGES = ['macro', 'micro', 'alarm']
+CHANGED_LABELS = ['基準期間', '予測選択', '選択地域', '範囲選択']    # 操作ごとに変更する選択項目
+ADDRESS_LABEL = '調査対象の所在地を教えて下さい'
+WIDGET_VALUES = {    # 部品の種類 → 部品の値を送る項目
+    'selectbox': 'int_value',
+    'text_input': 'string_value',
+    'button': 'trigger_value'
+}
+SESSIONS = 8    # 同時セッション数
+ITERATIONS = 5    # 1セッションあたりのページ操作回数
+THINK_TIME = 1.0    # 操作間の待ち時間の上限[s](0～上限の一様乱数)
+RAMP_TIME = 0.0    # 全セッションを開始し終えるまでの時間[s](0で一斉に開始する)
+RUN_TIMEOUT = 120.0    # 1回のスクリプト実行の応答待ちの上限[s]
+STARTUP_TIMEOUT = 60.0    # サーバの起動待ちの上限[s]
+RSS_INTERVAL = 0.5    # RSSの記録間隔[s]
+LATEST_WEIGHT = 0.7    # 最新の基準期間を選ぶ確率(週明けは最新の期間に集中する)
+NO_PREDICT_WEIGHT = 0.6    # 予測しないを選ぶ確率
+PERCENTILES = [50, 95, 99]
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class RssSampler:
+    """RSS記録処理
+
+    別スレッドで一定間隔ごとにプロセスの常駐メモリ量を記録する
+
+    Args:
+        pid (int): 対象のプロセスID
+        interval (float): 記録間隔[s]
+
+    """
+    def __init__(self, pid: int, interval: float=RSS_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> list:
+        """記録終了処理
+
+        Returns:
+            list: (開始からの経過時間[s], RSS[byte])の一覧
+
+        """
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while True:
+            if (rss := rss_bytes(self.pid)) is not None:
+                self.samples.append((time.perf_counter() - self._start, rss))
+            if self._stop.wait(self.interval):
+                return
+
+class Session:
+    """模擬セッション
+
+    ブラウザと同じくWebSocketでサーバへ接続し、ログインしたのち、ページの切り替え、
+    選択項目の変更、決定ボタンの押下を繰り返す
+    選択項目を変更するたびにスクリプトの再実行を依頼し、実行完了の通知までの時間を記録する
+
+    Args:
+        number (int): セッション番号(乱数のシードにも用いる)
+        url (str): サーバのURL
+        credentials (tuple): ログイン画面から入力する(ユーザID, パスワード)
+        pages (list): 操作するページ名
+        addresses (list): ミクロマップで入力する住所
+        iterations (int): ページ操作回数
+        think_time (float): 操作間の待ち時間の上限[s]
+
+    """
+    def __init__(
+        self,
+        number: int,
+        url: str,
+        credentials: tuple,
+        pages: list,
+        addresses: list,
+        iterations: int = ITERATIONS,
+        think_time: float = THINK_TIME
+    ):
+        self.number = number
+        self.url = url
+        self.credentials = credentials
+        self.pages = pages
+        self.addresses = addresses
+        self.iterations = iterations
+        self.think_time = think_time
+        self.rng = random.Random(number)
+        self.records = []    # (ページ名, 操作, 開始時刻[s], 時間[s], エラー)
+        self._page_hashes = {}    # ページ名 → ページのハッシュ
+        self._page_hash = ''    # 表示中のページのハッシュ
+        self._widgets = {}    # 直前の実行で表示された部品のラベル → (種類, 部品)
+        self._values = {}    # 変更した部品のラベル → 部品の値
+
+    async def run(self, start: float, delay: float=0.0):
+        """操作処理
+
+        Args:
+            start (float): 負荷試験の開始時刻(time.perf_counter)
+            delay (float): 開始までの待ち時間[s]
+
+        """
+        await asyncio.sleep(delay)
+        self._start = start
+        self._ws = await websocket_connect(
+            self.url.replace('http', 'ws', 1).rstrip('/') + '/_stcore/stream',
+            subprotocols=['streamlit'],
+            max_message_size=1 << 30
+        )
+        try:
+            if not await self._rerun('app', 'open'):
+                return
+            if not await self._login():
+                return
+
+            for _ in range(self.iterations):
+                await self._operate(self.rng.choice(self.pages))
+        finally:
+            self._ws.close()
+
+    async def _login(self) -> bool:
+        (userid, password) = self.credentials
+        self._input('ユーザーID', userid)
+        self._input('パスワード', password)
+        if not await self._rerun('app', 'login', trigger='ログイン'):
+            return False
+        if 'ログイン' in self._widgets:
+            # ログインできたときはメニューへ切り替わる
+            (page, action, at, seconds, _) = self.records[-1]
+            self.records[-1] = (page, action, at, seconds, 'ログインできませんでした')
+            return False
+
+        return True
+
+    async def _operate(self, page: str):
+        # ページを切り替え、選択項目を変更して決定ボタンを押す
+        if not await self._rerun(page, 'open', switch=True):
+            return
+
+        for label in CHANGED_LABELS:
+            if label not in self._widgets:
+                continue
+            await self._think()
+            (_, widget) = self._widgets[label]
+            options = list(widget.options)
+            self._values[label] = (widget.id, options.index(self._choose(label, options)))
+            if not await self._rerun(page, 'change'):
+                return
+
+        if ADDRESS_LABEL in self._widgets:
+            self._input(ADDRESS_LABEL, self.rng.choice(self.addresses))
+
+        await self._think()
+        if '決定' in self._widgets:
+            await self._rerun(page, 'decide', trigger='決定')
+
+    def _choose(self, label: str, options: list) -> str:
+        match label:
+            case '基準期間':
+                return options[-1] if self.rng.random() < LATEST_WEIGHT else self.rng.choice(options)
+            case '予測選択':
+                return options[0] if self.rng.random() < NO_PREDICT_WEIGHT else self.rng.choice(options[1:])
+            case '選択地域':
+                # 住所の一覧にある(合成データのある)都道府県を選ぶ
+                regions = [option for option in options if any(a.startswith(option) for a in self.addresses)]
+                return self.rng.choice(regions or options)
+            case _:
+                return self.rng.choice(options)
+
+    def _input(self, label: str, value: str):
+        if (widget := self._widgets.get(label)) is not None:
+            self._values[label] = (widget[1].id, value)
+
+    async def _rerun(self, page: str, action: str, switch: bool=False, trigger: str=None) -> bool:
+        # スクリプトの再実行を依頼し、実行が完了するまでの時間を記録する(エラーのときFalse)
+        state = ClientState()
+        if switch:
+            # ページの切り替え時はブラウザと同じく部品の値を送らない
+            state.page_script_hash = self._page_hashes[page]
+            state.page_name = Path(PAGES[page]).stem
+            self._values = {}
+        else:
+            # 再実行の依頼には表示中のページを含める(含めないとメインページが実行される)
+            state.page_script_hash = self._page_hash
+            for label, (kind, widget) in self._widgets.items():
+                if label == trigger:
+                    state.widget_states.widgets.append(WidgetState(id=widget.id, trigger_value=True))
+                elif (value := self._values.get(label)) is not None and value[0] == widget.id:
+                    widget_state = WidgetState(id=widget.id)
+                    setattr(widget_state, WIDGET_VALUES[kind], value[1])
+                    state.widget_states.widgets.append(widget_state)
+
+        message = BackMsg()
+        message.rerun_script.CopyFrom(state)
+        started = time.perf_counter()
+        error = None
+        try:
+            await self._ws.write_message(message.SerializeToString(), binary=True)
+            error = await asyncio.wait_for(self._receive(), RUN_TIMEOUT)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+
+        self.records.append((page, action, started - self._start, time.perf_counter() - started, error))
+        return error is None
+
+    async def _receive(self):
+        # 実行完了の通知まで受信し、表示された部品と例外を控える(ページ切り替えによる再実行は続けて待つ)
+        error = None
+        while True:
+            payload = await self._ws.read_message()
+            if payload is None:
+                raise ConnectionError('サーバとの接続が切れました')
+
+            message = ForwardMsg()
+            message.ParseFromString(payload)
+            match message.WhichOneof('type'):
+                case 'new_session':
+                    self._page_hashes = {
+                        page: app_page.page_script_hash
+                        for app_page in message.new_session.app_pages
+                        for page, path in PAGES.items() if app_page.page_name == Path(path).stem
+                    }
+                    self._page_hash = message.new_session.page_script_hash
+                    self._widgets = {}
+                case 'delta' if message.delta.WhichOneof('type') == 'new_element':
+                    element = message.delta.new_element
+                    kind = element.WhichOneof('type')
+                    if kind == 'exception':
+                        error = f'{element.exception.type}: {element.exception.message}'
+                    elif kind in WIDGET_VALUES:
+                        widget = getattr(element, kind)
+                        self._widgets[widget.label] = (kind, widget)
+                case 'script_finished':
+                    match message.script_finished:
+                        case ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                            continue
+                        case ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                            return error or 'スクリプトの実行に失敗しました'
+                        case _:
+                            return error
+
+    async def _think(self):
+        if self.think_time > 0:
+            await asyncio.sleep(self.rng.uniform(0, self.think_time))
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def rss_bytes(pid: int):
+    """RSS取得処理
+
+    Args:
+        pid (int): プロセスID
+
+    Returns:
+        int | None: 常駐メモリ量[byte](取得できないときNone)
+
+    """
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # /procがない環境では ps で取得する(kbyte)
+    try:
+        output = subprocess.run(['ps', '-o', 'rss=', '-p', str(pid)], capture_output=True, text=True).stdout
+        return int(output.strip()) * 1024
+    except (OSError, ValueError):
+        return None
+
+def start_server(port: int, env: dict, log_path: Path=SERVER_LOG_PATH) -> subprocess.Popen:
+    """サーバ起動処理
+
+    Args:
+        port (int): 待ち受けるポート番号
+        env (dict): サーバの環境変数
+        log_path (Path): サーバの出力先
+
+    Returns:
+        Popen: 起動したサーバのプロセス
+
+    """
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_path, 'wb') as log:
+        server = subprocess.Popen(
+            [
+                sys.executable, '-m', 'streamlit', 'run', str(APP_ROOT.joinpath('app.py')),
+                '--server.headless', 'true',
+                '--server.port', str(port),
+                '--server.fileWatcherType', 'none',
+                '--browser.gatherUsageStats', 'false'
+            ],
+            cwd=APP_ROOT,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT
+        )
+
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'サーバが終了しました: {log_path}')
+        try:
+            if requests.get(f'http://127.0.0.1:{port}/_stcore/health', timeout=1).ok:
+                return server
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+
+    server.terminate()
+    raise RuntimeError(f'サーバが起動しませんでした: {log_path}')
+
+def free_port() -> int:
+    """空きポート取得処理
+
+    Returns:
+        int: ポート番号
+
+    """
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def load_addresses(csvpath: Path=gc.GAZETTEER_PATH) -> list:
+    """住所一覧取得処理
+
+    ミクロマップで入力する住所として地名辞書の市区町村(なければ都道府県)を用いる
+
+    Args:
+        csvpath (Path): 地名辞書のCSVパス
+
+    Returns:
+        list: 住所
+
+    """
+    gazetteer = pd.read_csv(csvpath, encoding='cp932', dtype=str).fillna('')
+    addresses = (gazetteer['pref_name'] + gazetteer['city_name']).tolist()
+    return [a for a, city in zip(addresses, gazetteer['city_name']) if city] or addresses
+
+async def run(
+    url: str,
+    credentials: tuple,
+    sessions: int = SESSIONS,
+    pages: list = DEFAULT_PAGES,
+    addresses: list = [],
+    iterations: int = ITERATIONS,
+    think_time: float = THINK_TIME,
+    ramp_time: float = RAMP_TIME
+) -> dict:
+    """負荷試験処理
+
+    Args:
+        url (str): サーバのURL
+        credentials (tuple): ログイン画面から入力する(ユーザID, パスワード)
+        sessions (int): 同時セッション数
+        pages (list): 操作するページ名
+        addresses (list): ミクロマップで入力する住所
+        iterations (int): 1セッションあたりのページ操作回数
+        think_time (float): 操作間の待ち時間の上限[s]
+        ramp_time (float): 全セッションを開始し終えるまでの時間[s]
+
+    Returns:
+        dict: records(各実行の記録)、elapsed(全体の時間[s])
+
+    """
+    workers = [
+        Session(number, url, credentials, pages, addresses, iterations, think_time)
+        for number in range(sessions)
+    ]
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *[
+            session.run(start, ramp_time * session.number / max(sessions - 1, 1))
+            for session in workers
+        ],
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+
+    records = [
+        {'session': session.number, 'page': page, 'action': action, 'at': at, 'seconds': seconds, 'error': error}
+        for session in workers
+        for page, action, at, seconds, error in session.records
+    ]
+    # 接続できなかったセッション
+    records += [
+        {'session': session.number, 'page': 'app', 'action': 'connect', 'at': 0.0, 'seconds': 0.0, 'error': repr(outcome)}
+        for session, outcome in zip(workers, outcomes) if isinstance(outcome, Exception)
+    ]
+    return {'records': records, 'elapsed': elapsed}
+
+def summarize(records: list) -> dict:
+    """集計処理
+
+    Args:
+        records (list): 各実行の記録
+
+    Returns:
+        dict: ページ名 → 操作 → count, errors, mean, p50, p95, p99, max
+
+    """
+    df = pd.DataFrame(records, columns=['session', 'page', 'action', 'at', 'seconds', 'error'])
+    summary = {}
+    for (page, action), group in df.groupby(['page', 'action'], sort=False):
+        seconds = group['seconds'].to_numpy()
+        stats = {
+            'count': len(group),
+            'errors': int(group['error'].notna().sum()),
+            'mean': float(seconds.mean())
+        }
+        stats.update({f'p{q}': float(np.percentile(seconds, q)) for q in PERCENTILES})
+        stats['max'] = float(seconds.max())
+        summary.setdefault(page, {})[action] = stats
+
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='複数の同時セッションでページを操作し、応答時間とサーバのRSSを計測する',
+        epilog='リポジトリ直下から python -m benchmarks.load_test として実行する'
+    )
+    parser.add_argument('--url', default=None, help='起動済みのサーバのURL(省略時は合成データでサーバを起動する)')
+    parser.add_argument('--pid', type=int, default=None, help='起動済みのサーバのプロセスID(RSSの記録に用いる)')
+    parser.add_argument('--sessions', type=int, default=SESSIONS, help='同時セッション数')
+    parser.add_argument('--pages', nargs='+', default=DEFAULT_PAGES, choices=list(PAGES), help='操作するページ')
+    parser.add_argument('--iterations', type=int, default=ITERATIONS, help='1セッションあたりのページ操作回数')
+    parser.add_argument('--think-time', type=float, default=THINK_TIME, help='操作間の待ち時間の上限[s]')
+    parser.add_argument('--ramp-time', type=float, default=RAMP_TIME, help='全セッションを開始し終えるまでの時間[s]')
+    parser.add_argument('--rss-interval', type=float, default=RSS_INTERVAL, help='RSSの記録間隔[s]')
+    parser.add_argument('--userid', default=os.environ.get('WHM_LOADTEST_USER'), help='ログインするユーザID')
+    parser.add_argument('--password', default=os.environ.get('WHM_LOADTEST_PASSWORD'), help='ログインするパスワード')
+    parser.add_argument('--use-gsi', action='store_true', help='起動するサーバの住所の変換に国土地理院APIも用いる')
+    parser.add_argument('--output', default=str(OUTPUT_PATH), help='計測結果のJSON')
+    args = parser.parse_args()
+    if not (args.userid and args.password):
+        parser.error('--userid, --password(または WHM_LOADTEST_USER, WHM_LOADTEST_PASSWORD)を指定してください')
+
+    server = None
+    url = args.url
+    pid = args.pid
+    data_root = rs.DATA_ROOT
+    if url is None:
+        # 合成データがなければ作成する
+        if not rs.RESULTS_ROOT.exists():
+            print(f'合成データを作成します: {data_root}')
+            sd.generate(data_root, **LOAD_SCALE)
+
+        env = dict(os.environ)
+        if not args.use_gsi:
+            env['WHM_GEOCODER'] = 'gazetteer'    # 負荷試験で国土地理院APIを呼ばない
+        port = free_port()
+        server = start_server(port, env)
+        url = f'http://127.0.0.1:{port}'
+        pid = server.pid
+
+    sampler = None
+    if pid is not None:
+        sampler = RssSampler(pid, args.rss_interval)
+        sampler.start()
+
+    try:
+        addresses = load_addresses() if gc.GAZETTEER_PATH.exists() else []
+        result = asyncio.run(
+            run(
+                url,
+                (args.userid, args.password),
+                sessions=args.sessions,
+                pages=args.pages,
+                addresses=addresses or ['東京都'],
+                iterations=args.iterations,
+                think_time=args.think_time,
+                ramp_time=args.ramp_time
+            )
+        )
+    finally:
+        rss_samples = sampler.stop() if sampler is not None else []
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    summary = summarize(result['records'])
+    for page, actions in summary.items():
+        for action, stats in actions.items():
+            print(
+                f'{page:10s} {action:7s} n={stats["count"]:4d} errors={stats["errors"]:3d} ' +
+                ' '.join(f'p{q}={stats[f"p{q}"] * 1000:8.1f}ms' for q in PERCENTILES) +
+                f' max={stats["max"] * 1000:8.1f}ms'
+            )
+    if rss_samples:
+        rss = [value for _, value in rss_samples]
+        print(f'RSS start={rss[0] / 2 ** 20:.0f}MB peak={max(rss) / 2 ** 20:.0f}MB end={rss[-1] / 2 ** 20:.0f}MB')
+    print(f'elapsed={result["elapsed"]:.1f}s')
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        json.dumps(
+            {
+                'meta': {
+                    'created_at': dt.now().isoformat(timespec='seconds'),
+                    'url': url if server is None else None,
+                    'data_root': str(data_root) if server is not None else None,
+                    'sessions': args.sessions,
+                    'pages': args.pages,
+                    'iterations': args.iterations,
+                    'think_time': args.think_time,
+                    'ramp_time': args.ramp_time,
+                    'python': sys.version.split()[0],
+                    'platform': platform.platform(),
+                    'cpu_count': os.cpu_count()
+                },
+                'summary': summary,
+                'rss': rss_samples,
+                'elapsed': result['elapsed'],
+                'records': result['records']
+            },
+            ensure_ascii=False,
+            indent=1
+        ),
+        encoding='utf-8'
+    )
+
+    errors = [record for record in result['records'] if record['error'] is not None]
+    for record in errors:
+        print(f'エラー: session={record["session"]} {record["page"]} {record["action"]}: {record["error"]}')
+    if errors:
+        sys.exit(1)
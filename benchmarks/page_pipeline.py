@@ -0,0 +1,288 @@
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+from pathlib import Path
+from datetime import datetime as dt
+
+BASEPATH = Path(os.path.dirname(os.path.abspath(__file__)))
+# 解析結果・目撃情報の参照先は src の読み込み時に決まるため、既定では合成データを参照させる
+os.environ.setdefault('WHM_DATA_ROOT', str(BASEPATH.joinpath('synthetic')))
+# 住所の変換は地名辞書のみで行い(通信を除く)、計測記録のログは計測側で受け取る
+os.environ.setdefault('WHM_GEOCODER', 'gazetteer')
+os.environ.setdefault('WHM_TRACE_LOG', 'off')
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+import src.common as cmn
+import src.store.result_loader as rl
+import src.store.result_catalog as rc
+import src.store.result_store as rs
+import src.store.sighting_rollup as srl
+import src.monitoring.tracing as tr
+import benchmarks.synthetic_dataset as sd
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+OUTPUT_PATH = BASEPATH.joinpath('output', 'page_pipeline.json')    # 計測結果
+BASELINE_PATH = BASEPATH.joinpath('baseline', 'page_pipeline.json')    # 比較の基準とする計測結果
+PAGES_ROOT = BASEPATH.parent.joinpath('pages')
+BENCH_SCALE = {    # 合成データがないときに作成する規模(東北6県・本番相当のメッシュ数)
+    'prefectures': 6,
+    'meshes': 8000,
+    'periods': 3,
+    'horizons': 2,
+    'sightings_per_year': 50000,
+    'seed': 0
+}
+REPEAT = 5    # 計測回数(各回の前にキャッシュを空にする)
+WARMUP = 1    # 集計から除く最初の回数(CSVの取り込み等)
+THRESHOLD = 0.20    # 基準からの悪化とみなす中央値の増加率
+MIN_DELTA = 0.005    # 悪化とみなす中央値の増加量の下限[s](計測の揺らぎを除く)
+MICRO_RADIUS = '10km'    # ミクロハザードマップの範囲
+RUN_TIMEOUT = 300.0    # 1回のスクリプト実行の待ち時間の上限[s]
+ADDRESS_LABEL = '調査対象の所在地を教えて下さい'
+PIPELINES = {    # 計測名 → (ページのスクリプト, 計測条件から選択項目の値を作る関数)
+    'macro[Plotly]': ('macro_wild_hazard_map.py', lambda p: _map_choices(p, 'Plotly')),
+    'macro[deck.gl]': ('macro_wild_hazard_map.py', lambda p: _map_choices(p, 'deck.gl')),
+    'micro[Plotly]': ('micro_wild_hazard_map.py', lambda p: _map_choices(p, 'Plotly', micro=True)),
+    'micro[deck.gl]': ('micro_wild_hazard_map.py', lambda p: _map_choices(p, 'deck.gl', micro=True)),
+    'alarm': ('alarm_list.py', lambda p: _map_choices(p, None)),
+    'statistics': ('statistics_information.py', lambda p: {'対象生物': p['animal'], '選択地域': p['prefname']}),
+    'sighting': ('sighting_information.py', lambda p: {'対象生物': p['animal'], '選択地域': '全国'})
+}
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class TraceCollector(logging.Handler):
+    """計測記録収集処理
+
+    ページが src.monitoring.tracing で出力する計測記録(1行のJSON)を受け取って保持する
+
+    """
+    def __init__(self):
+        super().__init__()
+        self.traces = []
+
+    def emit(self, record: logging.LogRecord):
+        self.traces.append(json.loads(record.getMessage()))
+
+    def attach(self):
+        """計測記録のログへの接続処理(WHM_TRACE_LOG=off でも受け取る)"""
+        tr.logger.disabled = False
+        tr.logger.setLevel(logging.INFO)
+        tr.logger.addHandler(self)
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def default_params() -> dict:
+    """計測条件作成処理
+
+    解析結果カタログの最新の基準期間、先頭の対象生物・都道府県を計測対象とする
+    ミクロハザードマップの住所は都道府県名(地名辞書の代表点)とする
+
+    Returns:
+        dict: 計測条件
+
+    """
+    period = rc.RESULT_CATALOG.periods()[-1]
+    animal = rc.RESULT_CATALOG.animals(period)[0]
+    prefname = next(iter(cmn.PREF_NAMW_VS_CODE))
+
+    return {
+        'period': period,
+        'animal': animal,
+        'horizon': rl.NO_PREDICT,
+        'prefname': prefname,
+        'address': prefname,
+        'radius': MICRO_RADIUS
+    }
+
+def run_page(script: str, choices: dict, collector: TraceCollector) -> dict:
+    """ページ実行処理
+
+    実際のページのスクリプトを AppTest で実行し、選択項目を設定して決定ボタンを押す
+
+    Args:
+        script (str): pages配下のスクリプト名
+        choices (dict): 選択項目のラベル → 値(住所の入力欄はADDRESS_LABEL)
+        collector (TraceCollector): 計測記録収集処理
+
+    Returns:
+        dict: 段階 → 時間[s](total は決定ボタン押下後の再実行全体、他はページの計測記録の処理段階)
+
+    """
+    app = AppTest.from_file(str(PAGES_ROOT.joinpath(script)), default_timeout=RUN_TIMEOUT)
+    app.session_state['logged_in'] = True
+    app.run()
+    for label, value in choices.items():
+        if label == ADDRESS_LABEL:
+            next(widget for widget in app.text_input if widget.label == label).input(value)
+        else:
+            next(widget for widget in app.selectbox if widget.label == label).select(value)
+    app.run()
+
+    button = next(widget for widget in app.button if widget.label == '決定')
+    collector.traces.clear()
+    start = time.perf_counter()
+    button.click().run()
+    stages = {'total': time.perf_counter() - start}
+    if app.exception:
+        raise RuntimeError(f'{script}: {app.exception[0].message}')
+    if not collector.traces:
+        raise RuntimeError(f'{script}: 計測記録が出力されませんでした')
+
+    # 同じ名前の処理段階は合算する(入れ子の段階は親に含まれるため最上位のみ)
+    for span in collector.traces[-1]['spans']:
+        if span['depth'] == 0:
+            stages[span['name']] = stages.get(span['name'], 0.0) + span['ms'] / 1000
+
+    return stages
+
+def measure(pipelines: list, params: dict, repeat: int=REPEAT, warmup: int=WARMUP) -> dict:
+    """計測処理
+
+    各回の前に解析結果キャッシュと出没頭数ロールアップを空にし、
+    実際のページで決定ボタンを押したときの処理を計測する
+    メッシュ形状は本番と同様に破棄しない(最初の回で作成される)
+
+    Args:
+        pipelines (list): 計測するページ(PIPELINES のキー)
+        params (dict): 計測条件
+        repeat (int): 計測回数
+        warmup (int): 集計から除く最初の回数
+
+    Returns:
+        dict: ページ → 段階 → 統計量(median, min, max[s])
+
+    """
+    collector = TraceCollector()
+    collector.attach()
+    results = {}
+    for name in pipelines:
+        (script, make_choices) = PIPELINES[name]
+        runs = []
+        for i in range(warmup + repeat):
+            rl.RESULT_CACHE.clear()
+            srl.SIGHTING_ROLLUP.clear()
+            stages = run_page(script, make_choices(params), collector)
+            if i >= warmup:
+                runs.append(stages)
+
+        results[name] = {
+            stage: {
+                'median': float(np.median([run[stage] for run in runs])),
+                'min': float(np.min([run[stage] for run in runs])),
+                'max': float(np.max([run[stage] for run in runs]))
+            }
+            for stage in runs[0]
+        }
+
+    return results
+
+def compare(current: dict, baseline: dict, threshold: float=THRESHOLD, min_delta: float=MIN_DELTA) -> list:
+    """基準との比較処理
+
+    Args:
+        current (dict): 今回の計測結果(measure の返り値)
+        baseline (dict): 基準の計測結果
+        threshold (float): 悪化とみなす中央値の増加率
+        min_delta (float): 悪化とみなす中央値の増加量の下限[s]
+
+    Returns:
+        list: 悪化した(ページ, 段階, 基準[s], 今回[s], 増加率)
+
+    """
+    regressions = []
+    for name, stages in current.items():
+        for stage, stats in stages.items():
+            base = baseline.get(name, {}).get(stage)
+            if base is None:
+                continue
+            delta = stats['median'] - base['median']
+            ratio = delta / base['median'] if base['median'] > 0 else np.inf
+            if ratio > threshold and delta > min_delta:
+                regressions.append((name, stage, base['median'], stats['median'], ratio))
+
+    return regressions
+
+def _map_choices(params: dict, renderer: str, micro: bool=False) -> dict:
+    # 解析結果を表示するページの選択項目(警報一覧は描画方式なし、ミクロは地域の代わりに住所と範囲)
+    choices = {'基準期間': params['period'], '予測選択': params['horizon'], '対象生物': params['animal']}
+    if renderer is not None:
+        choices['描画方式'] = renderer
+    if micro:
+        choices[ADDRESS_LABEL] = params['address']
+        choices['範囲選択'] = params['radius']
+    else:
+        choices['選択地域'] = params['prefname']
+
+    return choices
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='各ページを実行して処理段階別に計測し、基準と比較する',
+        epilog='リポジトリ直下から python -m benchmarks.page_pipeline として実行する'
+    )
+    parser.add_argument('--pages', nargs='+', default=list(PIPELINES), choices=list(PIPELINES), help='計測するページ')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='計測回数')
+    parser.add_argument('--warmup', type=int, default=WARMUP, help='集計から除く最初の回数')
+    parser.add_argument('--output', default=str(OUTPUT_PATH), help='計測結果のJSON')
+    parser.add_argument('--baseline', default=str(BASELINE_PATH), help='基準の計測結果のJSON')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='悪化とみなす中央値の増加率')
+    parser.add_argument('--update-baseline', action='store_true', help='今回の計測結果を基準として保存する')
+    args = parser.parse_args()
+
+    # 合成データがなければ作成する
+    data_root = rs.DATA_ROOT
+    if not rs.RESULTS_ROOT.exists():
+        print(f'合成データを作成します: {data_root}')
+        sd.generate(data_root, **BENCH_SCALE)
+
+    params = default_params()
+    results = measure(args.pages, params, repeat=args.repeat, warmup=args.warmup)
+    report = {
+        'meta': {
+            'created_at': dt.now().isoformat(timespec='seconds'),
+            'data_root': str(data_root),
+            'params': params,
+            'repeat': args.repeat,
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__
+        },
+        'results': results
+    }
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding='utf-8')
+    for name, stages in results.items():
+        print(name, ', '.join(f'{stage}={stats["median"] * 1000:.1f}ms' for stage, stats in stages.items()))
+
+    baseline = Path(args.baseline)
+    if args.update_baseline:
+        baseline.parent.mkdir(parents=True, exist_ok=True)
+        baseline.write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding='utf-8')
+        print(f'基準を更新しました: {baseline}')
+    elif baseline.exists():
+        regressions = compare(
+            results,
+            json.loads(baseline.read_text(encoding='utf-8'))['results'],
+            threshold=args.threshold
+        )
+        for name, stage, base, current, ratio in regressions:
+            print(f'悪化: {name} {stage} {base * 1000:.1f}ms → {current * 1000:.1f}ms (+{ratio:.0%})')
+        if regressions:
+            sys.exit(1)
+        print('基準からの悪化はありません')
+    else:
+        print(f'基準がないため比較を省略しました: {baseline}')
@@ -0,0 +1,416 @@
+import os
+import time
+import argparse
+from pathlib import Path
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import src.common as cmn
+import src.utility.const as const
+import src.store.result_store as rs
+import src.store.result_catalog as rc
+import src.store.sightings as sg
+import src.store.incremental_alerts as ia
+import src.geo.geocoder as gc
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+BASEPATH = Path(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_ROOT = BASEPATH.joinpath('synthetic')    # 既定の出力先(results/ と data/fauna/, data/gazetteer/ を作成する)
+PREFECTURES = [    # (都道府県コード, 都道府県名, 県庁所在地の緯度, 経度) 東北6県を先頭とする
+    (2, '青森県', 40.82, 140.74), (3, '岩手県', 39.70, 141.15), (4, '宮城県', 38.27, 140.87),
+    (5, '秋田県', 39.72, 140.10), (6, '山形県', 38.24, 140.36), (7, '福島県', 37.75, 140.47),
+    (1, '北海道', 43.06, 141.35), (8, '茨城県', 36.34, 140.45), (9, '栃木県', 36.57, 139.88),
+    (10, '群馬県', 36.39, 139.06), (11, '埼玉県', 35.86, 139.65), (12, '千葉県', 35.61, 140.12),
+    (13, '東京都', 35.69, 139.69), (14, '神奈川県', 35.45, 139.64), (15, '新潟県', 37.90, 139.02),
+    (16, '富山県', 36.70, 137.21), (17, '石川県', 36.59, 136.63), (18, '福井県', 36.07, 136.22),
+    (19, '山梨県', 35.66, 138.57), (20, '長野県', 36.65, 138.18), (21, '岐阜県', 35.39, 136.72),
+    (22, '静岡県', 34.98, 138.38), (23, '愛知県', 35.18, 136.91), (24, '三重県', 34.73, 136.51),
+    (25, '滋賀県', 35.00, 135.87), (26, '京都府', 35.02, 135.76), (27, '大阪府', 34.69, 135.52),
+    (28, '兵庫県', 34.69, 135.18), (29, '奈良県', 34.69, 135.83), (30, '和歌山県', 34.23, 135.17),
+    (31, '鳥取県', 35.50, 134.24), (32, '島根県', 35.47, 133.05), (33, '岡山県', 34.66, 133.93),
+    (34, '広島県', 34.40, 132.46), (35, '山口県', 34.19, 131.47), (36, '徳島県', 34.07, 134.56),
+    (37, '香川県', 34.34, 134.04), (38, '愛媛県', 33.84, 132.77), (39, '高知県', 33.56, 133.53),
+    (40, '福岡県', 33.61, 130.42), (41, '佐賀県', 33.25, 130.30), (42, '長崎県', 32.74, 129.87),
+    (43, '熊本県', 32.79, 130.74), (44, '大分県', 33.24, 131.61), (45, '宮崎県', 31.91, 131.42),
+    (46, '鹿児島県', 31.56, 130.56), (47, '沖縄県', 26.21, 127.68)
+]
+DEFAULT_SCALE = {    # 全国規模の既定値
+    'prefectures': 47,    # 都道府県数(東北6県から順に)
+    'meshes': 8000,    # 都道府県あたりの3次メッシュ数
+    'cities': 40,    # 都道府県あたりの市区町村数
+    'periods': 4,    # 基準期間数(基準日から1週間ずつ遡る)
+    'horizons': 9,    # 最新の基準期間の予測数(N週間先)
+    'animals': list(const.ANIMALS),
+    'sightings_per_year': 50000,    # 全国・全生物の年間出没件数
+    'years': 3,    # 出没情報の年数(基準日まで)
+    'seed': 0
+}
+ALERT_LEVELS = list(cmn.CATEGORY_VS_COLOR.keys())    # － < 安全 < 目撃 < 遭遇 < 襲撃
+ALERT_QUANTILES = [0.10, 0.70, 0.88, 0.97]    # 危険度の分位点で警報・注意報を区分する
+HOTSPOTS = 6    # 都道府県あたりの出没の多い地点数
+DRIFT = 0.15    # 1週間あたりの危険度の変動(標準偏差)
+MONTH_WEIGHTS = np.array([1, 1, 2, 4, 6, 8, 9, 8, 10, 12, 6, 2], dtype=np.float64)    # 月別の出没の多さ
+CATEGORY_WEIGHTS = [0.80, 0.10, 0.07, 0.03]    # cmn.RISK_CATEGORIES の出現割合
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def generate(output_root: Path=OUTPUT_ROOT, **scale) -> dict:
+    """合成データ作成処理
+
+    本番と同じ列・文字コードの results/ 配下(警報注意情報、diff、地域別警報注意報一覧、予測)と
+    data/fauna/全国危険生物出没情報一覧.csv、data/gazetteer/地名一覧.csv を乱数のシードから再現可能に作成する
+    メッシュは都道府県ごとに県庁所在地を中心とした重ならない3次メッシュの集まりとし、
+    市区町村は中心点に最も近いメッシュの集まり、危険度は出没の多い地点からの距離で決める
+
+    Args:
+        output_root (Path): 出力先のルートフォルダ
+        **scale: DEFAULT_SCALE の項目の上書き
+
+    Returns:
+        dict: 作成したファイル数、行数等の概要
+
+    """
+    scale = {**DEFAULT_SCALE, **scale}
+    output_root = Path(output_root)
+    rng = np.random.default_rng(scale['seed'])
+
+    meshes = build_meshes(rng, scale['prefectures'], scale['meshes'], scale['cities'])
+    sightings = build_sightings(rng, meshes, scale['animals'], scale['sightings_per_year'], scale['years'])
+    periods = build_periods(scale['periods'])
+
+    results_root = output_root.joinpath('results')
+    summary = {'results': 0, 'alert_rows': 0, 'sightings': len(sightings)}
+    for animal in scale['animals']:
+        # 生物ごとに危険度の場を作り、期間・予測ごとに少しずつ変動させる
+        risk = meshes['risk'] + rng.normal(0.0, 0.5, len(meshes))
+        previous = levels_from_risk(risk + rng.normal(0.0, DRIFT, len(meshes)))
+        for i, period in enumerate(periods):
+            risk = risk + rng.normal(0.0, DRIFT, len(meshes))
+            current = levels_from_risk(risk)
+            dirpath = results_root.joinpath(period, animal)
+            write_result_dir(dirpath, meshes, previous, current, sightings, animal, period)
+            summary['results'] += 1
+            summary['alert_rows'] += len(meshes)
+
+            if i == len(periods) - 1:
+                # 最新の基準期間のみ予測を作成する
+                forecast = risk
+                last = current
+                for week in range(1, scale['horizons'] + 1):
+                    forecast = forecast + rng.normal(0.0, DRIFT, len(meshes))
+                    levels = levels_from_risk(forecast)
+                    write_result_dir(
+                        dirpath.joinpath('predicted', f'{week}週間先'),
+                        meshes, last, levels, sightings, animal, shift_period(period, week)
+                    )
+                    last = levels
+                    summary['results'] += 1
+                    summary['alert_rows'] += len(meshes)
+            previous = current
+
+    fauna_path = output_root.joinpath('data', 'fauna', sg.SIGHTINGS_PATH.name)
+    fauna_path.parent.mkdir(parents=True, exist_ok=True)
+    sightings.drop(columns=['grid3rd']).to_csv(fauna_path, encoding=sg.CSV_ENCODING)
+    write_gazetteer(output_root.joinpath('data', 'gazetteer', gc.GAZETTEER_PATH.name), meshes)
+
+    return summary
+
+def build_meshes(rng: np.random.Generator, prefectures: int, meshes: int, cities: int) -> pd.DataFrame:
+    """メッシュ作成処理
+
+    Args:
+        rng (Generator): 乱数生成器
+        prefectures (int): 都道府県数
+        meshes (int): 都道府県あたりの3次メッシュ数
+        cities (int): 都道府県あたりの市区町村数
+
+    Returns:
+        DataFrame: 都道府県コード, 都道府県名, 市区町村コード, 市区町村名, grid3rd,
+            minlon, minlat, maxlon, maxlat, risk(危険度) の列を持つメッシュ
+
+    """
+    used = np.empty(0, dtype=np.int64)
+    frames = []
+    side = int(np.ceil(np.sqrt(meshes * 2)))
+    for prefcode, prefname, lat, lon in PREFECTURES[:prefectures]:
+        # 中心から近い順に、他の都道府県に割り当て済みでないメッシュを取る
+        # (隣接する都道府県に取られて足りないときは範囲を広げる)
+        center = cmn.calc_grid_array(lon, lat, level=3)
+        span = side
+        while True:
+            (dlat, dlon) = np.divmod(np.arange(span * span, dtype=np.int64), span)
+            (dlat, dlon) = (dlat - span // 2, dlon - span // 2)
+            candidates = cmn.calc_next2point_array(np.full(len(dlat), center), dlon=dlon, dlat=dlat)
+            candidates = candidates[np.argsort(dlat ** 2 + dlon ** 2, kind='stable')]
+            candidates = candidates[~np.isin(candidates, used)][:meshes]
+            if len(candidates) == meshes or span >= side * 8:
+                break
+            span *= 2
+        used = np.concatenate([used, candidates])
+
+        (lat_idx, lon_idx, _) = cmn.calc_grid2index_array(candidates)
+        coords = np.column_stack([lat_idx, lon_idx]).astype(np.float64)
+
+        # 市区町村は無作為に選んだ中心メッシュのボロノイ領域とする
+        seeds = coords[rng.choice(len(coords), size=min(cities, len(coords)), replace=False)]
+        city_idx = _nearest(coords, seeds)
+
+        # 危険度は出没の多い地点からの距離(3次メッシュ区画数)が近いほど高い
+        hotspots = coords[rng.choice(len(coords), size=min(HOTSPOTS, len(coords)), replace=False)]
+        distances = np.sqrt(((coords[:, np.newaxis, :] - hotspots[np.newaxis, :, :]) ** 2).sum(axis=2))
+        risk = np.log(np.exp(-distances / (side / 6)).sum(axis=1) + 1e-3)
+
+        (minlon, minlat, maxlon, maxlat) = cmn.calc_grid2bounds_array(candidates)
+        frames.append(pd.DataFrame({
+            '都道府県コード': prefcode,
+            '都道府県名': prefname,
+            '市区町村コード': prefcode * 1000 + 201 + city_idx,
+            '市区町村名': [f'{prefname[:-1]}第{i + 1:02d}市' for i in city_idx],
+            'grid3rd': candidates,
+            'minlon': minlon,
+            'minlat': minlat,
+            'maxlon': maxlon,
+            'maxlat': maxlat,
+            'risk': risk
+        }))
+
+    return pd.concat(frames, ignore_index=True)
+
+def build_sightings(
+    rng: np.random.Generator,
+    meshes: pd.DataFrame,
+    animals: list,
+    per_year: int,
+    years: int
+) -> pd.DataFrame:
+    """出没情報作成処理
+
+    出没地点は危険度の高いメッシュほど選ばれやすく、出没日は MONTH_WEIGHTS の季節変動に従う
+
+    Args:
+        rng (Generator): 乱数生成器
+        meshes (DataFrame): build_meshes で作成したメッシュ
+        animals (list): 対象生物
+        per_year (int): 全国・全生物の年間出没件数
+        years (int): 年数(基準日まで)
+
+    Returns:
+        DataFrame: 全国危険生物出没情報一覧の列と grid3rd を持つ出没情報(出没日の昇順)
+
+    """
+    count = per_year * years
+    weights = np.exp(meshes['risk'].to_numpy())
+    picked = rng.choice(len(meshes), size=count, p=weights / weights.sum())
+    rows = meshes.iloc[picked]
+
+    # 日別の重みを月別の重みから作り、出没日を選ぶ
+    end = pd.Timestamp(cmn.BASEDATE)
+    days = pd.date_range(end - pd.DateOffset(years=years) + pd.Timedelta(days=1), end, freq='D')
+    day_weights = MONTH_WEIGHTS[days.month - 1]
+    dates = days[rng.choice(len(days), size=count, p=day_weights / day_weights.sum())]
+
+    # メッシュ内の一様な位置を出没地点とする
+    lon = rows['minlon'].to_numpy() + rng.random(count) * (rows['maxlon'] - rows['minlon']).to_numpy()
+    lat = rows['minlat'].to_numpy() + rng.random(count) * (rows['maxlat'] - rows['minlat']).to_numpy()
+
+    df = pd.DataFrame({
+        'pref_code': rows['都道府県コード'].to_numpy(),
+        'pref_name': rows['都道府県名'].to_numpy(),
+        'city_code': rows['市区町村コード'].to_numpy(),
+        'city_name': rows['市区町村名'].to_numpy(),
+        'animal': rng.choice(animals, size=count),
+        'date': dates.strftime('%Y/%m/%d'),
+        'year': dates.year,
+        'month': dates.month,
+        'lat': lat.round(6),
+        'lon': lon.round(6),
+        'head': rng.geometric(0.6, size=count),
+        'category': rng.choice(cmn.RISK_CATEGORIES, size=count, p=CATEGORY_WEIGHTS),
+        'grid3rd': rows['grid3rd'].to_numpy()
+    })
+    order = np.argsort(dates.to_numpy(), kind='stable')
+
+    return df.iloc[order].reset_index(drop=True)
+
+def build_periods(count: int) -> list:
+    """基準期間作成処理
+
+    Args:
+        count (int): 基準期間数
+
+    Returns:
+        list: 基準日から1週間ずつ遡った期間(YYYYMMDD-YYYYMMDD、昇順)
+
+    """
+    periods = []
+    for week in range(count - 1, -1, -1):
+        end = cmn.BASEDATE - timedelta(weeks=week)
+        start = end - pd.DateOffset(months=cmn.MONTH_INTERVAL)
+        periods.append(f'{start:%Y%m%d}-{end:%Y%m%d}')
+
+    return periods
+
+def shift_period(period: str, weeks: int) -> str:
+    """期間移動処理
+
+    Args:
+        period (str): 期間(YYYYMMDD-YYYYMMDD)
+        weeks (int): 移動する週数
+
+    Returns:
+        str: weeks週後の期間
+
+    """
+    (start, end) = (pd.Timestamp(day) + pd.Timedelta(weeks=weeks) for day in period.split('-'))
+    return f'{start:%Y%m%d}-{end:%Y%m%d}'
+
+def levels_from_risk(risk: np.ndarray) -> np.ndarray:
+    """警報・注意報区分処理
+
+    Args:
+        risk (ndarray): 危険度
+
+    Returns:
+        ndarray: 危険度の分位点(ALERT_QUANTILES)で区分した警報・注意報
+
+    """
+    thresholds = np.quantile(risk, ALERT_QUANTILES)
+    return np.array(ALERT_LEVELS, dtype=object)[np.searchsorted(thresholds, risk)]
+
+def write_result_dir(
+    dirpath: Path,
+    meshes: pd.DataFrame,
+    previous: np.ndarray,
+    current: np.ndarray,
+    sightings: pd.DataFrame,
+    animal: str,
+    period: str
+):
+    """解析結果フォルダ書き出し処理
+
+    Args:
+        dirpath (Path): 解析結果フォルダ
+        meshes (DataFrame): build_meshes で作成したメッシュ
+        previous (ndarray): 前期の警報・注意報
+        current (ndarray): 今期の警報・注意報
+        sightings (DataFrame): build_sightings で作成した出没情報
+        animal (str): 対象生物
+        period (str): 期間(YYYYMMDD-YYYYMMDD)
+
+    """
+    dirpath.mkdir(parents=True, exist_ok=True)
+    keys = ['都道府県コード', '都道府県名', '市区町村コード', '市区町村名', 'grid3rd']
+
+    alert = meshes[keys + ['minlon', 'minlat', 'maxlon', 'maxlat']].copy()
+    alert['警報注意報'] = current
+    alert.to_csv(dirpath / '警報注意情報.csv', index=False, encoding=rs.CSV_ENCODING)
+
+    # 前期今期の差分は両期とも評価のある(－でない)メッシュのみとする
+    evaluated = (previous != ALERT_LEVELS[0]) & (current != ALERT_LEVELS[0])
+    diff = meshes.loc[evaluated, keys].copy()
+    diff['警報注意報(前回)'] = previous[evaluated]
+    diff['警報注意報(今回)'] = current[evaluated]
+    diff.to_csv(dirpath / 'diff.csv', index=False, encoding=rs.CSV_ENCODING)
+
+    # 期間内の出没情報を市区町村・警報種別ごとに合計する
+    (start, end) = (pd.Timestamp(day) for day in period.split('-'))
+    dates = pd.to_datetime(sightings['date'], format='%Y/%m/%d')
+    rows = sightings[(sightings['animal'] == animal) & (dates >= start) & (dates <= end)]
+    columns = [f'{kind}合計数' for kind in ia.ALERT_KINDS]
+    region = rows.assign(
+        column=rows['category'].map(ia.EVENT_VS_KIND).fillna(ia.DEFAULT_KIND) + '合計数'
+    ).pivot_table(
+        index=['pref_name', 'city_name'],
+        columns='column',
+        values='head',
+        aggfunc='sum',
+        fill_value=0
+    ).reindex(columns=columns, fill_value=0)
+    cities = meshes[['都道府県名', '市区町村名']].drop_duplicates()
+    region = region.reindex(
+        pd.MultiIndex.from_frame(cities, names=['pref_name', 'city_name']),
+        fill_value=0
+    ).reset_index(drop=True)
+    region.insert(0, '都道府県名', cities['都道府県名'].to_numpy())
+    region.insert(1, '市区町村名', cities['市区町村名'].to_numpy())
+    region.to_csv(
+        dirpath / '地域別警報注意報一覧.csv',
+        index=True,
+        index_label='index',
+        encoding=rs.CSV_ENCODING
+    )
+
+def write_gazetteer(csvpath: Path, meshes: pd.DataFrame):
+    """地名辞書書き出し処理
+
+    合成した都道府県・市区町村の代表点(メッシュの中心の平均)を地名辞書の列で書き出す
+
+    Args:
+        csvpath (Path): 出力先のCSVパス
+        meshes (DataFrame): build_meshes で作成したメッシュ
+
+    """
+    gazetteer = meshes.assign(
+        lat=(meshes['minlat'] + meshes['maxlat']) / 2,
+        lon=(meshes['minlon'] + meshes['maxlon']) / 2
+    )
+    cities = gazetteer.groupby(['都道府県名', '市区町村名'], sort=False)[['lat', 'lon']].mean().reset_index()
+    prefectures = gazetteer.groupby('都道府県名', sort=False)[['lat', 'lon']].mean().reset_index()
+    prefectures['市区町村名'] = ''
+
+    csvpath.parent.mkdir(parents=True, exist_ok=True)
+    pd.concat([prefectures, cities], ignore_index=True).rename(
+        columns={'都道府県名': 'pref_name', '市区町村名': 'city_name'}
+    )[['pref_name', 'city_name', 'lat', 'lon']].to_csv(csvpath, index=False, encoding='cp932')
+
+def _nearest(coords: np.ndarray, seeds: np.ndarray) -> np.ndarray:
+    # 各点に最も近い中心点の番号(メッシュ数×中心点数の作業領域を分割して求める)
+    nearest = np.empty(len(coords), dtype=np.int64)
+    for start in range(0, len(coords), 100_000):
+        block = coords[start:start + 100_000]
+        distances = ((block[:, np.newaxis, :] - seeds[np.newaxis, :, :]) ** 2).sum(axis=2)
+        nearest[start:start + 100_000] = np.argmin(distances, axis=1)
+
+    return nearest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='負荷・規模試験用の合成データを作成する',
+        epilog='リポジトリ直下から python -m benchmarks.synthetic_dataset として実行する'
+    )
+    parser.add_argument('--output', default=str(OUTPUT_ROOT), help='出力先のルートフォルダ')
+    parser.add_argument('--prefectures', type=int, default=DEFAULT_SCALE['prefectures'], help='都道府県数(最大47)')
+    parser.add_argument('--meshes', type=int, default=DEFAULT_SCALE['meshes'], help='都道府県あたりの3次メッシュ数')
+    parser.add_argument('--cities', type=int, default=DEFAULT_SCALE['cities'], help='都道府県あたりの市区町村数')
+    parser.add_argument('--periods', type=int, default=DEFAULT_SCALE['periods'], help='基準期間数')
+    parser.add_argument('--horizons', type=int, default=DEFAULT_SCALE['horizons'], help='最新の基準期間の予測数')
+    parser.add_argument('--animals', nargs='+', default=DEFAULT_SCALE['animals'], help='対象生物')
+    parser.add_argument('--sightings-per-year', type=int, default=DEFAULT_SCALE['sightings_per_year'], help='年間出没件数')
+    parser.add_argument('--years', type=int, default=DEFAULT_SCALE['years'], help='出没情報の年数')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SCALE['seed'], help='乱数のシード')
+    parser.add_argument('--catalog', action='store_true', help='出力先の解析結果カタログも作成する')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    output_root = Path(args.output)
+    summary = generate(
+        output_root,
+        prefectures=args.prefectures,
+        meshes=args.meshes,
+        cities=args.cities,
+        periods=args.periods,
+        horizons=args.horizons,
+        animals=args.animals,
+        sightings_per_year=args.sightings_per_year,
+        years=args.years,
+        seed=args.seed
+    )
+    if args.catalog:
+        rc.write_catalog(
+            rc.build_catalog(output_root.joinpath('results')),
+            output_root.joinpath(rc.CATALOG_PATH.parent.name, rc.CATALOG_PATH.name)
+        )
+    print(summary, f'{time.perf_counter() - start:.1f}s')
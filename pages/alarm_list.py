@@ -1,33 +1,21 @@
 import os
 from pathlib import Path
-import pandas as pd
 import streamlit as st
 import src.utility.const as const
 import src.navigate.app2menu as a2m
 import src.common as cmn
-
-# 色を決定する関数
-def get_color(df, value, color) -> str:
-    if value == 0:
-        return 'background-color: white;'   # 灰色（ゼロ）
-    
-    # 色の濃さを計算（最大値に基づいて色の濃淡を表現）
-    # 透過度を計算（データの最大値に基づいて透明度を設定）
-    alpha = min(1.0, max(0.1, value / df[color].max()))  # 0.1 ~ 1.0の範囲で透過度を設定
-
-    if color == '目撃合計数':
-        return f'background-color: rgba(255, 255, 0, {alpha});'  # 黄色
-    elif color == '遭遇合計数':
-        return f'background-color: rgba(255, 165, 0, {alpha});'  # オレンジ
-    elif color == '襲撃合計数':
-        return f'background-color: rgba(255, 0, 0, {alpha});'    # 赤色
+import src.store.result_loader as rl
+import src.store.result_catalog as rc
+import src.store.result_prefetch as rp
+import src.render.alarm_table as at
+import src.monitoring.tracing as tr
+import src.monitoring.debug_panel as dp
 
 # パス生成
 basepath = Path(os.path.dirname(os.path.abspath(__file__))).parent
-datapath = basepath.joinpath('results')
 
-# フォルダ内の期間を取得
-date_choice_list = [f.name for f in datapath.glob('*-*')]
+# 解析結果カタログから期間を取得
+date_choice_list = rc.RESULT_CATALOG.periods()
 
 # ページ表記
 st.set_page_config(
@@ -88,77 +76,73 @@ with st.container():
     button_class = "button-disabled" if st.session_state.loading else ""
     st.markdown(f'<div class="right-align {button_class}">', unsafe_allow_html=True)
     if st.button("決定"):
-        # 決定ボタン押下後の処理
+        # 決定ボタン押下後の処理：ページ切り替えで再実行されても表示を続けるため条件を保持する
         st.session_state.loading = True    # 決定ボタン不活性化
-        with st.spinner("データを読み込み中..."):
-            #########################
-            #### データロード待ち ####
-            #########################
-            # データパス存在確認
-            if choice_predict == '予測しない':
-                # 予測しない場合
-                dirpath = datapath / choice_date / choice_animal
-                signature = choice_date
-            else:
-                # 予測する場合
-                dirpath = datapath / choice_date / choice_animal / 'predicted' / choice_predict
-                signature = f'{choice_date}({choice_predict})' 
-                if not dirpath.exists():
-                    # パスが存在しない場合は予測しないを選択する
-                    dirpath = datapath / choice_date / choice_animal
-                    signature = choice_date
-            
-            # 画像パス
-            image_root = basepath / 'img' / choice_animal
-            
-            # フォルダパスを作成して警報・注意報情報を取得
-            df = pd.read_csv(
-                dirpath / '地域別警報注意報一覧.csv',
-                encoding='cp932'
-            )
-
-            # 地域選択
-            if choice_region != "全国":
-                df = df[df['都道府県名'] == choice_region]
-
-            # 都道府県名、市区町村名と目撃、遭遇、襲撃のデータを表示
-            disable = True
-            st.title(f"警報一覧 {signature}")
-            for index, row in df.iterrows():
-                # 合計数がゼロにならない列名を集約
-                enable_kinds = {}
-                for kind in ('目撃', '遭遇', '襲撃'):
-                    col = f'{kind}合計数'
-                    if row[col] != 0:
-                        enable_kinds.setdefault(kind, col)
-
-                # 辞書型が空の場合はスキップ
-                if len(enable_kinds.keys()) == 0:
-                    continue
-
-                # 画像パス生成
-                if '目撃' in enable_kinds.keys():
-                    imagepath = image_root / '目撃.jpg'
-
-                if '遭遇' in enable_kinds.keys():
-                    imagepath = image_root / '遭遇.jpg'
-
-                if '襲撃' in enable_kinds.keys():
-                    imagepath = image_root / '襲撃.jpg'
-
-                # 対象の警報を左詰めで表示
-                disable = False
-                c1, img, c2, c3, c4 = st.columns([3, 1, 2, 2, 2])
-                if imagepath.exists():
-                    img.image(str(imagepath), use_column_width=True)
-                cs = [c2, c3, c4]
-                c1.markdown(f"### {row['都道府県名']} {row['市区町村名']}")
-                for i, (kind, col) in enumerate(enable_kinds.items()):
-                    cs[i].markdown(
-                        f"<div style='{get_color(df, row[col], col)}; padding: 10px; margin: 5px;'>"
-                        f"{'' if row[col] == 0 else f'{kind}レベル'}</div>",
-                        unsafe_allow_html=True
-                    )
-                
-            if disable:
-                st.title('警報なし')
\ No newline at end of file
+        st.session_state['alarm_query'] = (choice_date, choice_animal, choice_predict, choice_region)
+        st.session_state['alarm_page'] = 1
+
+    if 'alarm_query' in st.session_state:
+        (query_date, query_animal, query_predict, query_region) = st.session_state['alarm_query']
+        try:
+            with st.spinner("データを読み込み中..."):
+                #########################
+                #### データロード待ち ####
+                #########################
+                # 段階別計測(例外で終了したときも計測を終了して記録する)
+                with tr.trace(
+                    'alarm', 
+                    period=query_date, 
+                    animal=query_animal, 
+                    horizon=query_predict, 
+                    region=query_region
+                ) as trace:
+                    with tr.span('csv_read'):
+                        # 表示期間(予測フォルダがない場合は予測しないを選択する)
+                        _, signature = rl.resolve_result_dir(query_date, query_animal, query_predict)
+
+                        # 画像パス
+                        image_root = basepath / 'img' / query_animal
+
+                        # 共有キャッシュから警報・注意報情報を取得
+                        df = rl.load_result(query_date, query_animal, query_predict, 'region')
+
+                    with tr.span('styler'):
+                        # 地域選択
+                        if query_region != "全国":
+                            df = df[df['都道府県名'] == query_region]
+
+                        # 警報レベル・画像・色の濃さを列単位で算出
+                        table = at.alarm_levels(df)
+
+                    # 都道府県名、市区町村名と目撃、遭遇、襲撃のデータを表示
+                    st.title(f"警報一覧 {signature}")
+                    if table.shape[0] == 0:
+                        st.title('警報なし')
+
+                    else:
+                        # 件数が多い場合(全国等)はページを分けて表示
+                        pages = at.page_count(table)
+                        page = 1
+                        if pages > 1:
+                            leftobj4, _ = st.columns([2, 8])
+                            page = leftobj4.number_input(
+                                f'ページ(全{pages}ページ、{table.shape[0]}件)',
+                                min_value=1,
+                                max_value=pages,
+                                step=1,
+                                key='alarm_page'
+                            )
+
+                        with tr.span('render_html'):
+                            st.markdown(
+                                at.render_alarm_html(table, image_root, page=int(page)),
+                                unsafe_allow_html=True
+                            )
+
+                    # 前後の期間・予測を先読みする
+                    rp.PREFETCHER.schedule(query_date, query_animal, query_predict, kinds=['region'])
+
+                # 段階別計測の結果(デバッグ表示時はサイドバーに表示する)
+                dp.render_trace_panel(trace)
+        finally:
+            st.session_state.loading = False    # 決定ボタン活性化(例外で終了したときも戻す)
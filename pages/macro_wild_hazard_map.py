@@ -1,21 +1,21 @@
-import os
-from pathlib import Path
 import numpy as np
-import pandas as pd
 import streamlit as st
-import geopandas as gpd
 import plotly.express as px
-from shapely.geometry import Polygon
 import src.common as cmn
+import src.store.result_loader as rl
+import src.store.result_catalog as rc
+import src.store.result_prefetch as rp
+import src.store.result_summary as rsum
+import src.geo.mesh_geometry as mg
+import src.render.hazard_deck as hd
+import src.geo.mesh_lod as lod
 import src.utility.const as const
 import src.navigate.app2menu as a2m
+import src.monitoring.tracing as tr
+import src.monitoring.debug_panel as dp
 
-# パス生成
-basepath = Path(os.path.dirname(os.path.abspath(__file__))).parent
-datapath = basepath.joinpath('results')
-
-# フォルダ内の期間を取得
-date_choice_list = [f.name for f in datapath.glob('*-*')]
+# 解析結果カタログから期間を取得
+date_choice_list = rc.RESULT_CATALOG.periods()
 
 # ページ表記
 st.set_page_config(
@@ -53,7 +53,7 @@ choice_predict = rightobj1.selectbox(
 )
 
 # オブジェクト定義(2)
-leftobj2, _ = st.columns([2, 8])
+leftobj2, _, rightobj2 = st.columns([2, 5, 3])
 
 # 対象生物のセレクトボックスを表示
 choice_animal = leftobj2.selectbox(
@@ -61,8 +61,14 @@ choice_animal = leftobj2.selectbox(
     const.ANIMALS
 )
 
+# 描画方式のセレクトボックスを表示
+choice_renderer = rightobj2.selectbox(
+    '描画方式', 
+    hd.RENDERERS
+)
+
 # オブジェクト定義(3)
-leftobj3, _ = st.columns([3, 7])
+leftobj3, _, midobj3, rightobj3 = st.columns([3, 1, 3, 3])
 
 # 都道府県のセレクトボックスを表示
 choice_region = leftobj3.selectbox(
@@ -70,6 +76,18 @@ choice_region = leftobj3.selectbox(
     list(cmn.PREF_NAMW_VS_CODE.keys())
 )
 
+# 表示単位のセレクトボックスを表示(自動のときは描画するメッシュ数から選ぶ)
+choice_level = midobj3.selectbox(
+    '表示単位', 
+    ['自動'] + [lod.LEVEL_LABELS[level] for level in (3, 2, 1)]
+)
+
+# 詳細表示エリア(1次メッシュ)のセレクトボックスを表示
+choice_area = rightobj3.selectbox(
+    '詳細表示エリア', 
+    ['全域'] + [str(grid1st) for grid1st in cmn.PREF_NAME_VS_GRID1ST_LIST[choice_region]]
+)
+
 # 決定ボタン以降のオブジェクトのコンテナ化
 with st.container():
     # 決定ボタンを配置
@@ -78,174 +96,169 @@ with st.container():
     if st.button("決定"):
         # 決定ボタン押下後の処理
         st.session_state.loading = True    # 決定ボタン不活性化
-        with st.spinner("データを読み込み中..."):
-            #########################
-            #### データロード待ち ####
-            #########################
-            # チャート表示エリアの定義
-            title, _ = st.columns([7, 3])
-            mapchart, listchart = st.columns([7, 3])
-            nowlist, comblist = st.columns([5, 5])
-
-            # パス存在確認
-            if choice_predict == '予測しない':
-                # 予測しない場合
-                dirpath = datapath / choice_date / choice_animal
-                signature = choice_date
-            else:
-                # 予測する場合
-                dirpath = datapath / choice_date / choice_animal / 'predicted' / choice_predict
-                signature = f'{choice_date}({choice_predict})' 
-                if not dirpath.exists():
-                    # パスが存在しない場合は予測しないを選択する
-                    dirpath = datapath / choice_date / choice_animal
-                    signature = choice_date
-
-            # フォルダパスを作成して警報・注意報情報を取得
-            df = pd.read_csv(
-                dirpath / '警報注意情報.csv',
-                encoding='cp932'
-            )
-            diff = pd.read_csv(
-                dirpath / 'diff.csv',
-                encoding='cp932'
-            )
-            diff.rename(
-                columns={
-                    '警報注意報(前回)': '警報注意報(前期)',
-                    '警報注意報(今回)': '警報注意報(今期)',
-                },
-                inplace=True
-            )
-
-            # 都道府県で抽出
-            df = df[df['都道府県コード'] == int(cmn.PREF_NAMW_VS_CODE[choice_region])]
-            diff = diff[diff['都道府県コード'] == int(cmn.PREF_NAMW_VS_CODE[choice_region])]
-
-            # 各種ポリゴン用の座標情報へ変換
-            df['geometry'] = df.apply(
-                lambda x: Polygon(
-                    [
-                        (x['minlon'], x['minlat']),
-                        (x['minlon'], x['maxlat']),
-                        (x['maxlon'], x['maxlat']),
-                        (x['maxlon'], x['minlat'])
-                    ]
-                ), 
-                axis=1
-            )
-            
-            df.rename(
-                columns={
-                    # 'prefcode': '都道府県コード',
-                    # 'citycode': '市区町村コード', 
-                    'minlon': '経度', 
-                    'minlat': '緯度', 
-                    'maxlon': '最大経度', 
-                    'maxlat': '最大緯度', 
-                    'grid3rd': '1kmメッシュ'
-                },
-                inplace=True
-            )
-
-            geometry = px.choropleth_mapbox(
-                df, 
-                geojson=gpd.GeoSeries(df['geometry']).__geo_interface__, 
-                locations=df.index, 
-                color='警報注意報',
-                color_discrete_map=cmn.CATEGORY_VS_COLOR,
-                center=dict(
-                    lat=np.mean(df[['緯度', '最大緯度']].mean(axis=0)),
-                    lon=np.mean(df[['経度', '最大経度']].mean(axis=0))
-                ),
-                hover_data=['警報注意報', '都道府県名', '市区町村名', '緯度', '経度', '1kmメッシュ'],
-                mapbox_style='open-street-map',
-                opacity=0.5,
-                zoom=7, 
-                height=700
-            )
-
-            # 前期と今期を左結合する
-            _diff = diff[diff['警報注意報(今期)'] != '安全']
-            _diff['警報注意報(前期)'] = pd.Categorical(
-                _diff['警報注意報(前期)'], 
-                categories=list(cmn.CATEGORY_VS_COLOR.keys())[1:], 
-                ordered=True
-            )
-            _diff['警報注意報(今期)'] = pd.Categorical(
-                _diff['警報注意報(今期)'], 
-                categories=list(cmn.CATEGORY_VS_COLOR.keys())[1:], 
-                ordered=True
-            )
-            _diff.sort_values(
-                by=['警報注意報(前期)', '警報注意報(今期)'], 
-                ascending=True,
-                inplace=True
-            )
-            df_color = _diff.style.applymap(
-                lambda s: f'background-color: {cmn.CATEGORY_VS_COLOR[s]}; color: black;',
-                subset=['警報注意報(前期)', '警報注意報(今期)']
-            )
-
-            # 統計情報の作成
-            count_now = df.groupby('警報注意報').size().reset_index(name='合計')
-            count_now['警報注意報'] = pd.Categorical(
-                count_now['警報注意報'], 
-                categories=list(cmn.CATEGORY_VS_COLOR.keys())[1:], 
-                ordered=True
-            )
-            count_now.sort_values(
-                by=['警報注意報'], 
-                ascending=True,
-                inplace=True
-            )
-            count_now.columns = ['警報・注意報(今期)', '地点数']
-            count_now.reset_index(inplace=True)
-            count_now = count_now.style.applymap(
-                lambda s: f'background-color: {cmn.CATEGORY_VS_COLOR[s]}; color: black;',
-                subset=['警報・注意報(今期)']
-            )
-
-            # 統計情報の作成
-            count_combinations = diff.groupby(
-                ['警報注意報(前期)', '警報注意報(今期)']
-            ).size().reset_index(name='地点数')
-            count_combinations['警報注意報(前期)'] = pd.Categorical(
-                count_combinations['警報注意報(前期)'], 
-                categories=list(cmn.CATEGORY_VS_COLOR.keys())[1:], 
-                ordered=True
-            )
-            count_combinations['警報注意報(今期)'] = pd.Categorical(
-                count_combinations['警報注意報(今期)'], 
-                categories=list(cmn.CATEGORY_VS_COLOR.keys())[1:], 
-                ordered=True
-            )
-            count_combinations.sort_values(
-                by=['警報注意報(前期)', '警報注意報(今期)'], 
-                ascending=True,
-                inplace=True
-            )
-            count_combinations.reset_index(inplace=True)
-            count_combinations = count_combinations.style.applymap(
-                lambda s: f'background-color: {cmn.CATEGORY_VS_COLOR[s]}; color: black;',
-                subset=['警報注意報(前期)', '警報注意報(今期)']
-            )
-
-            # 表示
-            title.title(f'表示期間：{signature}')
-            mapchart.title('ハザードマップ')
-            mapchart.plotly_chart(geometry, use_container_width=True)
-            listchart.title('ハザードリスト')
-            listchart.dataframe(df_color, height=700, use_container_width=True)
-            nowlist.title('今期の合計数')
-            nowlist.dataframe(count_now, height=200, use_container_width=True)
-            comblist.title('前期今期の組み合わせ合計数')
-            comblist.dataframe(count_combinations, height=200, use_container_width=True)
-
-            #########################
-            #### データロード待ち ####
-            #########################
-        
-        st.session_state.loading = False    # 決定ボタン活性化
+        try:
+            with st.spinner("データを読み込み中..."):
+                #########################
+                #### データロード待ち ####
+                #########################
+                # 段階別計測(例外で終了したときも計測を終了して記録する)
+                with tr.trace(
+                    'macro', 
+                    period=choice_date, 
+                    animal=choice_animal, 
+                    horizon=choice_predict, 
+                    region=choice_region, 
+                    renderer=choice_renderer
+                ) as trace:
+                    # チャート表示エリアの定義
+                    title, _ = st.columns([7, 3])
+                    mapchart, listchart = st.columns([7, 3])
+                    nowlist, comblist = st.columns([5, 5])
+
+                    with tr.span('csv_read'):
+                        # 表示期間(予測フォルダがない場合は予測しないを選択する)
+                        _, signature = rl.resolve_result_dir(choice_date, choice_animal, choice_predict)
+
+                        # 共有キャッシュから警報・注意報情報を取得
+                        df = rl.load_result(choice_date, choice_animal, choice_predict, 'alert')
+
+                    with tr.span('filter'):
+                        # 都道府県で抽出
+                        prefcode = int(cmn.PREF_NAMW_VS_CODE[choice_region])
+                        df = df[df['都道府県コード'] == prefcode]
+
+                        # 詳細表示エリア(1次メッシュ)で抽出
+                        if choice_area != '全域':
+                            df = df[cmn.calc_grid_parent_array(df['grid3rd'].to_numpy(), 1) == int(choice_area)]
+
+                        # 表示単位の決定(詳細表示エリアでは1kmメッシュをすべて描画できる上限とする)
+                        if choice_level == '自動':
+                            level = lod.choose_level(
+                                df['grid3rd'], 
+                                lod.MAX_POLYGONS if choice_area == '全域' else lod.SUBAREA_MAX_POLYGONS
+                            )
+                        else:
+                            level = {label: level for level, label in lod.LEVEL_LABELS.items()}[choice_level]
+                        mesh_label = lod.LEVEL_LABELS[level]
+
+                        if level == 3:
+                            # 1kmメッシュはそのまま表示する
+                            mapdf = df
+                            hover_data = ['警報注意報', '都道府県名', '市区町村名', '緯度', '経度', mesh_label]
+                        else:
+                            # 上位メッシュへ集約したもの(共有キャッシュ)を都道府県、詳細表示エリアで抽出
+                            mapdf = rl.load_derived(
+                                choice_date, 
+                                choice_animal, 
+                                choice_predict, 
+                                'alert', 
+                                f'lod_{level}', 
+                                lambda x: lod.aggregate_alerts(x, level, by=['都道府県コード'])
+                            )
+                            mapdf = mapdf[mapdf['都道府県コード'] == prefcode]
+                            if choice_area != '全域':
+                                mapdf = mapdf[cmn.calc_grid_parent_array(mapdf['mesh'].to_numpy(), 1) == int(choice_area)]
+                            hover_data = ['警報注意報', 'メッシュ数', '緯度', '経度', mesh_label]
+
+                        # メッシュの形状は共有ストアから取得するため、ここでは列名のみ整える
+                        mapdf = mapdf.rename(
+                            columns={
+                                # 'prefcode': '都道府県コード',
+                                # 'citycode': '市区町村コード', 
+                                'minlon': '経度', 
+                                'minlat': '緯度', 
+                                'maxlon': '最大経度', 
+                                'maxlat': '最大緯度', 
+                                'grid3rd': mesh_label,
+                                'mesh': mesh_label
+                            }
+                        )
+
+                    with tr.span('polygon_build'):
+                        center = dict(
+                            lat=np.mean(mapdf[['緯度', '最大緯度']].mean(axis=0)),
+                            lon=np.mean(mapdf[['経度', '最大経度']].mean(axis=0))
+                        )
+                        zoom = lod.LEVEL_ZOOMS[level] if choice_area == '全域' else lod.SUBAREA_ZOOM
+                        if choice_renderer == 'deck.gl':
+                            # 区画番号のみを送りクライアント側で多角形を組み立てる
+                            geometry = hd.hazard_deck(mapdf, mesh_label, center, zoom, height=700)
+                        else:
+                            geometry = px.choropleth_mapbox(
+                                mapdf, 
+                                geojson=mg.MESH_GEOMETRY.feature_collection(mapdf[mesh_label]), 
+                                locations=mesh_label, 
+                                color='警報注意報',
+                                color_discrete_map=cmn.CATEGORY_VS_COLOR,
+                                center=center,
+                                hover_data=hover_data,
+                                mapbox_style='open-street-map',
+                                opacity=0.5,
+                                zoom=zoom, 
+                                height=700
+                            )
+
+                    with tr.span('styler'):
+                        # 前期と今期を左結合したハザードリスト(共有キャッシュ)を都道府県で抽出
+                        _diff = rl.load_derived(
+                            choice_date, 
+                            choice_animal, 
+                            choice_predict, 
+                            'diff', 
+                            'hazard_list', 
+                            rsum.hazard_list
+                        )
+                        _diff = _diff[_diff['都道府県コード'] == prefcode]
+                        df_color = rsum.style_alerts(_diff, rsum.TRANSITION_COLUMNS)
+
+                        # 統計情報の作成(取り込み時に作成した都道府県別集計から抽出)
+                        count_now = rsum.select_prefecture(
+                            rl.load_summary(choice_date, choice_animal, choice_predict, 'alert'), 
+                            prefcode
+                        )
+                        count_now.columns = ['警報・注意報(今期)', '地点数']
+                        count_now = rsum.style_alerts(count_now, ['警報・注意報(今期)'])
+
+                        # 統計情報の作成(取り込み時に作成した都道府県別集計から抽出)
+                        count_combinations = rsum.select_prefecture(
+                            rl.load_summary(choice_date, choice_animal, choice_predict, 'diff'), 
+                            prefcode
+                        )
+                        count_combinations = rsum.style_alerts(count_combinations, rsum.TRANSITION_COLUMNS)
+
+                    # 表示
+                    title.title(f'表示期間：{signature}')
+                    mapchart.title('ハザードマップ')
+                    with tr.span('plotly_chart'):
+                        if choice_renderer == 'deck.gl':
+                            mapchart.pydeck_chart(geometry, use_container_width=True)
+                        else:
+                            mapchart.plotly_chart(geometry, use_container_width=True)
+                    with tr.span('dataframe'):
+                        listchart.title('ハザードリスト')
+                        listchart.dataframe(df_color, height=700, use_container_width=True)
+                        nowlist.title('今期の合計数')
+                        nowlist.dataframe(count_now, height=200, use_container_width=True)
+                        comblist.title('前期今期の組み合わせ合計数')
+                        comblist.dataframe(count_combinations, height=200, use_container_width=True)
+
+                    # 前後の期間・予測を先読みする
+                    rp.PREFETCHER.schedule(
+                        choice_date, 
+                        choice_animal, 
+                        choice_predict, 
+                        kinds=['alert', 'diff'], 
+                        derived=[('diff', 'hazard_list', rsum.hazard_list)], 
+                        summaries=['alert', 'diff']
+                    )
+
+                # 段階別計測の結果(デバッグ表示時はサイドバーに表示する)
+                dp.render_trace_panel(trace)
+
+                #########################
+                #### データロード待ち ####
+                #########################
+        finally:
+            st.session_state.loading = False    # 決定ボタン活性化(例外で終了したときも戻す)
 
     st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
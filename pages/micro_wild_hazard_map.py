@@ -1,26 +1,22 @@
-import os
-import urllib
-import requests
-from pathlib import Path
 import numpy as np
-import pandas as pd
 import streamlit as st
-import geopandas as gpd
 import plotly.express as px
-from shapely.geometry import Polygon
 import src.common as cmn
+import src.store.result_loader as rl
+import src.store.result_catalog as rc
+import src.store.result_prefetch as rp
+import src.store.result_summary as rsum
+import src.geo.mesh_geometry as mg
+import src.render.hazard_deck as hd
+import src.geo.spatial_index as si
+import src.geo.geocoder as gc
 import src.utility.const as const
 import src.navigate.app2menu as a2m
+import src.monitoring.tracing as tr
+import src.monitoring.debug_panel as dp
 
-# 国土地理院API
-GSI_API = "https://msearch.gsi.go.jp/address-search/AddressSearch?q="
-
-# パス生成
-basepath = Path(os.path.dirname(os.path.abspath(__file__))).parent
-datapath = basepath.joinpath('results')
-
-# フォルダ内の期間を取得
-date_choice_list = [f.name for f in datapath.glob('*-*')]
+# 解析結果カタログから期間を取得
+date_choice_list = rc.RESULT_CATALOG.periods()
 
 # ページ表記
 st.set_page_config(
@@ -58,7 +54,7 @@ choice_predict = rightobj1.selectbox(
 )
 
 # オブジェクト定義(2)
-leftobj2, _ = st.columns([2, 8])
+leftobj2, _, rightobj2 = st.columns([2, 5, 3])
 
 # 対象生物のセレクトボックスを表示
 choice_animal = leftobj2.selectbox(
@@ -66,6 +62,12 @@ choice_animal = leftobj2.selectbox(
     const.ANIMALS
 )
 
+# 描画方式のセレクトボックスを表示
+choice_renderer = rightobj2.selectbox(
+    '描画方式', 
+    hd.RENDERERS
+)
+
 # オブジェクト定義(3)
 leftobj3, _, rightobj3 = st.columns([7, 1, 2])
 
@@ -89,199 +91,159 @@ with st.container():
     if st.button("決定"):
         # 決定ボタン押下後の処理
         st.session_state.loading = True    # 決定ボタン不活性化
-        with st.spinner("データを読み込み中..."):
-            #########################
-            #### データロード待ち ####
-            #########################
-            # チャート表示エリアの定義
-            title, _ = st.columns([7, 3])
-            mapchart, listchart = st.columns([7, 3])
-            nowlist, comblist = st.columns([5, 5])
-
-            # 範囲選択から値を取り出す
-            radius_km = float(choice_range.replace('km', ''))
-
-            # パス存在確認
-            if choice_predict == '予測しない':
-                # 予測しない場合
-                dirpath = datapath / choice_date / choice_animal
-                signature = choice_date
-            else:
-                # 予測する場合
-                dirpath = datapath / choice_date / choice_animal / 'predicted' / choice_predict
-                signature = f'{choice_date}({choice_predict})' 
-                if not dirpath.exists():
-                    # パスが存在しない場合は予測しないを選択する
-                    dirpath = datapath / choice_date / choice_animal
-                    signature = choice_date
-
-            # フォルダパスを作成して警報・注意報情報を取得
-            df = pd.read_csv(
-                dirpath / '警報注意情報.csv',
-                encoding='cp932'
-            )
-            diff = pd.read_csv(
-                dirpath / 'diff.csv',
-                encoding='cp932'
-            )
-            diff.rename(
-                columns={
-                    '警報注意報(前回)': '警報注意報(前期)',
-                    '警報注意報(今回)': '警報注意報(今期)',
-                },
-                inplace=True
-            )
-
-            # 国土地理院APIを使って緯度経度を求める
-            s_quote = urllib.parse.quote(input_address)
-            response = requests.get(GSI_API + s_quote)
-            if len(address := response.json()) != 0:
-                # 住所における緯度経度取得
-                (ownlon, ownlat) = address[0]['geometry']['coordinates']
-
-                # ハーバーサイン法を使って二点間の距離を算出
-                df['距離'] = df.apply(
-                    lambda row: cmn.haversine(
-                        x1=ownlat, 
-                        x2=row['minlat'], 
-                        y1=ownlon, 
-                        y2=row['minlon']
-                    ), 
-                    axis=1
-                )
-
-                # 算出した距離以下になるデータを抽出
-                df = df[df['距離'] <= radius_km]
-                diff = diff[diff['grid3rd'].isin(df['grid3rd'])]
-
-                # 各種ポリゴン用の座標情報へ変換
-                df['geometry'] = df.apply(
-                    lambda x: Polygon(
-                        [
-                            (x['minlon'], x['minlat']),
-                            (x['minlon'], x['maxlat']),
-                            (x['maxlon'], x['maxlat']),
-                            (x['maxlon'], x['minlat'])
-                        ]
-                    ), 
-                    axis=1
-                )
-
-                # mapboxによる可視化
-                df.rename(
-                    columns={
-                        # 'prefcode': '都道府県コード',
-                        # 'citycode': '市区町村コード', 
-                        'minlon': '経度', 
-                        'minlat': '緯度', 
-                        'maxlon': '最大経度', 
-                        'maxlat': '最大緯度', 
-                        'grid3rd': '1kmメッシュ'
-                    },
-                    inplace=True
-                )
-                geometry = px.choropleth_mapbox(
-                    df, 
-                    geojson=gpd.GeoSeries(df['geometry']).__geo_interface__, 
-                    locations=df.index, 
-                    color='警報注意報',
-                    color_discrete_map=cmn.CATEGORY_VS_COLOR,
-                    center=dict(
-                        lat=np.mean(df[['緯度', '最大緯度']].mean(axis=0)),
-                        lon=np.mean(df[['経度', '最大経度']].mean(axis=0))
-                    ),
-                    hover_data=['警報注意報', '都道府県名', '市区町村名', '緯度', '経度', '1kmメッシュ'],
-                    mapbox_style='open-street-map',
-                    opacity=0.5,
-                    zoom=10 - int(radius_km / 15.0), 
-                    height=700
-                )
-
-                # 前期と今期を左結合する
-                _diff = diff[diff['警報注意報(今期)'] != '安全']
-                _diff['警報注意報(前期)'] = pd.Categorical(
-                    _diff['警報注意報(前期)'], 
-                    categories=list(cmn.CATEGORY_VS_COLOR.keys())[1:], 
-                    ordered=True
-                )
-                _diff['警報注意報(今期)'] = pd.Categorical(
-                    _diff['警報注意報(今期)'], 
-                    categories=list(cmn.CATEGORY_VS_COLOR.keys())[1:], 
-                    ordered=True
-                )
-                _diff.sort_values(
-                    by=['警報注意報(前期)', '警報注意報(今期)'], 
-                    ascending=True,
-                    inplace=True
-                )
-                df_color = _diff.style.applymap(
-                    lambda s: f'background-color: {cmn.CATEGORY_VS_COLOR[s]}; color: black;',
-                    subset=['警報注意報(前期)', '警報注意報(今期)']
-                )
-
-                # 統計情報の作成
-                count_now = df.groupby('警報注意報').size().reset_index(name='合計')
-                count_now['警報注意報'] = pd.Categorical(
-                    count_now['警報注意報'], 
-                    categories=list(cmn.CATEGORY_VS_COLOR.keys())[1:], 
-                    ordered=True
-                )
-                count_now.sort_values(
-                    by=['警報注意報'], 
-                    ascending=True,
-                    inplace=True
-                )
-                count_now.columns = ['警報・注意報(今期)', '地点数']
-                count_now.reset_index(inplace=True)
-                count_now = count_now.style.applymap(
-                    lambda s: f'background-color: {cmn.CATEGORY_VS_COLOR[s]}; color: black;',
-                    subset=['警報・注意報(今期)']
-                )
-
-                # 統計情報の作成
-                count_combinations = diff.groupby(
-                    ['警報注意報(前期)', '警報注意報(今期)']
-                ).size().reset_index(name='地点数')
-                count_combinations['警報注意報(前期)'] = pd.Categorical(
-                    count_combinations['警報注意報(前期)'], 
-                    categories=list(cmn.CATEGORY_VS_COLOR.keys())[1:], 
-                    ordered=True
-                )
-                count_combinations['警報注意報(今期)'] = pd.Categorical(
-                    count_combinations['警報注意報(今期)'], 
-                    categories=list(cmn.CATEGORY_VS_COLOR.keys())[1:], 
-                    ordered=True
-                )
-                count_combinations.sort_values(
-                    by=['警報注意報(前期)', '警報注意報(今期)'], 
-                    ascending=True,
-                    inplace=True
-                )
-                count_combinations.reset_index(inplace=True)
-                count_combinations = count_combinations.style.applymap(
-                    lambda s: f'background-color: {cmn.CATEGORY_VS_COLOR[s]}; color: black;',
-                    subset=['警報注意報(前期)', '警報注意報(今期)']
-                )
-
-                # 表示
-                title.title(f'表示期間：{signature}')
-                mapchart.title('ハザードマップ')
-                mapchart.plotly_chart(geometry, use_container_width=True)
-                listchart.title('ハザードリスト')
-                listchart.dataframe(df_color, height=700, use_container_width=True)
-                nowlist.title('今期の合計数')
-                nowlist.dataframe(count_now, height=200, use_container_width=True)
-                comblist.title('前期今期の組み合わせ合計数')
-                comblist.dataframe(count_combinations, height=200, use_container_width=True)
-
-            else:
-                # 存在しない住所が入力された場合
-                st.error(f'入力された住所(={input_address})は存在しません')
-
-            #########################
-            #### データロード待ち ####
-            #########################
-        
-        st.session_state.loading = False    # 決定ボタン活性化
+        try:
+            with st.spinner("データを読み込み中..."):
+                #########################
+                #### データロード待ち ####
+                #########################
+                # 段階別計測(例外で終了したときも計測を終了して記録する)
+                with tr.trace(
+                    'micro', 
+                    period=choice_date, 
+                    animal=choice_animal, 
+                    horizon=choice_predict, 
+                    address=tr.digest(input_address),    # 入力した住所そのものは記録しない
+                    radius=choice_range, 
+                    renderer=choice_renderer
+                ) as trace:
+                    # チャート表示エリアの定義
+                    title, _ = st.columns([7, 3])
+                    mapchart, listchart = st.columns([7, 3])
+                    nowlist, comblist = st.columns([5, 5])
+
+                    # 範囲選択から値を取り出す
+                    radius_km = float(choice_range.replace('km', ''))
+
+                    with tr.span('csv_read'):
+                        # 表示期間(予測フォルダがない場合は予測しないを選択する)
+                        _, signature = rl.resolve_result_dir(choice_date, choice_animal, choice_predict)
+
+                        # 共有キャッシュから警報・注意報情報を取得
+                        df = rl.load_result(choice_date, choice_animal, choice_predict, 'alert')
+                        diff = rl.load_result(choice_date, choice_animal, choice_predict, 'diff')
+                        diff.rename(columns=rsum.DIFF_RENAME_COLUMNS, inplace=True)
+
+                    # ジオコーダ(地名辞書を国土地理院APIで補正)を使って緯度経度を求める
+                    with tr.span('geocode'):
+                        address = gc.get_geocoder().geocode(input_address)
+
+                    if address is not None:
+                        # 住所における緯度経度取得
+                        (ownlon, ownlat) = address
+
+                        with tr.span('distance_filter'):
+                            # 空間インデックスを使って算出した距離以下になるデータを抽出
+                            mesh_index = rl.load_derived(
+                                choice_date, 
+                                choice_animal, 
+                                choice_predict, 
+                                'alert', 
+                                'mesh_index', 
+                                si.MeshIndex.from_frame
+                            )
+                            positions, distances = mesh_index.query_radius(ownlat, ownlon, radius_km)
+                            df = df.iloc[positions]
+                            df['距離'] = distances
+                            diff = diff[diff['grid3rd'].isin(df['grid3rd'])]
+
+                        with tr.span('polygon_build'):
+                            # mapboxによる可視化(メッシュの形状は共有ストアから取得する)
+                            df.rename(
+                                columns={
+                                    # 'prefcode': '都道府県コード',
+                                    # 'citycode': '市区町村コード', 
+                                    'minlon': '経度', 
+                                    'minlat': '緯度', 
+                                    'maxlon': '最大経度', 
+                                    'maxlat': '最大緯度', 
+                                    'grid3rd': '1kmメッシュ'
+                                },
+                                inplace=True
+                            )
+                            center = dict(
+                                lat=np.mean(df[['緯度', '最大緯度']].mean(axis=0)),
+                                lon=np.mean(df[['経度', '最大経度']].mean(axis=0))
+                            )
+                            zoom = 10 - int(radius_km / 15.0)
+                            if choice_renderer == 'deck.gl':
+                                # 区画番号のみを送りクライアント側で多角形を組み立てる
+                                geometry = hd.hazard_deck(df, '1kmメッシュ', center, zoom, height=700)
+                            else:
+                                geometry = px.choropleth_mapbox(
+                                    df, 
+                                    geojson=mg.MESH_GEOMETRY.feature_collection(df['1kmメッシュ']), 
+                                    locations='1kmメッシュ', 
+                                    color='警報注意報',
+                                    color_discrete_map=cmn.CATEGORY_VS_COLOR,
+                                    center=center,
+                                    hover_data=['警報注意報', '都道府県名', '市区町村名', '緯度', '経度', '1kmメッシュ'],
+                                    mapbox_style='open-street-map',
+                                    opacity=0.5,
+                                    zoom=zoom, 
+                                    height=700
+                                )
+
+                        with tr.span('styler'):
+                            # 前期と今期を左結合したハザードリスト(共有キャッシュ)を範囲内のメッシュで抽出
+                            _diff = rl.load_derived(
+                                choice_date, 
+                                choice_animal, 
+                                choice_predict, 
+                                'diff', 
+                                'hazard_list', 
+                                rsum.hazard_list
+                            )
+                            _diff = _diff[_diff['grid3rd'].isin(df['1kmメッシュ'])]
+                            df_color = rsum.style_alerts(_diff, rsum.TRANSITION_COLUMNS)
+
+                            # 統計情報の作成(範囲内のメッシュのみを集計)
+                            count_now = rsum.count_alerts(df)
+                            count_now.columns = ['警報・注意報(今期)', '地点数']
+                            count_now = rsum.style_alerts(count_now, ['警報・注意報(今期)'])
+
+                            # 統計情報の作成(範囲内のメッシュのみを集計)
+                            count_combinations = rsum.count_transitions(diff)
+                            count_combinations = rsum.style_alerts(count_combinations, rsum.TRANSITION_COLUMNS)
+
+                        # 表示
+                        title.title(f'表示期間：{signature}')
+                        mapchart.title('ハザードマップ')
+                        with tr.span('plotly_chart'):
+                            if choice_renderer == 'deck.gl':
+                                mapchart.pydeck_chart(geometry, use_container_width=True)
+                            else:
+                                mapchart.plotly_chart(geometry, use_container_width=True)
+                        with tr.span('dataframe'):
+                            listchart.title('ハザードリスト')
+                            listchart.dataframe(df_color, height=700, use_container_width=True)
+                            nowlist.title('今期の合計数')
+                            nowlist.dataframe(count_now, height=200, use_container_width=True)
+                            comblist.title('前期今期の組み合わせ合計数')
+                            comblist.dataframe(count_combinations, height=200, use_container_width=True)
+
+                        # 前後の期間・予測を先読みする
+                        rp.PREFETCHER.schedule(
+                            choice_date, 
+                            choice_animal, 
+                            choice_predict, 
+                            kinds=['alert', 'diff'], 
+                            derived=[
+                                ('alert', 'mesh_index', si.MeshIndex.from_frame),
+                                ('diff', 'hazard_list', rsum.hazard_list)
+                            ]
+                        )
+
+                    else:
+                        # 存在しない住所が入力された場合
+                        st.error(f'入力された住所(={input_address})は存在しません')
+
+                # 段階別計測の結果(デバッグ表示時はサイドバーに表示する)
+                dp.render_trace_panel(trace)
+
+                #########################
+                #### データロード待ち ####
+                #########################
+        finally:
+            st.session_state.loading = False    # 決定ボタン活性化(例外で終了したときも戻す)
 
     st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
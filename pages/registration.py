@@ -1,7 +1,10 @@
+from pathlib import Path
 from datetime import datetime as dt
 import streamlit as st
 import src.utility.const as const
 import src.navigate.app2menu as a2m
+import src.common as cmn
+import src.store.sighting_log as slog
 
 # ページ表記
 st.set_page_config(
@@ -31,6 +34,7 @@ with st.form("sighting_form"):
     sighting_date = st.date_input("目撃年月日", value=dt.now(), help="目撃された日付を選択してください。")
     animal_name = st.text_input("目撃動物名", max_chars=50, help="目撃した動物の名前を入力してください。")
     sighting_count = st.number_input("目撃頭数", min_value=1, help="目撃した頭数を入力してください。")
+    sighting_category = st.selectbox("種別", cmn.RISK_CATEGORIES, help="目撃時の被害の種別を選択してください。")
     
     # 住所or緯度経度
     if location_type == '住所':
@@ -51,34 +55,62 @@ with st.form("sighting_form"):
 
 # 確認画面表示
 if submitted:
+    # 数値として読めない緯度経度はエラーとする
+    try:
+        lat_value = float(latitude) if latitude else None
+        lon_value = float(longitude) if longitude else None
+    except ValueError:
+        lat_value, lon_value = None, None
+        latitude, longitude = '', ''
+
     # 必須項目のバリデーション
     if not animal_name or sighting_count < 1 or not sighting_date:
         st.error("目撃年月日、目撃頭数、目撃動物名は必須項目です。")
     elif location_type == '住所' and not address:
         st.error("住所を入力してください。")
     elif location_type == '緯度経度' and (not latitude or not longitude):
-        st.error("緯度と経度を入力してください。")
+        st.error("緯度と経度を数値で入力してください。")
+    else:
+        # 確定ボタン押下時の再実行でも内容を保持する
+        st.session_state['pending_report'] = {
+            'date': sighting_date,
+            'animal': animal_name,
+            'category': sighting_category,
+            'head': sighting_count,
+            'address': address,
+            'lat': lat_value,
+            'lon': lon_value,
+            'photo': photo.getvalue() if photo else None,
+            'photo_suffix': Path(photo.name).suffix if photo else '.jpg',
+            'situation': situation,
+            'remarks': remarks
+        }
+
+if (report := st.session_state.get('pending_report')) is not None:
+    # 入力内容の確認画面
+    st.write("以下の内容で登録しますか？")
+    st.write(f"目撃年月日: {report['date']}")
+    st.write(f"目撃動物名: {report['animal']}")
+    st.write(f"目撃頭数: {report['head']}")
+    st.write(f"種別: {report['category']}")
+    
+    if report['address']:
+        st.write(f"住所: {report['address']}")
     else:
-        # 入力内容の確認画面
-        st.write("以下の内容で登録しますか？")
-        st.write(f"目撃年月日: {sighting_date}")
-        st.write(f"目撃動物名: {animal_name}")
-        st.write(f"目撃頭数: {sighting_count}")
-        
-        if location_type == '住所':
-            st.write(f"住所: {address}")
-        else:
-            st.write(f"緯度: {latitude}, 経度: {longitude}")
-        
-        if photo:
-            st.write("目撃写真: アップロード済み")
-        else:
-            st.write("目撃写真: なし")
-        
-        st.write(f"状況説明: {situation if situation else 'なし'}")
-        st.write(f"備考: {remarks if remarks else 'なし'}")
+        st.write(f"緯度: {report['lat']}, 経度: {report['lon']}")
+    
+    if report['photo']:
+        st.write("目撃写真: アップロード済み")
+    else:
+        st.write("目撃写真: なし")
+    
+    st.write(f"状況説明: {report['situation'] if report['situation'] else 'なし'}")
+    st.write(f"備考: {report['remarks'] if report['remarks'] else 'なし'}")
 
-        # 再度確認用の確定ボタン
-        confirm = st.button("登録を確定")
-        if confirm:
-            st.success("目撃情報が登録されました！")
+    # 再度確認用の確定ボタン
+    confirm = st.button("登録を確定")
+    if confirm:
+        # 書き込みはバックグラウンドで行うため、ディスクへの書き込みを待たずに受け付ける
+        report_id = slog.get_writer().submit(**report)
+        del st.session_state['pending_report']
+        st.success(f"目撃情報が登録されました！(受付番号: {report_id})")
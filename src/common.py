@@ -3,7 +3,6 @@ from pathlib import Path
 from datetime import datetime as dt
 import numpy as np
 import pandas as pd
-from sklearn.neighbors import BallTree
 
 #==================================================================================================#
 # 定数
@@ -15,6 +14,7 @@ MONTH_INTERVAL = 3    # インターバル月数
 EPSILON = 0.000001
 PREDICT_MAX_WEEK = 8
 MAX_CLUSTER_NUM = 4
+EARTH_RADIUS = 6378    # 地球の半径[km]
 PREF_NAMW_VS_CODE = {
     "青森県": "02",
     "岩手県": "03",
@@ -42,6 +42,9 @@ CATEGORY_VS_COLOR = {
     '遭遇': 'orange',
     '襲撃': 'red'
 }
+GRID_LAT_DIVISION = {1: 1.5, 2: 12.0, 3: 120.0}    # 次数ごとの緯度方向の分割数(1度あたり)
+GRID_LON_DIVISION = {1: 1.0, 2: 8.0, 3: 80.0}    # 次数ごとの経度方向の分割数(1度あたり)
+GRID_SIZE_IN_3RD = np.array([0, 80, 10, 1])    # 次数ごとの一辺の長さ(3次メッシュ区画数)
 EXTRACT_ALERT_COLUMNS = {
     '警報・注意報(前期)': '警報・注意報(前期)',
     '警報・注意報': '警報・注意報(今期)',
@@ -69,7 +72,7 @@ def calc_grid1st(lon: float, lat: float) -> int:
         int: 1次メッシュ(4桁)
 
     """
-    return int(lat * 1.5) * 100 + int(lon - 100.0)
+    return int(calc_grid_array(lon, lat, level=1))
 
 def calc_grid2nd(lon: float, lat: float) -> int:
     """2次メッシュ計算関数
@@ -88,8 +91,7 @@ def calc_grid2nd(lon: float, lat: float) -> int:
         int: 2次メッシュ(6桁)
 
     """
-    grid1st = calc_grid1st(lon, lat) * 100
-    return grid1st + int(lat * 12.0 % 8) * 10 + int((lon - 100.0) * 8.0) % 8
+    return int(calc_grid_array(lon, lat, level=2))
 
 def calc_grid3rd(lon: float, lat: float) -> int:
     """3次メッシュ計算関数
@@ -108,8 +110,7 @@ def calc_grid3rd(lon: float, lat: float) -> int:
         int: 3次メッシュ(6桁)
 
     """
-    grid2nd = calc_grid2nd(lon, lat) * 100
-    return grid2nd + int(lat * 120 % 10) * 10 + int((lon - 100) * 80) % 10
+    return int(calc_grid_array(lon, lat, level=3))
 
 def calc_grid2lonlat(mesh: int) -> tuple:
     """メッシュ緯度経度変換処理
@@ -125,23 +126,8 @@ def calc_grid2lonlat(mesh: int) -> tuple:
             float: 緯度
 
     """
-    # どんな桁が来ても6桁に置換する処理
-    strmesh = str(mesh)
-    strmesh = strmesh + '0' * (8 - len(strmesh))
-
-    # 上4桁の処理(1次メッシュ)
-    lat = float(strmesh[:2]) / 1.5
-    lon = float(strmesh[2:4]) + 100.0
-
-    # 上5～6桁の処理(2次メッシュ)
-    lat += float(strmesh[4]) / 12.0
-    lon += float(strmesh[5]) / 8.0
-
-    # 下2桁の処理(3次メッシュ)
-    lat += float(strmesh[6]) / 120.0
-    lon += float(strmesh[7]) / 80.0
-
-    return (lon, lat)
+    (minlon, minlat, _, _) = calc_grid2bounds_array(mesh)
+    return (float(minlon), float(minlat))
 
 def calc_next2point(
     mesh: int, 
@@ -153,6 +139,7 @@ def calc_next2point(
     """隣接メッシュ算出
 
     原点のメッシュコードに隣接するメッシュコードを算出する
+    1次、2次メッシュが与えられた場合はその南西端の3次メッシュを原点とする
 
     Args:
         mesh (int): 原点メッシュコード
@@ -165,30 +152,196 @@ def calc_next2point(
         int: 隣接するメッシュコード
 
     """
-    # 原点の緯度経度
-    (lon, lat) = calc_grid2lonlat(mesh)
+    # 原点を3次メッシュに揃える
+    level = int(calc_grid_level_array(mesh))
+    mesh3rd = int(mesh) * 100 ** (3 - level)
+
+    return int(
+        calc_next2point_array(
+            mesh3rd, 
+            dlon=int(right) - int(left), 
+            dlat=int(up) - int(down)
+        )
+    )
+
+def calc_grid_array(lon, lat, level: int=3) -> np.ndarray:
+    """メッシュ一括計算関数
+
+    経度・緯度の配列から任意の次数のメッシュコードを整数演算で一括算出する
+    各次数の区画番号はその次数の分割数を掛けた値の整数部から求め、
+    上位の桁はそこからの商で求めるため、次数間で矛盾しない
+        1次: 緯度 × 1.5、(経度 - 100) × 1
+        2次: 緯度 × 12、(経度 - 100) × 8
+        3次: 緯度 × 120、(経度 - 100) × 80
+
+    Args:
+        lon (array_like): 経度
+        lat (array_like): 緯度
+        level (int): メッシュ次数(1～3)
+
+    Returns:
+        ndarray: メッシュコード(int64)
+
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    lat_idx = np.floor(lat * GRID_LAT_DIVISION[level]).astype(np.int64)
+    lon_idx = np.floor((lon - 100.0) * GRID_LON_DIVISION[level]).astype(np.int64)
+
+    return _calc_index2grid(lat_idx, lon_idx, level)
+
+def calc_grid_level_array(mesh) -> np.ndarray:
+    """メッシュ次数判定関数
+
+    メッシュコードの桁数(4, 6, 8桁)から次数を判定する
+
+    Args:
+        mesh (array_like): 1～3次メッシュ
+
+    Returns:
+        ndarray: メッシュ次数(1～3)
+
+    """
+    mesh = np.asarray(mesh, dtype=np.int64)
+    return np.where(mesh < 10**4, 1, np.where(mesh < 10**6, 2, 3)).astype(np.int64)
+
+def calc_grid2index_array(mesh) -> tuple:
+    """メッシュ区画番号一括算出関数
+
+    1～3次メッシュ(次数混在可)の南西端を3次メッシュの区画単位(緯度1/120度、経度1/80度)の
+    番号で表す
+        緯度 = 緯度方向の番号 / 120
+        経度 = 100 + 経度方向の番号 / 80
+
+    Args:
+        mesh (array_like): 1～3次メッシュ
+
+    Returns:
+        tuple: 区画番号情報
+            ndarray: 緯度方向の番号
+            ndarray: 経度方向の番号
+            ndarray: 一辺の長さ(3次メッシュ区画数)
+
+    """
+    mesh = np.asarray(mesh, dtype=np.int64)
+    level = calc_grid_level_array(mesh)
+    (lat_idx, lon_idx) = _calc_grid2index(mesh * 100 ** (3 - level), 3)
+
+    return (lat_idx, lon_idx, GRID_SIZE_IN_3RD[level])
+
+def calc_grid2bounds_array(mesh) -> tuple:
+    """メッシュ範囲一括算出関数
+
+    1～3次メッシュ(次数混在可)の南西端と北東端の緯度経度を整数演算で一括算出する
+
+    Args:
+        mesh (array_like): 1～3次メッシュ
+
+    Returns:
+        tuple: 緯度経度情報
+            ndarray: 最小経度(南西端)
+            ndarray: 最小緯度(南西端)
+            ndarray: 最大経度(北東端)
+            ndarray: 最大緯度(北東端)
+
+    """
+    # 3次メッシュの区画単位(緯度1/120度、経度1/80度)の番号へ変換する
+    (lat_idx, lon_idx, size) = calc_grid2index_array(mesh)
+
+    return (
+        100.0 + lon_idx / GRID_LON_DIVISION[3],
+        lat_idx / GRID_LAT_DIVISION[3],
+        100.0 + (lon_idx + size) / GRID_LON_DIVISION[3],
+        (lat_idx + size) / GRID_LAT_DIVISION[3]
+    )
+
+def calc_grid_parent_array(mesh, level: int) -> np.ndarray:
+    """上位メッシュ一括算出関数
+
+    Args:
+        mesh (array_like): 1～3次メッシュ
+        level (int): 求める上位メッシュの次数(元の次数以下)
+
+    Returns:
+        ndarray: 上位メッシュコード
+
+    """
+    mesh = np.asarray(mesh, dtype=np.int64)
+    current = calc_grid_level_array(mesh)
+    if np.any(current < level):
+        raise ValueError(f'{level}次より下位のメッシュが含まれています.')
 
-    if left:
-        # 経度に関して原点-1/80.0
-        lon -= (1.0 / 80.0)
+    return mesh // 100 ** (current - level)
 
-    if right:
-        # 経度に関して原点+1/80.0
-        lon += (1.0 / 80.0)
+def calc_grid_children_array(mesh) -> np.ndarray:
+    """下位メッシュ一括算出関数
 
-    if left:
-        # 経度に関して原点-1/80.0
-        lon -= (1.0 / 80.0)
+    1次メッシュは64個の2次メッシュへ、2次メッシュは100個の3次メッシュへ展開する
 
-    if up:
-        # 緯度に関して原点+1/120.0
-        lat += (1.0 / 120.0)
+    Args:
+        mesh (array_like): 同じ次数の1次または2次メッシュ
+
+    Returns:
+        ndarray: 下位メッシュコード(行が元のメッシュ、列が下位メッシュ)
+
+    """
+    mesh = np.atleast_1d(np.asarray(mesh, dtype=np.int64))
+    levels = np.unique(calc_grid_level_array(mesh))
+    if len(levels) > 1 or (len(levels) == 1 and levels[0] == 3):
+        raise ValueError('同じ次数の1次または2次メッシュを指定してください.')
 
-    if down:
-        # 緯度に関して原点-1/120.0
-        lat -= (1.0 / 120.0)
+    level = int(levels[0]) if len(levels) == 1 else 1
+    division = 8 if level == 1 else 10
+    x, y = np.divmod(np.arange(division * division, dtype=np.int64), division)
 
-    return calc_grid3rd(lon, lat)
+    return mesh[:, np.newaxis] * 100 + (x * 10 + y)[np.newaxis, :]
+
+def calc_next2point_array(mesh, dlon=0, dlat=0) -> np.ndarray:
+    """隣接メッシュ一括算出関数
+
+    3次メッシュを経度方向にdlon区画、緯度方向にdlat区画ずらしたメッシュを整数演算で算出する
+
+    Args:
+        mesh (array_like): 3次メッシュ
+        dlon (array_like): 経度方向の移動区画数(正は東)
+        dlat (array_like): 緯度方向の移動区画数(正は北)
+
+    Returns:
+        ndarray: 移動先の3次メッシュ
+
+    """
+    lat_idx, lon_idx = _calc_grid2index(np.asarray(mesh, dtype=np.int64), 3)
+    return _calc_index2grid(
+        lat_idx + np.asarray(dlat, dtype=np.int64), 
+        lon_idx + np.asarray(dlon, dtype=np.int64), 
+        3
+    )
+
+def _calc_index2grid(lat_idx: np.ndarray, lon_idx: np.ndarray, level: int) -> np.ndarray:
+    # 各次数の区画番号からメッシュコードを組み立てる
+    if level == 1:
+        return lat_idx * 100 + lon_idx
+
+    if level == 2:
+        (lat1st, lat2nd) = np.divmod(lat_idx, 8)
+        (lon1st, lon2nd) = np.divmod(lon_idx, 8)
+        return (lat1st * 100 + lon1st) * 100 + lat2nd * 10 + lon2nd
+
+    (lat_idx, lat3rd) = np.divmod(lat_idx, 10)
+    (lon_idx, lon3rd) = np.divmod(lon_idx, 10)
+    return _calc_index2grid(lat_idx, lon_idx, 2) * 100 + lat3rd * 10 + lon3rd
+
+def _calc_grid2index(mesh: np.ndarray, level: int) -> tuple:
+    # メッシュコードを各次数の区画番号へ分解する
+    if level == 1:
+        return np.divmod(mesh, 100)
+
+    (upper, lower) = np.divmod(mesh, 100)
+    (lat_idx, lon_idx) = _calc_grid2index(upper, level - 1)
+    (lat_low, lon_low) = np.divmod(lower, 10)
+    division = 8 if level == 2 else 10
+
+    return (lat_idx * division + lat_low, lon_idx * division + lon_low)
 
 def haversine(x1: float, x2: float, y1: float, y2: float) -> float:
     """ハーバーサイン法による距離算出処理
@@ -213,7 +366,7 @@ def haversine(x1: float, x2: float, y1: float, y2: float) -> float:
     # return 6378.137 * np.acos(
     #     np.sin(y1) * np.sin(y2) + np.cos(y1) * np.cos(y2) * np.cos(x2 - x1)
     # )
-    return 6378 * c
+    return EARTH_RADIUS * c
 
 def abc_categorizer(cumsum_ratio: float) -> str:
     """ABC分析に基づくカテゴライズ関数
@@ -271,6 +424,7 @@ def data_combin_b2w_2p_in_latlon(
 
     緯度経度を持っているsrc, dstの二つのデータに関して
     srcの任意の行と緯度経度が一番近いdstのある行と左結合させるための関数
+    k>1、距離の上限、メッシュコードでの結合等は src.geo.nearest_join を直接用いる
 
     Args:
         src (DataFrame): 結合元データ
@@ -283,21 +437,13 @@ def data_combin_b2w_2p_in_latlon(
         DataFrame: 結合後のデータ
 
     """
-    copy = src.copy()
-    src_coords = np.radians(src[src_latlon_columns])
-    dst_coords = np.radians(dst[dst_latlon_columns])
-    tree = BallTree(
-        dst_coords, 
-        leaf_size=15, 
-        metric='haversine'
+    # BallTreeは結合先ごとに再利用し、srcはチャンクに分けて検索する
+    import src.geo.nearest_join as nj
+    joiner = nj.get_joiner(dst, latlon_columns=dst_latlon_columns)
+
+    return joiner.join(
+        src,
+        columns_in_dst2add2src,
+        dst=dst,
+        latlon_columns=src_latlon_columns
     )
-    _, indices = tree.query(
-        src_coords, 
-        k=1
-    )
-    copy[columns_in_dst2add2src] = dst.loc[
-        dst_coords.iloc[indices.flatten()].index, 
-        columns_in_dst2add2src
-    ].values
-
-    return copy
\ No newline at end of file
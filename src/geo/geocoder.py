@@ -0,0 +1,423 @@
+import os
+import time
+import json
+import bisect
+import sqlite3
+import logging
+import argparse
+import threading
+import unicodedata
+import urllib.parse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import pandas as pd
+import requests
+from cachetools import LRUCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+BASEPATH = Path(os.path.dirname(os.path.abspath(__file__))).parent.parent
+# data と cache を置くルートは環境変数で上書き可能(合成データでの計測等)
+DATA_ROOT = Path(os.environ.get('WHM_DATA_ROOT', BASEPATH))
+# 地名辞書(pref_name, city_name, town_name, lat, lon のcp932のCSV)
+# 国土交通省「位置参照情報」(大字・町丁目レベル)から python -m src.geo.geocoder で作成する
+GAZETTEER_PATH = DATA_ROOT.joinpath('data', 'gazetteer', '地名一覧.csv')
+GEOCODE_CACHE_PATH = DATA_ROOT.joinpath('cache', 'geocode.sqlite')
+GSI_API = "https://msearch.gsi.go.jp/address-search/AddressSearch?q="    # 国土地理院API
+GSI_TIMEOUT = (0.3, 0.6)    # (接続, 読み込み)のタイムアウト[s]
+GSI_RETRY = 0    # クリック時の検索では再試行しない
+GSI_BUDGET = 0.8    # 国土地理院APIの応答を待つ最大時間[s]
+GSI_COOLDOWN = 60.0    # 国土地理院APIの失敗後、呼び出しを止める時間[s]
+GSI_WORKERS = 4
+LRU_SIZE = 4096
+# 使用するジオコーダ
+# (chain: 地名辞書の結果を国土地理院APIで補正, gazetteer: 地名辞書のみ, gsi: 国土地理院APIのみ)
+GEOCODER_BACKEND = os.environ.get('WHM_GEOCODER', 'chain')
+
+logger = logging.getLogger(__name__)
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class Geocoder:
+    """ジオコーダ基底クラス
+
+    住所文字列から経度緯度を求める処理の共通インタフェース
+
+    """
+    def geocode(self, address: str):
+        """住所検索処理
+
+        Args:
+            address (str): 住所
+
+        Returns:
+            tuple | None: 見つかった場合は(経度, 緯度)、見つからない場合はNone
+
+        """
+        raise NotImplementedError
+
+class GazetteerGeocoder(Geocoder):
+    """地名辞書ジオコーダ
+
+    ローカルの地名辞書(都道府県名, 市区町村名, 町字名, 緯度, 経度)を正規化した文字列で索引し、
+    入力住所に前方一致する最長の地名の代表点を返す
+    都道府県名を省いた表記でも検索できるよう、都道府県名なしの地名も索引する
+
+    Args:
+        path (Path): 地名辞書のCSVパス(cp932)
+
+    """
+    def __init__(self, path: Path=GAZETTEER_PATH):
+        self.path = Path(path)
+        self._index = {}
+        if self.path.exists():
+            self._build(pd.read_csv(self.path, encoding='cp932', dtype=str))
+        else:
+            logger.warning('地名辞書がないため、地名辞書での住所検索は行いません: %s', self.path)
+
+        self._names = sorted(self._index.keys())
+
+    def geocode(self, address: str):
+        query = normalize_address(address)
+        if not query:
+            return None
+
+        # 入力住所に前方一致する最長の地名(番地等は無視する)
+        for end in range(len(query), 0, -1):
+            if (point := self._index.get(query[:end])) is not None:
+                return point
+
+        # 入力住所で始まる地名(入力が地名の途中までの場合)
+        pos = bisect.bisect_left(self._names, query)
+        if pos < len(self._names) and self._names[pos].startswith(query):
+            return self._index[self._names[pos]]
+
+        return None
+
+    def geocode_exact(self, address: str):
+        """住所完全一致検索処理
+
+        Args:
+            address (str): 住所
+
+        Returns:
+            tuple | None: 正規化した住所全体が地名と一致した場合は(経度, 緯度)、それ以外はNone
+
+        """
+        return self._index.get(normalize_address(address))
+
+    def _build(self, gazetteer: pd.DataFrame):
+        gazetteer = gazetteer.fillna('')
+        if 'town_name' not in gazetteer.columns:
+            gazetteer['town_name'] = ''
+
+        for row in gazetteer.itertuples(index=False):
+            point = (float(row.lon), float(row.lat))
+            for name in (
+                row.pref_name + row.city_name + row.town_name,
+                row.city_name + row.town_name
+            ):
+                # 同名の地名は先に登録されたもの(上位の行)を優先する
+                if (key := normalize_address(name)):
+                    self._index.setdefault(key, point)
+
+class GsiGeocoder(Geocoder):
+    """国土地理院APIジオコーダ
+
+    タイムアウトと再試行を設定したセッションで国土地理院のAddressSearchを呼び出す
+    通信に失敗した場合は例外GeocoderUnavailableを送出する
+    応答を待つ時間の上限と失敗後の停止は GuardedGeocoder で行う
+
+    Args:
+        timeout (tuple): (接続, 読み込み)のタイムアウト[s]
+        retry (int): 再試行回数
+
+    """
+    def __init__(self, timeout: tuple=GSI_TIMEOUT, retry: int=GSI_RETRY):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount(
+            'https://',
+            HTTPAdapter(
+                max_retries=Retry(
+                    total=retry,
+                    backoff_factor=0.2,
+                    status_forcelist=(429, 500, 502, 503, 504)
+                )
+            )
+        )
+
+    def geocode(self, address: str):
+        s_quote = urllib.parse.quote(address)
+        try:
+            response = self.session.get(GSI_API + s_quote, timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise GeocoderUnavailable(str(e)) from e
+
+        if len(result) == 0:
+            return None
+
+        (lon, lat) = result[0]['geometry']['coordinates']
+        return (float(lon), float(lat))
+
+class GuardedGeocoder(Geocoder):
+    """時間制限付きジオコーダ
+
+    別のジオコーダを作業スレッドで呼び出し、応答を最大 budget 秒だけ待つ
+    時間切れまたは通信失敗の後は cooldown 秒の間呼び出しを止め(サーキットブレーカ)、
+    いずれの場合も例外GeocoderUnavailableを送出する
+
+    Args:
+        backend (Geocoder): 実際に検索を行うジオコーダ
+        budget (float): 応答を待つ最大時間[s]
+        cooldown (float): 失敗後に呼び出しを止める時間[s]
+        workers (int): 作業スレッド数
+
+    """
+    def __init__(
+        self,
+        backend: Geocoder,
+        budget: float=GSI_BUDGET,
+        cooldown: float=GSI_COOLDOWN,
+        workers: int=GSI_WORKERS
+    ):
+        self.backend = backend
+        self.budget = budget
+        self.cooldown = cooldown
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='geocoder')
+        self._lock = threading.Lock()
+        self._open_until = 0.0
+
+    def geocode(self, address: str):
+        with self._lock:
+            if (remaining := self._open_until - time.monotonic()) > 0:
+                raise GeocoderUnavailable(f'直前の失敗のため停止中です(残り{remaining:.0f}秒)')
+
+        future = self._executor.submit(self.backend.geocode, address)
+        try:
+            return future.result(timeout=self.budget)
+        except FutureTimeout:
+            self._trip()
+            raise GeocoderUnavailable(f'{self.budget}秒以内に応答がありません') from None
+        except GeocoderUnavailable:
+            self._trip()
+            raise
+
+    def _trip(self):
+        with self._lock:
+            self._open_until = time.monotonic() + self.cooldown
+
+class CachedGeocoder(Geocoder):
+    """キャッシュ付きジオコーダ
+
+    メモリ上のLRUキャッシュとSQLiteのディスクキャッシュを通して別のジオコーダを呼び出す
+    住所が見つからなかった結果もキャッシュし、通信失敗はキャッシュしない
+
+    Args:
+        backend (Geocoder): 実際に検索を行うジオコーダ
+        path (Path): ディスクキャッシュのパス(Noneのときメモリのみ)
+        maxsize (int): LRUキャッシュの件数
+
+    """
+    def __init__(self, backend: Geocoder, path: Path=GEOCODE_CACHE_PATH, maxsize: int=LRU_SIZE):
+        self.backend = backend
+        self._memory = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS geocode (address TEXT PRIMARY KEY, point TEXT)'
+            )
+            self._db.commit()
+
+    def geocode(self, address: str):
+        key = normalize_address(address)
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT point FROM geocode WHERE address = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    point = json.loads(row[0])
+                    point = tuple(point) if point is not None else None
+                    self._memory[key] = point
+                    return point
+
+        # 通信中はロックを解放し、他のセッションの検索を妨げない
+        point = self.backend.geocode(address)
+        with self._lock:
+            self._memory[key] = point
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO geocode (address, point) VALUES (?, ?)',
+                    (key, json.dumps(point))
+                )
+                self._db.commit()
+
+        return point
+
+class ChainGeocoder(Geocoder):
+    """連結ジオコーダ
+
+    登録順にジオコーダを呼び出し、最初に見つかった結果を返す
+    通信に失敗したジオコーダは見つからなかったものとして扱う
+
+    Args:
+        backends (list): ジオコーダのリスト
+
+    """
+    def __init__(self, backends: list):
+        self.backends = backends
+
+    def geocode(self, address: str):
+        for backend in self.backends:
+            try:
+                if (point := backend.geocode(address)) is not None:
+                    return point
+            except GeocoderUnavailable as e:
+                logger.warning('%s が利用できません: %s', type(backend).__name__, e)
+
+        return None
+
+class RefiningGeocoder(Geocoder):
+    """補正付きジオコーダ
+
+    地名辞書の結果を基本とし、住所全体が地名と一致しないとき(番地等を含むとき)のみ
+    別のジオコーダで補正する
+    補正側が見つからない・利用できない場合は地名辞書の結果をそのまま返す
+
+    Args:
+        gazetteer (GazetteerGeocoder): 地名辞書ジオコーダ
+        refiner (Geocoder): 補正に用いるジオコーダ
+
+    """
+    def __init__(self, gazetteer: GazetteerGeocoder, refiner: Geocoder):
+        self.gazetteer = gazetteer
+        self.refiner = refiner
+
+    def geocode(self, address: str):
+        if (point := self.gazetteer.geocode_exact(address)) is not None:
+            return point
+
+        point = self.gazetteer.geocode(address)
+        try:
+            refined = self.refiner.geocode(address)
+        except GeocoderUnavailable as e:
+            logger.warning('%s が利用できません: %s', type(self.refiner).__name__, e)
+            return point
+
+        return refined if refined is not None else point
+
+class GeocoderUnavailable(Exception):
+    """ジオコーダ通信失敗例外"""
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def normalize_address(address: str) -> str:
+    """住所正規化関数
+
+    全角英数字・記号を半角に揃え(NFKC)、空白を除き、ハイフン類と「ヵ」の表記ゆれを統一する
+
+    Args:
+        address (str): 住所
+
+    Returns:
+        str: 正規化した住所
+
+    """
+    text = unicodedata.normalize('NFKC', address or '')
+    text = ''.join(text.split())
+    for hyphen in ('‐', '‑', '–', '—', '−'):
+        text = text.replace(hyphen, '-')
+
+    return text.replace('ヵ', 'ヶ')
+
+_GEOCODER = None
+_GEOCODER_LOCK = threading.Lock()
+
+def get_geocoder() -> Geocoder:
+    """ジオコーダ取得関数
+
+    環境変数WHM_GEOCODERで選択したジオコーダをプロセス内で一つだけ作成して返す
+
+    Returns:
+        Geocoder: ジオコーダ
+
+    """
+    global _GEOCODER
+    with _GEOCODER_LOCK:
+        if _GEOCODER is None:
+            match GEOCODER_BACKEND:
+                case 'gazetteer':
+                    _GEOCODER = GazetteerGeocoder()
+                case 'gsi':
+                    _GEOCODER = CachedGeocoder(GuardedGeocoder(GsiGeocoder()))
+                case _:
+                    # 地名辞書で即答し、国土地理院APIは時間制限内で番地等の補正にのみ用いる
+                    _GEOCODER = RefiningGeocoder(
+                        GazetteerGeocoder(), CachedGeocoder(GuardedGeocoder(GsiGeocoder()))
+                    )
+
+    return _GEOCODER
+
+def build_gazetteer(sources: list, csvpath: Path=GAZETTEER_PATH) -> int:
+    """地名辞書作成処理
+
+    国土交通省「位置参照情報」(大字・町丁目レベル、都道府県ごとのCSV)から地名辞書を作成する
+    町字の行に加え、市区町村・都道府県の代表点(町字の代表点の平均)の行も書き出す
+
+    Args:
+        sources (list): 位置参照情報のCSVパスのリスト
+        csvpath (Path): 出力先のCSVパス
+
+    Returns:
+        int: 書き出した行数
+
+    """
+    towns = pd.concat(
+        [
+            pd.read_csv(
+                source,
+                encoding='cp932',
+                usecols=['都道府県名', '市区町村名', '大字町丁目名', '緯度', '経度'],
+                dtype={'都道府県名': str, '市区町村名': str, '大字町丁目名': str}
+            )
+            for source in sources
+        ],
+        ignore_index=True
+    ).rename(
+        columns={
+            '都道府県名': 'pref_name', '市区町村名': 'city_name', '大字町丁目名': 'town_name',
+            '緯度': 'lat', '経度': 'lon'
+        }
+    )
+    cities = towns.groupby(['pref_name', 'city_name'], sort=False)[['lat', 'lon']].mean().reset_index()
+    prefectures = towns.groupby('pref_name', sort=False)[['lat', 'lon']].mean().reset_index()
+
+    # 同名の地名は上位の行が優先されるため、都道府県→市区町村→町字の順に並べる
+    gazetteer = pd.concat([prefectures, cities, towns], ignore_index=True)
+    gazetteer = gazetteer.fillna({'city_name': '', 'town_name': ''})
+    csvpath = Path(csvpath)
+    csvpath.parent.mkdir(parents=True, exist_ok=True)
+    gazetteer[['pref_name', 'city_name', 'town_name', 'lat', 'lon']].to_csv(csvpath, index=False, encoding='cp932')
+
+    return len(gazetteer)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='位置参照情報(大字・町丁目レベル)から地名辞書を作成する')
+    parser.add_argument('sources', nargs='+', type=Path, help='位置参照情報のCSV(都道府県ごと)')
+    parser.add_argument('--output', type=Path, default=GAZETTEER_PATH, help='出力先のCSVパス')
+    args = parser.parse_args()
+    print(f'{build_gazetteer(args.sources, args.output)}件の地名を書き出しました: {args.output}')
@@ -0,0 +1,240 @@
+from functools import lru_cache
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+import src.common as cmn
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+NEIGHBOR_OFFSETS = {    # 連結の種類 → (経度方向, 緯度方向)の移動区画数
+    4: [(-1, 0), (1, 0), (0, -1), (0, 1)],
+    8: [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)]
+}
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class MeshAdjacency:
+    """メッシュ隣接インデックス
+
+    同じ次数のメッシュコードを昇順に並べた位置(密な番号)を頂点とし、
+    隣接関係をCSR形式の疎行列で保持する
+    隣接・kリング・連結領域の問い合わせを配列単位で行える
+
+    Args:
+        codes (array_like): 対象とするメッシュコード(同じ次数)
+        connectivity (int): 4(上下左右)または8(斜めを含む)
+
+    """
+    def __init__(self, codes, connectivity: int=8):
+        codes = np.unique(np.asarray(codes, dtype=np.int64))
+        levels = np.unique(cmn.calc_grid_level_array(codes))
+        if len(levels) > 1:
+            raise ValueError(f'メッシュの次数が揃っていません: {levels.tolist()}')
+
+        self.codes = codes
+        self.level = int(levels[0]) if len(levels) else 3
+        self.connectivity = connectivity
+
+        # 各方向の隣接メッシュのうち、対象に含まれるものだけを辺とする
+        rows = []
+        cols = []
+        for dlon, dlat in NEIGHBOR_OFFSETS[connectivity]:
+            positions = self.positions(self.shift(codes, dlon, dlat))
+            valid = positions >= 0
+            rows.append(np.flatnonzero(valid))
+            cols.append(positions[valid])
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+
+        self.matrix = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.int8), (rows, cols)),
+            shape=(len(codes), len(codes))
+        )
+        self.degree = np.diff(self.matrix.indptr)
+
+    @classmethod
+    def from_grid1st(cls, grid1st_list: list, connectivity: int=8) -> 'MeshAdjacency':
+        """1次メッシュからのインデックス作成処理
+
+        指定した1次メッシュに含まれる全ての3次メッシュを対象とする
+
+        Args:
+            grid1st_list (list): 1次メッシュコード
+            connectivity (int): 4(上下左右)または8(斜めを含む)
+
+        Returns:
+            MeshAdjacency: 隣接インデックス
+
+        """
+        grid2nd = cmn.calc_grid_children_array(np.unique(grid1st_list)).ravel()
+        grid3rd = cmn.calc_grid_children_array(grid2nd).ravel()
+        return cls(grid3rd, connectivity=connectivity)
+
+    def shift(self, codes, dlon=0, dlat=0) -> np.ndarray:
+        """メッシュ移動処理
+
+        メッシュを経度方向にdlon区画、緯度方向にdlat区画(いずれもこのインデックスの次数の区画)ずらす
+
+        Args:
+            codes (array_like): メッシュコード
+            dlon (array_like): 経度方向の移動区画数(正は東)
+            dlat (array_like): 緯度方向の移動区画数(正は北)
+
+        Returns:
+            ndarray: 移動先のメッシュコード
+
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        size = cmn.GRID_SIZE_IN_3RD[self.level]
+        # 南西端の3次メッシュを区画の大きさの分だけ動かし、元の次数に戻す
+        moved = cmn.calc_next2point_array(
+            codes * 100 ** (3 - self.level),
+            dlon=np.asarray(dlon) * size,
+            dlat=np.asarray(dlat) * size
+        )
+        return cmn.calc_grid_parent_array(moved, self.level)
+
+    def positions(self, codes) -> np.ndarray:
+        """頂点番号取得処理
+
+        Args:
+            codes (array_like): メッシュコード
+
+        Returns:
+            ndarray: 頂点番号(対象外のメッシュは-1)
+
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(self.codes) == 0:
+            return np.full(codes.shape, -1, dtype=np.int64)
+
+        positions = np.searchsorted(self.codes, codes)
+        clipped = np.minimum(positions, len(self.codes) - 1)
+        found = (positions < len(self.codes)) & (self.codes[clipped] == codes)
+
+        return np.where(found, positions, -1)
+
+    def neighbors(self, codes) -> tuple:
+        """隣接メッシュ取得処理
+
+        Args:
+            codes (array_like): メッシュコード
+
+        Returns:
+            tuple: CSR形式の隣接メッシュ(i番目のメッシュの隣接はcodes[indptr[i]:indptr[i + 1]])
+                ndarray: indptr
+                ndarray: 隣接メッシュコード
+
+        """
+        positions = self.positions(codes)
+        # 対象外のメッシュは隣接なしとする
+        rows = self.matrix[np.maximum(positions, 0)]
+        counts = np.where(positions >= 0, np.diff(rows.indptr), 0)
+        keep = np.repeat(positions >= 0, np.diff(rows.indptr))
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+
+        return (indptr, self.codes[rows.indices[keep]])
+
+    def neighbor_sum(self, values: np.ndarray) -> np.ndarray:
+        """隣接メッシュの値の合計処理
+
+        Args:
+            values (ndarray): self.codesの順に並んだ値(2次元のときは列ごと)
+
+        Returns:
+            ndarray: 各メッシュの隣接メッシュの値の合計
+
+        """
+        return self.matrix @ values
+
+    def k_ring_matrix(self, k: int) -> sp.csr_matrix:
+        """kリング行列作成処理
+
+        各メッシュからk区画以内(自身を含む)に到達できるメッシュを表す疎行列を作成する
+        平滑化等で全メッシュのkリングを一度に使う場合に用いる
+
+        Args:
+            k (int): 区画数
+
+        Returns:
+            csr_matrix: kリング行列(self.codesの順)
+
+        """
+        step = (self.matrix + sp.identity(len(self.codes), dtype=np.int8, format='csr')).astype(bool)
+        reach = sp.identity(len(self.codes), dtype=bool, format='csr')
+        for _ in range(k):
+            reach = (reach @ step).astype(bool)
+
+        return reach.tocsr()
+
+    def k_ring(self, codes, k: int) -> np.ndarray:
+        """kリング取得処理
+
+        Args:
+            codes (array_like): 起点のメッシュコード
+            k (int): 区画数
+
+        Returns:
+            ndarray: いずれかの起点からk区画以内(起点を含む)のメッシュコード(昇順)
+
+        """
+        positions = self.positions(codes)
+        reached = np.zeros(len(self.codes), dtype=bool)
+        reached[positions[positions >= 0]] = True
+        frontier = reached.copy()
+        for _ in range(k):
+            frontier = (self.matrix @ frontier.astype(np.int8)) > 0
+            frontier &= ~reached
+            if not frontier.any():
+                break
+            reached |= frontier
+
+        return self.codes[reached]
+
+    def connected_regions(self, codes) -> np.ndarray:
+        """連結領域算出処理
+
+        指定したメッシュ(ホットスポット等)だけからなる部分グラフの連結成分を求める
+
+        Args:
+            codes (array_like): メッシュコード
+
+        Returns:
+            ndarray: codesの順に並んだ連結領域の番号(対象外のメッシュは-1)
+
+        """
+        positions = self.positions(codes)
+        valid = positions >= 0
+        selected = np.unique(positions[valid])
+        if len(selected) == 0:
+            return np.full(len(positions), -1, dtype=np.int64)
+
+        _, labels = connected_components(
+            self.matrix[selected][:, selected],
+            directed=False
+        )
+        regions = np.full(len(positions), -1, dtype=np.int64)
+        regions[valid] = labels[np.searchsorted(selected, positions[valid])]
+
+        return regions
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+@lru_cache(maxsize=8)
+def get_adjacency(grid1st: tuple, connectivity: int=8) -> MeshAdjacency:
+    """1次メッシュ単位の隣接インデックス取得処理
+
+    同じ1次メッシュの組み合わせに対しては一度作成したインデックスを再利用する
+
+    Args:
+        grid1st (tuple): 1次メッシュコード
+        connectivity (int): 4(上下左右)または8(斜めを含む)
+
+    Returns:
+        MeshAdjacency: 隣接インデックス
+
+    """
+    return MeshAdjacency.from_grid1st(list(grid1st), connectivity=connectivity)
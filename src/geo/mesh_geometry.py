@@ -0,0 +1,111 @@
+import threading
+import numpy as np
+import src.common as cmn
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class MeshGeometryStore:
+    """メッシュ形状ストア
+
+    メッシュコードをキーに、メッシュの四角形の座標(閉じた外周5点)をプロセス内で共有する
+    メッシュの形状は解析期間によらず不変のため、一度計算したものは破棄しない
+    座標はメッシュコードから整数演算で一括算出する
+
+    """
+    def __init__(self):
+        # (昇順のメッシュコード, 外周座標(メッシュ, 外周点, 経度緯度))を一組で差し替える
+        self._stored = (
+            np.empty(0, dtype=np.int64), 
+            np.empty((0, 5, 2), dtype=np.float64)
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        (codes, rings) = self._stored
+        return codes.nbytes + rings.nbytes
+
+    def rings(self, codes) -> np.ndarray:
+        """外周座標取得処理
+
+        Args:
+            codes (array_like): メッシュコード
+
+        Returns:
+            ndarray: 外周座標(メッシュ, 外周点, 経度緯度)
+
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        stored_codes, stored_rings = self._ensure(codes)
+        return stored_rings[np.searchsorted(stored_codes, codes)]
+
+    def feature_collection(self, codes) -> dict:
+        """GeoJSON作成処理
+
+        メッシュコードをidに持つGeoJSONのFeatureCollectionを作成する
+        plotlyのchoropleth系ではlocationsにメッシュコードの列を指定して結合する
+
+        Args:
+            codes (array_like): メッシュコード
+
+        Returns:
+            dict: GeoJSON(FeatureCollection)
+
+        """
+        codes = np.unique(np.asarray(codes, dtype=np.int64))
+        rings = self.rings(codes).tolist()
+        return {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'id': code,
+                    'properties': {},
+                    'geometry': {'type': 'Polygon', 'coordinates': [ring]}
+                }
+                for code, ring in zip(codes.tolist(), rings)
+            ]
+        }
+
+    def _ensure(self, codes: np.ndarray) -> tuple:
+        # 未計算のメッシュのみを一括で計算して追加する
+        (stored_codes, stored_rings) = self._stored
+        if np.isin(codes, stored_codes).all():
+            return (stored_codes, stored_rings)
+
+        with self._lock:
+            (stored_codes, stored_rings) = self._stored
+            missing = np.setdiff1d(codes, stored_codes)
+            if len(missing) != 0:
+                merged_codes = np.concatenate([stored_codes, missing])
+                merged_rings = np.concatenate([stored_rings, calc_mesh_rings(missing)])
+                order = np.argsort(merged_codes, kind='stable')
+                self._stored = (merged_codes[order], merged_rings[order])
+
+            return self._stored
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def calc_mesh_rings(codes) -> np.ndarray:
+    """メッシュ外周座標一括算出関数
+
+    南西端から時計回り(南西→北西→北東→南東→南西)の閉じた外周座標を算出する
+
+    Args:
+        codes (array_like): 1～3次メッシュ
+
+    Returns:
+        ndarray: 外周座標(メッシュ, 外周点, 経度緯度)
+
+    """
+    (minlon, minlat, maxlon, maxlat) = cmn.calc_grid2bounds_array(
+        np.atleast_1d(np.asarray(codes, dtype=np.int64))
+    )
+    lons = np.stack([minlon, minlon, maxlon, maxlon, minlon], axis=1)
+    lats = np.stack([minlat, maxlat, maxlat, minlat, minlat], axis=1)
+
+    return np.stack([lons, lats], axis=2)
+
+MESH_GEOMETRY = MeshGeometryStore()
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import src.common as cmn
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+ALERT_ORDER = list(cmn.CATEGORY_VS_COLOR.keys())    # － < 安全 < 目撃 < 遭遇 < 襲撃
+MAX_POLYGONS = 5000    # 自動選択時に一度に描画するメッシュ数の上限
+# 詳細表示エリア(1次メッシュ)を選んだときの上限(1次メッシュ内の3次メッシュ数 80×80 で、常に1kmメッシュとなる)
+SUBAREA_MAX_POLYGONS = 6400
+LEVEL_LABELS = {
+    1: '80kmメッシュ',
+    2: '10kmメッシュ',
+    3: '1kmメッシュ'
+}
+LEVEL_ZOOMS = {    # 都道府県全域を表示するときの次数ごとの初期ズーム
+    1: 6,
+    2: 7,
+    3: 7
+}
+SUBAREA_ZOOM = 9    # 詳細表示エリア(1次メッシュ)を表示するときの初期ズーム
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def aggregate_alerts(
+    df: pd.DataFrame,
+    level: int,
+    by: list = [],
+    mesh_column: str = 'grid3rd',
+    alert_column: str = '警報注意報'
+) -> pd.DataFrame:
+    """上位メッシュ集約関数
+
+    3次メッシュの警報・注意報を1次または2次メッシュへ集約する
+    集約後の警報・注意報は配下のメッシュのうち最も危険度の高いものとする
+
+    Args:
+        df (DataFrame): 警報注意情報
+        level (int): 集約先のメッシュ次数(1～3)
+        by (list): メッシュの前に付ける集約キー(都道府県コード等)
+        mesh_column (str): 3次メッシュの列名
+        alert_column (str): 警報・注意報の列名
+
+    Returns:
+        DataFrame: 集約キー、mesh(集約後のメッシュコード)、警報注意報、メッシュ数、
+            minlon、minlat、maxlon、maxlat の列を持つ集約結果
+
+    """
+    alerts = pd.Categorical(df[alert_column], categories=ALERT_ORDER, ordered=True)
+    frame = df[by].copy()
+    frame['mesh'] = cmn.calc_grid_parent_array(df[mesh_column].to_numpy(), level)
+    frame['rank'] = alerts.codes    # 順序付きカテゴリの番号が大きいほど危険度が高い
+
+    grouped = frame.groupby(by + ['mesh'], sort=True).agg(
+        rank=('rank', 'max'),
+        count=('rank', 'size')
+    ).reset_index()
+
+    result = grouped[by + ['mesh']].copy()
+    result[alert_column] = pd.Categorical.from_codes(
+        grouped['rank'].to_numpy(),
+        categories=ALERT_ORDER,
+        ordered=True
+    )
+    result['メッシュ数'] = grouped['count'].to_numpy()
+    (
+        result['minlon'],
+        result['minlat'],
+        result['maxlon'],
+        result['maxlat']
+    ) = cmn.calc_grid2bounds_array(result['mesh'].to_numpy())
+
+    return result
+
+def choose_level(codes, max_polygons: int=MAX_POLYGONS) -> int:
+    """表示次数自動選択関数
+
+    描画するメッシュ数がmax_polygons以下となる最も細かい次数を選ぶ
+
+    Args:
+        codes (array_like): 3次メッシュ
+        max_polygons (int): 描画するメッシュ数の上限
+
+    Returns:
+        int: メッシュ次数(1～3)
+
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    for level in (3, 2):
+        if len(np.unique(cmn.calc_grid_parent_array(codes, level))) <= max_polygons:
+            return level
+
+    return 1
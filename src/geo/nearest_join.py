@@ -0,0 +1,293 @@
+import os
+import weakref
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+import src.common as cmn
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+CHUNK_SIZE = 200_000    # 1回の検索で扱うsrcの行数(作業用メモリの上限を決める)
+N_JOBS = int(os.environ.get('WHM_JOIN_JOBS', os.cpu_count() or 1))    # 並列に検索するチャンク数
+JOINER_CACHE_SIZE = 8    # 保持するdst(気象・土地利用等)の数
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class NearestJoiner:
+    """最近傍結合エンジン
+
+    dstの緯度経度からハーバーサイン距離のBallTreeを一度だけ作成し、
+    srcをチャンクに分けて並列に検索することで、同じdstへの繰り返しの結合を高速化する
+    dstとsrcの両方がメッシュコードを持つ場合は、メッシュコードの一致で結合し、
+    一致しない行だけをBallTreeで検索する
+    エンジンは緯度経度(及びメッシュコード)のみに依存し、付加する列の値は結合ごとに渡すdstから取り出す
+
+    Args:
+        dst (DataFrame): 結合先データ
+        latlon_columns (list): dst側の緯度経度の列名
+        mesh_column (str): dst側のメッシュコードの列名(Noneのときメッシュでの結合を行わない)
+
+    """
+    def __init__(
+        self,
+        dst: pd.DataFrame,
+        latlon_columns: list = ['lat', 'lon'],
+        mesh_column: str = None
+    ):
+        self.dst = dst
+        self.latlon_columns = latlon_columns
+        self.mesh_column = mesh_column
+        self._coords = dst[latlon_columns].to_numpy(dtype=np.float64)
+        self.tree = BallTree(
+            np.radians(self._coords),
+            leaf_size=15,
+            metric='haversine'
+        )
+
+        # メッシュコード → dstの行位置(重複時は先頭の行)
+        self._mesh_index = None
+        self._mesh_level = None
+        if mesh_column is not None:
+            codes = dst[mesh_column].to_numpy(dtype=np.int64)
+            levels = np.unique(cmn.calc_grid_level_array(codes))
+            if len(levels) != 1:
+                raise ValueError(f'{mesh_column}の次数が揃っていません: {levels.tolist()}')
+            self._mesh_level = int(levels[0])
+            self._mesh_index = pd.Index(codes).drop_duplicates(keep='first')
+            self._mesh_positions = pd.Index(codes).get_indexer(self._mesh_index)
+
+    def query(
+        self,
+        lat,
+        lon,
+        k: int = 1,
+        max_distance_km: float = None,
+        chunk_size: int = CHUNK_SIZE,
+        n_jobs: int = N_JOBS
+    ) -> tuple:
+        """最近傍検索処理
+
+        Args:
+            lat (array_like): 緯度[deg]
+            lon (array_like): 経度[deg]
+            k (int): 近い順に取得する件数
+            max_distance_km (float): 距離の上限[km](超えたものは行位置-1とする)
+            chunk_size (int): 1回の検索で扱う行数
+            n_jobs (int): 並列に検索するチャンク数
+
+        Returns:
+            tuple: 検索結果
+                ndarray: dstの行位置(行数×k、該当なしは-1)
+                ndarray: 距離[km](行数×k、該当なしはNaN)
+
+        """
+        coords = np.radians(np.column_stack([lat, lon]).astype(np.float64))
+        positions = np.full((len(coords), k), -1, dtype=np.int64)
+        distances = np.full((len(coords), k), np.nan, dtype=np.float64)
+
+        # 結果は事前に確保した配列へ書き込み、チャンクごとの作業領域のみを都度確保する
+        def work(start: int):
+            stop = min(start + chunk_size, len(coords))
+            dist, idx = self.tree.query(coords[start:stop], k=k)
+            dist = dist * cmn.EARTH_RADIUS
+            if max_distance_km is not None:
+                far = dist > max_distance_km
+                idx[far] = -1
+                dist[far] = np.nan
+            positions[start:stop] = idx
+            distances[start:stop] = dist
+
+        starts = range(0, len(coords), chunk_size)
+        if n_jobs > 1 and len(starts) > 1:
+            # BallTreeの検索はGILを解放するためスレッドで並列化できる
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                list(executor.map(work, starts))
+        else:
+            for start in starts:
+                work(start)
+
+        return (positions, distances)
+
+    def join(
+        self,
+        src: pd.DataFrame,
+        columns: list,
+        dst: pd.DataFrame = None,
+        latlon_columns: list = ['lat', 'lon'],
+        mesh_column: str = None,
+        k: int = 1,
+        max_distance_km: float = None,
+        distance_column: str = None,
+        chunk_size: int = CHUNK_SIZE,
+        n_jobs: int = N_JOBS
+    ) -> pd.DataFrame:
+        """最近傍結合処理
+
+        k=1のときはcolumnsをそのままの列名で、k>1のときは「列名_順位」(順位は1始まり)で
+        srcに付加する。距離の上限を超えた近傍の値は欠損とする
+        srcは複製せず(浅いコピーに列を追加する)、元のsrcは変更しない
+
+        Args:
+            src (DataFrame): 結合元データ
+            columns (list): srcに結合したいdstの列名
+            dst (DataFrame): 値を取り出す結合先データ(エンジン作成時と同じ緯度経度の並び、Noneのとき作成時のdst)
+            latlon_columns (list): src側の緯度経度の列名
+            mesh_column (str): src側のメッシュコードの列名(dst側にもある場合はメッシュで結合する)
+            k (int): 近い順に結合する件数
+            max_distance_km (float): 距離の上限[km]
+            distance_column (str): 距離[km]を付加する列名(Noneのとき付加しない)
+            chunk_size (int): 1回の検索で扱う行数
+            n_jobs (int): 並列に検索するチャンク数
+
+        Returns:
+            DataFrame: 結合後のデータ
+
+        """
+        positions = np.full((len(src), k), -1, dtype=np.int64)
+        distances = np.full((len(src), k), np.nan, dtype=np.float64)
+        pending = np.ones(len(src), dtype=bool)
+
+        # k=1でメッシュコードが一致する行はdstのメッシュ(中心点)に結合する
+        if k == 1 and mesh_column is not None and self._mesh_index is not None:
+            matched = self._match_mesh(src[mesh_column].to_numpy(dtype=np.int64))
+            hit = matched >= 0
+            positions[hit, 0] = matched[hit]
+            pending = ~hit
+            if distance_column is not None and hit.any():
+                distances[hit, 0] = _haversine_array(
+                    src[latlon_columns].to_numpy(dtype=np.float64)[hit],
+                    self._coords[matched[hit]]
+                )
+
+        if pending.any():
+            lat, lon = latlon_columns
+            (positions[pending], distances[pending]) = self.query(
+                src[lat].to_numpy()[pending],
+                src[lon].to_numpy()[pending],
+                k=k,
+                max_distance_km=max_distance_km,
+                chunk_size=chunk_size,
+                n_jobs=n_jobs
+            )
+
+        dst = self.dst if dst is None else dst
+        joined = src.copy(deep=False)
+        for rank in range(k):
+            suffix = '' if k == 1 else f'_{rank + 1}'
+            for col in columns:
+                joined[f'{col}{suffix}'] = _take(dst[col], positions[:, rank])
+            if distance_column is not None:
+                joined[f'{distance_column}{suffix}'] = distances[:, rank]
+
+        return joined
+
+    def join_chunks(self, chunks, columns: list, **kwargs):
+        """チャンク単位の最近傍結合処理
+
+        read_csv(chunksize=...)等で分割して読み込んだsrcを順に結合して返す
+
+        Args:
+            chunks (iterable): 結合元データのチャンク
+            columns (list): srcに結合したいdstの列名
+            **kwargs: joinに渡す引数
+
+        Yields:
+            DataFrame: 結合後のチャンク
+
+        """
+        for chunk in chunks:
+            yield self.join(chunk, columns, **kwargs)
+
+    def _match_mesh(self, codes: np.ndarray) -> np.ndarray:
+        # srcのメッシュをdstの次数に揃えてハッシュ表で引く(dstより粗いメッシュは一致なし)
+        levels = cmn.calc_grid_level_array(codes)
+        matched = np.full(len(codes), -1, dtype=np.int64)
+        finer = levels >= self._mesh_level
+        if finer.any():
+            parents = cmn.calc_grid_parent_array(codes[finer], self._mesh_level)
+            found = self._mesh_index.get_indexer(parents)
+            matched[finer] = np.where(found >= 0, self._mesh_positions[found], -1)
+
+        return matched
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def get_joiner(
+    dst: pd.DataFrame,
+    latlon_columns: list = ['lat', 'lon'],
+    mesh_column: str = None
+) -> NearestJoiner:
+    """最近傍結合エンジン取得処理
+
+    dstの緯度経度(及びメッシュコード)の内容が同じであれば作成済みのエンジンを再利用する
+    エンジンはセッション間で共有されるため、付加する列の値は join の引数 dst で渡すこと
+    同じDataFrameが繰り返し渡された場合は内容のハッシュ値を計算し直さない
+    (緯度経度をその場で書き換えたdstは別のDataFrameとして渡すこと)
+
+    Args:
+        dst (DataFrame): 結合先データ
+        latlon_columns (list): dst側の緯度経度の列名
+        mesh_column (str): dst側のメッシュコードの列名
+
+    Returns:
+        NearestJoiner: 最近傍結合エンジン
+
+    """
+    key_columns = tuple(latlon_columns) + (() if mesh_column is None else (mesh_column,))
+    key = _joiner_key(dst, key_columns)
+
+    with _JOINER_LOCK:
+        joiner = _JOINERS.get(key)
+        if joiner is not None:
+            _JOINERS.move_to_end(key)
+            return joiner
+
+    joiner = NearestJoiner(dst, latlon_columns=latlon_columns, mesh_column=mesh_column)
+    with _JOINER_LOCK:
+        _JOINERS[key] = joiner
+        while len(_JOINERS) > JOINER_CACHE_SIZE:
+            _JOINERS.popitem(last=False)
+
+    return joiner
+
+def _joiner_key(dst: pd.DataFrame, key_columns: tuple) -> tuple:
+    # dstの緯度経度等の内容のハッシュ値(同じDataFrameについては一度だけ計算する)
+    with _JOINER_LOCK:
+        known = _KEYS_BY_ID.get((id(dst), key_columns))
+        if known is not None and known[0]() is dst:
+            return known[1]
+
+    hashed = pd.util.hash_pandas_object(dst[list(key_columns)], index=False).to_numpy()
+    key = (hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest(), key_columns)
+    with _JOINER_LOCK:
+        ident = (id(dst), key_columns)
+        _KEYS_BY_ID[ident] = (weakref.ref(dst, lambda _, ident=ident: _KEYS_BY_ID.pop(ident, None)), key)
+
+    return key
+
+def _take(series: pd.Series, positions: np.ndarray):
+    # 行位置で値を取り出す(-1は型に応じた欠損値とする)
+    values = series.array
+    if isinstance(values, pd.arrays.NumpyExtensionArray):
+        values = values.to_numpy()
+
+    return pd.api.extensions.take(values, positions, allow_fill=True)
+
+def _haversine_array(src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    # 緯度経度の組(行ごと)の大円距離[km]
+    (lat1, lon1) = np.radians(src).T
+    (lat2, lon2) = np.radians(dst).T
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+
+    return 2 * cmn.EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+_JOINERS = OrderedDict()
+_KEYS_BY_ID = {}    # (id(dst), 列名) → (dstの弱参照, キー)
+_JOINER_LOCK = threading.Lock()
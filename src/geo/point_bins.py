@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import src.common as cmn
+import src.geo.mesh_lod as lod
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+POINT_LIMIT = 3000    # これを超える件数はメッシュに集約して描画する
+MAX_CELLS = 3000    # 集約時に描画するメッシュ数の上限
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def needs_binning(df: pd.DataFrame, point_limit: int=POINT_LIMIT) -> bool:
+    """集約要否判定関数
+
+    Args:
+        df (DataFrame): 描画する出没情報
+        point_limit (int): 個別の地点として描画する件数の上限
+
+    Returns:
+        bool: メッシュに集約して描画するかどうか
+
+    """
+    return len(df) > point_limit
+
+def bin_points(
+    df: pd.DataFrame,
+    level: int = None,
+    max_cells: int = MAX_CELLS,
+    lat_column: str = '緯度',
+    lon_column: str = '経度',
+    date_column: str = '出没日',
+    head_column: str = '出没数'
+) -> pd.DataFrame:
+    """出没地点のメッシュ集約関数
+
+    出没地点をメッシュごとにまとめ、件数・出没数の合計・最新の出没日を求める
+    描画位置はメッシュの中心とする
+
+    Args:
+        df (DataFrame): 出没情報
+        level (int): 集約先のメッシュ次数(1～3、Noneのときmax_cells以下となる最も細かい次数)
+        max_cells (int): 次数を自動選択するときのメッシュ数の上限
+        lat_column (str): 緯度の列名
+        lon_column (str): 経度の列名
+        date_column (str): 出没日の列名
+        head_column (str): 出没数の列名
+
+    Returns:
+        DataFrame: メッシュ、出没件数、出没数、最新出没日、緯度、経度 の列を持つ集約結果
+
+    """
+    lat = df[lat_column].to_numpy(dtype=np.float64)
+    lon = df[lon_column].to_numpy(dtype=np.float64)
+    codes = cmn.calc_grid_array(lon, lat, level=3)
+    if level is None:
+        level = lod.choose_level(codes, max_polygons=max_cells)
+
+    frame = pd.DataFrame({
+        'メッシュ': cmn.calc_grid_parent_array(codes, level),
+        '出没件数': 1,
+        '出没数': df[head_column].to_numpy(),
+        '最新出没日': df[date_column].to_numpy()
+    })
+    result = frame.groupby('メッシュ', sort=True).agg(
+        出没件数=('出没件数', 'size'),
+        出没数=('出没数', 'sum'),
+        最新出没日=('最新出没日', 'max')
+    ).reset_index()
+
+    (minlon, minlat, maxlon, maxlat) = cmn.calc_grid2bounds_array(result['メッシュ'].to_numpy())
+    result['緯度'] = (minlat + maxlat) / 2
+    result['経度'] = (minlon + maxlon) / 2
+
+    return result
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+import src.common as cmn
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class MeshIndex:
+    """メッシュ空間インデックス
+
+    解析結果の各行の緯度経度をハーバーサイン距離のBallTreeに格納し、
+    半径検索で候補となるメッシュのみを参照できるようにする
+
+    Args:
+        lat (ndarray): 緯度[deg]
+        lon (ndarray): 経度[deg]
+
+    """
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        coords = np.radians(
+            np.column_stack([lat, lon]).astype(np.float64)
+        )
+        self.size = coords.shape[0]
+        self.tree = BallTree(
+            coords,
+            leaf_size=40,
+            metric='haversine'
+        ) if self.size != 0 else None
+        self.nbytes = coords.nbytes * 2    # 座標データとツリー構造の概算
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        latlon_columns: list = ['minlat', 'minlon']
+    ) -> 'MeshIndex':
+        """解析結果からのインデックス作成処理
+
+        Args:
+            df (DataFrame): 解析結果
+            latlon_columns (list): 緯度経度の列名
+
+        Returns:
+            MeshIndex: 空間インデックス
+
+        """
+        lat, lon = latlon_columns
+        return cls(df[lat].to_numpy(), df[lon].to_numpy())
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> tuple:
+        """半径検索処理
+
+        指定地点から半径radius_km以内にある行の位置と距離を返す
+
+        Args:
+            lat (float): 緯度[deg]
+            lon (float): 経度[deg]
+            radius_km (float): 半径[km]
+
+        Returns:
+            tuple: 検索結果
+                ndarray: 行位置(昇順)
+                ndarray: 距離[km]
+
+        """
+        if self.tree is None:
+            return (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64))
+
+        indices, distances = self.tree.query_radius(
+            np.radians([[lat, lon]]),
+            r=radius_km / cmn.EARTH_RADIUS,
+            return_distance=True
+        )
+        # 元データの行順を保つ
+        order = np.argsort(indices[0], kind='stable')
+        return (indices[0][order], distances[0][order] * cmn.EARTH_RADIUS)
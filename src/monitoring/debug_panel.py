@@ -0,0 +1,57 @@
+import os
+import pandas as pd
+import streamlit as st
+import src.monitoring.tracing as tr
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+# デバッグ表示(環境変数、またはURLのクエリ ?debug=1 で有効にする)
+DEBUG = os.environ.get('WHM_DEBUG', '') not in ('', '0')
+DEBUG_QUERY = 'debug'
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def is_debug() -> bool:
+    """デバッグ表示判定関数
+
+    Returns:
+        bool: デバッグ表示を行うときTrue
+
+    """
+    return DEBUG or st.query_params.get(DEBUG_QUERY, '') not in ('', '0')
+
+def render_trace_panel(trace: tr.Trace):
+    """処理時間表示関数
+
+    デバッグ表示が有効なとき、ページ実行の処理段階ごとの時間をサイドバーに表示する
+
+    Args:
+        trace (Trace): 終了した計測記録
+
+    """
+    if trace is None or not is_debug():
+        return
+
+    spans = pd.DataFrame(
+        [
+            {
+                '処理段階': '　' * span['depth'] + span['name'],
+                '時間[ms]': round(span['seconds'] * 1000, 1),
+                '割合[%]': round(span['seconds'] / trace.seconds * 100, 1) if trace.seconds else 0.0,
+                '例外': span['error'] or ''
+            }
+            for span in trace.spans
+        ],
+        columns=['処理段階', '時間[ms]', '割合[%]', '例外']
+    )
+    with st.sidebar.expander('処理時間(デバッグ)', expanded=True):
+        st.caption(
+            f'{trace.page} ' +
+            ' '.join(f'{key}={value}' for key, value in trace.attrs.items()) +
+            f' 合計 {trace.seconds * 1000:.1f}ms'
+        )
+        st.dataframe(spans, hide_index=True, use_container_width=True)
+        if trace.profile is not None:
+            st.caption(f'プロファイル: {trace.profile}')
@@ -0,0 +1,181 @@
+import os
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+# 処理時間のヒストグラムの区切り[s]
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# メトリクスを公開するポート(未設定のときは公開しない)と待ち受けるアドレス
+METRICS_PORT = os.environ.get('WHM_METRICS_PORT', '')
+METRICS_HOST = os.environ.get('WHM_METRICS_HOST', '127.0.0.1')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class MetricsRegistry:
+    """メトリクス集計処理
+
+    カウンタとヒストグラムをラベルの組み合わせごとにプロセス内で集計し、
+    Prometheusのテキスト形式で出力する
+
+    Args:
+        buckets (tuple): ヒストグラムの区切り(昇順)
+
+    """
+    def __init__(self, buckets: tuple=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._help = {}    # メトリクス名 → 説明
+        self._counters = {}    # メトリクス名 → ラベル → 値
+        self._histograms = {}    # メトリクス名 → ラベル → [区切りごとの件数, 合計, 件数]
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, text: str):
+        """説明設定処理
+
+        Args:
+            name (str): メトリクス名
+            text (str): 説明
+
+        """
+        self._help[name] = text
+
+    def inc(self, name: str, value: float=1.0, **labels):
+        """カウンタ加算処理
+
+        Args:
+            name (str): メトリクス名
+            value (float): 加算する値
+            **labels: ラベル
+
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """ヒストグラム記録処理
+
+        Args:
+            name (str): メトリクス名
+            value (float): 観測値
+            **labels: ラベル
+
+        """
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if (state := series.get(key)) is None:
+                state = series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> str:
+        """テキスト形式出力処理
+
+        Returns:
+            str: Prometheusのテキスト形式(0.0.4)
+
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += self._header(name, 'counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{name}{_labels(key)} {value:g}')
+
+            for name, series in sorted(self._histograms.items()):
+                lines += self._header(name, 'histogram')
+                for key, (counts, total, count) in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(self.buckets, counts):
+                        cumulative += n
+                        lines.append(f'{name}_bucket{_labels(key, le=f"{bound:g}")} {cumulative}')
+                    lines.append(f'{name}_bucket{_labels(key, le="+Inf")} {count}')
+                    lines.append(f'{name}_sum{_labels(key)} {total:g}')
+                    lines.append(f'{name}_count{_labels(key)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, name: str, kind: str) -> list:
+        header = [f'# TYPE {name} {kind}']
+        if name in self._help:
+            header.insert(0, f'# HELP {name} {self._help[name]}')
+        return header
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    # /metrics のみ応答する
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def start_metrics_server(port: str=METRICS_PORT, host: str=METRICS_HOST):
+    """メトリクス公開処理
+
+    ポートが設定されているときに限り、プロセス内で一度だけ /metrics を返すHTTPサーバを
+    バックグラウンドのスレッドで起動する(ページの再実行ごとに呼び出してよい)
+
+    Args:
+        port (str): 待ち受けるポート(空文字のときは起動しない)
+        host (str): 待ち受けるアドレス
+
+    Returns:
+        ThreadingHTTPServer | None: 起動したサーバ
+
+    """
+    global _SERVER, _SERVER_STARTED
+    with _SERVER_LOCK:
+        if _SERVER_STARTED or not port:
+            return _SERVER
+        _SERVER_STARTED = True    # 起動に失敗したときも再試行しない
+
+        try:
+            _SERVER = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+        except (OSError, ValueError):
+            logger.exception('メトリクスの公開に失敗しました: %s:%s', host, port)
+            return None
+
+        _SERVER.daemon_threads = True
+        threading.Thread(target=_SERVER.serve_forever, name='metrics-server', daemon=True).start()
+        logger.info('メトリクスを公開しました: http://%s:%s/metrics', host, port)
+        return _SERVER
+
+def _labels(key: tuple, **extra) -> str:
+    # ラベルの組み合わせを {name="value",...} の表記にする
+    items = list(key) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in items
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+REGISTRY = MetricsRegistry()
+_SERVER = None
+_SERVER_STARTED = False
+_SERVER_LOCK = threading.Lock()
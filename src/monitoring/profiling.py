@@ -0,0 +1,101 @@
+import io
+import os
+import re
+import pstats
+import logging
+import cProfile
+from pathlib import Path
+from datetime import datetime as dt
+import streamlit as st
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+BASEPATH = Path(os.path.dirname(os.path.abspath(__file__))).parent.parent
+# プロファイルを取るページ(空: 取らない、1またはall: 全ページ、カンマ区切り: 指定したページ)
+PROFILE_PAGES = os.environ.get('WHM_PROFILE', '')
+PROFILE_DIR = Path(os.environ.get('WHM_PROFILE_DIR', BASEPATH.joinpath('profiles')))    # 出力先
+PROFILE_QUERY = 'profile'    # URLのクエリ ?profile=1 で次の1回の実行のみプロファイルを取る
+SUMMARY_LINES = 60    # 要約に出力する関数の数
+UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\s]+')    # ファイル名に使えない文字
+TAG_LENGTH = 40    # ファイル名に付ける表示条件1つあたりの最大文字数
+
+logger = logging.getLogger(__name__)
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def should_profile(page: str) -> bool:
+    """プロファイル要否判定関数
+
+    環境変数で対象のページが指定されているとき、またはURLのクエリで指定されたときTrue
+    クエリは1回の実行で消費し、以降の再実行ではプロファイルを取らない
+
+    Args:
+        page (str): ページ名
+
+    Returns:
+        bool: プロファイルを取るときTrue
+
+    """
+    pages = {name.strip() for name in PROFILE_PAGES.split(',') if name.strip()}
+    if pages & {'1', 'all'} or page in pages:
+        return True
+
+    try:
+        if st.query_params.get(PROFILE_QUERY, '') in ('', '0'):
+            return False
+        del st.query_params[PROFILE_QUERY]
+        return True
+    except Exception:
+        return False    # スクリプトの実行外(先読みのスレッド等)
+
+def start_profile():
+    """プロファイル開始関数
+
+    Returns:
+        Profile | None: 開始したプロファイラ(他のプロファイラが動作中で開始できないときNone)
+
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 同時に1つしか動作できない環境で、他のセッションがプロファイル中
+        logger.warning('他のプロファイルが実行中のため、プロファイルを取りません')
+        return None
+
+    return profiler
+
+def write_profile(profiler: cProfile.Profile, page: str, attrs: dict, output_dir: Path=PROFILE_DIR) -> Path:
+    """プロファイル書き出し関数
+
+    プロファイラを止め、pstats形式のファイルと累積時間順の要約(テキスト)を
+    日時・ページ名・表示条件を付けたファイル名で書き出す
+
+    Args:
+        profiler (Profile): start_profile で開始したプロファイラ
+        page (str): ページ名
+        attrs (dict): 表示条件(基準期間、対象生物、地域等)
+        output_dir (Path): 出力先のフォルダ
+
+    Returns:
+        Path: pstats形式のファイルのパス
+
+    """
+    profiler.disable()
+
+    tags = [dt.now().strftime('%Y%m%d-%H%M%S-%f'), page] + [str(value) for value in attrs.values()]
+    stem = '_'.join(UNSAFE_CHARS.sub('-', tag)[:TAG_LENGTH] for tag in tags)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir.joinpath(f'{stem}.pstats')
+    profiler.dump_stats(path)
+
+    summary = io.StringIO()
+    summary.write(f'page={page} ' + ' '.join(f'{key}={value}' for key, value in attrs.items()) + '\n')
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(SUMMARY_LINES)
+    path.with_suffix('.txt').write_text(summary.getvalue(), encoding='utf-8')
+
+    logger.info('プロファイルを書き出しました: %s', path)
+    return path
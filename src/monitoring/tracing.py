@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime as dt
+from contextlib import contextmanager
+from contextvars import ContextVar
+import src.monitoring.metrics as mt
+import src.monitoring.profiling as pf
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+STAGE_METRIC = 'whm_stage_seconds'
+PAGE_METRIC = 'whm_page_seconds'
+RUNS_METRIC = 'whm_page_runs_total'
+ERRORS_METRIC = 'whm_stage_errors_total'
+# 計測記録のログ(1行1件のJSON)の出力先(stderr, off, またはファイルパス)
+TRACE_LOG = os.environ.get('WHM_TRACE_LOG', 'stderr')
+
+logger = logging.getLogger(__name__)
+
+mt.REGISTRY.describe(STAGE_METRIC, 'ページの処理段階ごとの処理時間[s]')
+mt.REGISTRY.describe(PAGE_METRIC, 'ページの表示全体の処理時間[s]')
+mt.REGISTRY.describe(RUNS_METRIC, 'ページの表示回数')
+mt.REGISTRY.describe(ERRORS_METRIC, '例外で終了した処理段階の回数')
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class Trace:
+    """ページ実行の計測記録
+
+    1回のページ表示(決定ボタン押下からの処理)の処理段階ごとの時間を記録する
+
+    Args:
+        page (str): ページ名
+        **attrs: 表示条件(基準期間、対象生物等)
+
+    """
+    def __init__(self, page: str, **attrs):
+        self.page = page
+        self.attrs = attrs
+        self.spans = []    # {name, start, seconds, depth, error}
+        self.seconds = None
+        self.profile = None    # 書き出したプロファイルのパス
+        self._profiler = None
+        self._start = time.perf_counter()
+        self._depth = 0
+
+    def to_dict(self) -> dict:
+        """辞書化処理
+
+        Returns:
+            dict: page, attrs, seconds, spans(時間はミリ秒)
+
+        """
+        return {
+            'page': self.page,
+            'attrs': self.attrs,
+            'seconds': self.seconds,
+            'profile': str(self.profile) if self.profile is not None else None,
+            'spans': [
+                {
+                    'name': span['name'],
+                    'start_ms': round(span['start'] * 1000, 3),
+                    'ms': round(span['seconds'] * 1000, 3),
+                    'depth': span['depth'],
+                    'error': span['error']
+                }
+                for span in self.spans
+            ]
+        }
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def start_trace(page: str, **attrs) -> Trace:
+    """計測開始処理
+
+    以降の span をこの計測記録へ記録する(セッションのスクリプト実行ごとに独立)
+    プロファイルの対象のときは計測終了までをプロファイラで計測する
+
+    Args:
+        page (str): ページ名
+        **attrs: 表示条件
+
+    Returns:
+        Trace: 計測記録
+
+    """
+    mt.start_metrics_server()
+    previous = _CURRENT.get()
+    if previous is not None and previous._profiler is not None:
+        # 終了されなかった計測のプロファイラは止めてから次の計測を始める
+        previous._profiler.disable()
+        previous._profiler = None
+    trace = Trace(page, **attrs)
+    if pf.should_profile(page):
+        trace._profiler = pf.start_profile()
+    _CURRENT.set(trace)
+    return trace
+
+@contextmanager
+def trace(page: str, **attrs):
+    """ページ実行計測処理
+
+    with trace('macro', period=...) as current: のように決定ボタン押下後の処理を囲み、
+    途中で例外が送出されたときも計測を終了して記録する
+
+    Args:
+        page (str): ページ名
+        **attrs: 表示条件
+
+    Yields:
+        Trace: 計測記録(終了後は finish_trace 済み)
+
+    """
+    current = start_trace(page, **attrs)
+    try:
+        yield current
+    finally:
+        finish_trace(current)
+
+def current_trace():
+    """実行中の計測記録取得処理
+
+    Returns:
+        Trace | None: 計測記録(計測していないときNone)
+
+    """
+    return _CURRENT.get()
+
+def digest(text: str) -> str:
+    """記録用要約関数
+
+    住所等の利用者の入力をログやプロファイルのファイル名に残さないよう、SHA-256の先頭12桁に置き換える
+    (同じ入力は同じ値となるため、記録どうしの突き合わせには使える)
+
+    Args:
+        text (str): 利用者の入力
+
+    Returns:
+        str: 要約した値(空の入力は空文字)
+
+    """
+    if not text:
+        return ''
+
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+
+@contextmanager
+def span(name: str):
+    """処理段階計測処理
+
+    with span('csv_read'): のように処理段階を囲み、時間を計測記録とメトリクスへ記録する
+    計測記録がないとき(先読みのスレッド等)はメトリクスのみへ記録する
+
+    Args:
+        name (str): 処理段階名
+
+    """
+    trace = _CURRENT.get()
+    page = trace.page if trace is not None else ''
+    record = None
+    if trace is not None:
+        record = {
+            'name': name,
+            'start': time.perf_counter() - trace._start,
+            'seconds': None,
+            'depth': trace._depth,
+            'error': None
+        }
+        trace.spans.append(record)
+        trace._depth += 1
+
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        mt.REGISTRY.inc(ERRORS_METRIC, page=page, stage=name)
+        if record is not None:
+            record['error'] = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        mt.REGISTRY.observe(STAGE_METRIC, seconds, page=page, stage=name)
+        if record is not None:
+            record['seconds'] = seconds
+            trace._depth -= 1
+
+def finish_trace(trace: Trace=None) -> Trace:
+    """計測終了処理
+
+    全体の時間を確定し、構造化ログ(1行のJSON)とメトリクスへ記録する
+    プロファイル中のときはプロファイルを書き出す
+
+    Args:
+        trace (Trace): 計測記録(省略時は実行中のもの)
+
+    Returns:
+        Trace | None: 計測記録
+
+    """
+    trace = trace or _CURRENT.get()
+    if trace is None:
+        return None
+
+    trace.seconds = time.perf_counter() - trace._start
+    if (profiler := trace._profiler) is not None:
+        trace._profiler = None
+        try:
+            trace.profile = pf.write_profile(profiler, trace.page, trace.attrs)
+        except Exception:
+            logger.exception('プロファイルの書き出しに失敗しました')
+        finally:
+            # 書き出しに失敗したときもスクリプトのスレッドでプロファイラを動かし続けない
+            profiler.disable()
+    mt.REGISTRY.inc(RUNS_METRIC, page=trace.page)
+    mt.REGISTRY.observe(PAGE_METRIC, trace.seconds, page=trace.page)
+    logger.info(
+        json.dumps(
+            {'ts': dt.now().isoformat(timespec='milliseconds'), 'event': 'page_trace', **trace.to_dict()},
+            ensure_ascii=False,
+            default=str
+        )
+    )
+    _CURRENT.set(None)
+    return trace
+
+def _configure_logger(target: str=TRACE_LOG):
+    # 計測記録のログはアプリのログ設定によらず、JSONのみを1行ずつ出力する
+    if target == 'off':
+        logger.disabled = True
+        return
+
+    handler = logging.StreamHandler(sys.stderr) if target == 'stderr' else logging.FileHandler(target, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_CURRENT = ContextVar('whm_trace', default=None)
+_configure_logger()
@@ -0,0 +1,142 @@
+import base64
+import html
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+ALARM_KINDS = ['目撃', '遭遇', '襲撃']    # 危険度の低い順
+KIND_VS_RGB = {
+    '目撃': (255, 255, 0),    # 黄色
+    '遭遇': (255, 165, 0),    # オレンジ
+    '襲撃': (255, 0, 0)    # 赤色
+}
+KIND_CLASS = {kind: f'kind{index}' for index, kind in enumerate(ALARM_KINDS)}    # CSSクラス名
+MIN_ALPHA = 0.1
+PAGE_SIZE = 100    # 1ページに表示する市区町村数
+IMAGE_WIDTH = 96    # 警報画像の表示幅[px]
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def alarm_levels(df: pd.DataFrame) -> pd.DataFrame:
+    """警報レベル算出関数
+
+    地域別警報注意報一覧から合計数がすべてゼロの市区町村を除き、列単位の演算で
+    最も危険度の高い警報と、警報ごとの色の濃さ(列の最大値に対する割合)を求める
+
+    Args:
+        df (DataFrame): 地域別警報注意報一覧(目撃合計数、遭遇合計数、襲撃合計数 の列を持つ)
+
+    Returns:
+        DataFrame: 都道府県名、市区町村名、警報レベル と警報ごとの濃さ(ゼロのときNaN)の列を持つ一覧
+
+    """
+    counts = df[[f'{kind}合計数' for kind in ALARM_KINDS]].to_numpy(dtype=np.float64)
+
+    # 色の濃さは表示対象全体の列ごとの最大値に対する割合とし、0.1～1.0に収める
+    maxima = counts.max(axis=0, initial=0.0)
+    alpha = np.divide(counts, maxima, out=np.zeros_like(counts), where=maxima > 0)
+    alpha = np.where(counts > 0, np.clip(alpha, MIN_ALPHA, 1.0), np.nan)
+
+    enabled = (counts > 0).any(axis=1)
+    # 危険度の高い警報ほど後ろにあるため、ゼロでない最後の列を警報レベルとする
+    worst = counts.shape[1] - 1 - np.argmax((counts > 0)[:, ::-1], axis=1)
+
+    result = df.loc[enabled, ['都道府県名', '市区町村名']].reset_index(drop=True)
+    result['警報レベル'] = np.array(ALARM_KINDS, dtype=object)[worst[enabled]]
+    for index, kind in enumerate(ALARM_KINDS):
+        result[kind] = alpha[enabled, index]
+
+    return result
+
+def page_count(table: pd.DataFrame, page_size: int=PAGE_SIZE) -> int:
+    """ページ数算出関数
+
+    Args:
+        table (DataFrame): 警報レベル一覧
+        page_size (int): 1ページに表示する件数
+
+    Returns:
+        int: ページ数(1以上)
+
+    """
+    return max(1, -(-len(table) // page_size))
+
+def render_alarm_html(
+    table: pd.DataFrame,
+    image_root: Path,
+    page: int = 1,
+    page_size: int = PAGE_SIZE
+) -> str:
+    """警報一覧HTML作成関数
+
+    指定ページの市区町村を1つの表として組み立てる
+    警報画像は種類ごとに1度だけCSSに埋め込み、各行からはクラス名で参照する
+
+    Args:
+        table (DataFrame): 警報レベル一覧
+        image_root (Path): 警報画像(目撃.jpg等)のフォルダ
+        page (int): 表示するページ(1始まり)
+        page_size (int): 1ページに表示する件数
+
+    Returns:
+        str: 表示用HTML
+
+    """
+    rows = table.iloc[(page - 1) * page_size:page * page_size]
+
+    # 警報ごとのセルを列単位で組み立てる
+    cells = {}
+    for kind in ALARM_KINDS:
+        (r, g, b) = KIND_VS_RGB[kind]
+        cells[kind] = [
+            '<td class="alarm-level"></td>' if np.isnan(alpha) else
+            f'<td class="alarm-level" style="background-color: rgba({r}, {g}, {b}, {alpha:.3f});">'
+            f'{kind}レベル</td>'
+            for alpha in rows[kind].to_numpy()
+        ]
+
+    names = (
+        rows['都道府県名'].astype(str).map(html.escape) + ' ' +
+        rows['市区町村名'].astype(str).map(html.escape)
+    ).to_numpy()
+    images = [
+        f'<td><div class="alarm-image alarm-{KIND_CLASS[kind]}"></div></td>'
+        for kind in rows['警報レベル'].to_numpy()
+    ]
+
+    body = ''.join(
+        f'<tr><td class="alarm-name">{name}</td>{image}{c1}{c2}{c3}</tr>'
+        for name, image, c1, c2, c3 in zip(
+            names, images, *(cells[kind] for kind in ALARM_KINDS)
+        )
+    )
+
+    return (
+        f'<style>{_image_styles(str(image_root))}'
+        '.alarm-table {width: 100%; border-collapse: separate; border-spacing: 5px;}'
+        '.alarm-name {font-size: 1.5rem; font-weight: 600; width: 30%;}'
+        '.alarm-level {padding: 10px; width: 20%;}'
+        f'.alarm-image {{width: {IMAGE_WIDTH}px; height: {IMAGE_WIDTH * 3 // 4}px; '
+        'background-size: cover; background-position: center;}'
+        '</style>'
+        f'<table class="alarm-table"><tbody>{body}</tbody></table>'
+    )
+
+@lru_cache(maxsize=16)
+def _image_styles(image_root: str) -> str:
+    # 警報画像をdata URIとしてCSSに埋め込む(画像がない警報は背景なし)
+    styles = []
+    for kind in ALARM_KINDS:
+        imagepath = Path(image_root) / f'{kind}.jpg'
+        if imagepath.exists():
+            encoded = base64.b64encode(imagepath.read_bytes()).decode('ascii')
+            styles.append(
+                f'.alarm-{KIND_CLASS[kind]} {{background-image: url(data:image/jpeg;base64,{encoded});}}'
+            )
+
+    return ''.join(styles)
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+from matplotlib.colors import to_rgb
+import src.common as cmn
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+RENDERERS = ['Plotly', 'deck.gl']    # 描画方式の選択肢
+ALERT_ORDER = list(cmn.CATEGORY_VS_COLOR.keys())
+OPACITY = 0.5
+MAP_STYLE = pdk.map_styles.CARTO_LIGHT
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def build_cells(codes) -> list:
+    """描画用メッシュ情報作成関数
+
+    メッシュの形状はクライアント側で区画番号から組み立てるため、1メッシュあたり
+    区画番号(整数)とツールチップ用のメッシュコードのみを送る
+        x: 南西端の経度方向の番号(1/80度単位)
+        y: 南西端の緯度方向の番号(1/120度単位)
+        s: 一辺の長さ(3次メッシュ区画数)
+        m: メッシュコード
+
+    Args:
+        codes (array_like): メッシュコード(1～3次メッシュ)
+
+    Returns:
+        list: 描画用メッシュ情報
+
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    (lat_idx, lon_idx, size) = cmn.calc_grid2index_array(codes)
+
+    return [
+        {'x': x, 'y': y, 's': s, 'm': m}
+        for x, y, s, m in zip(
+            lon_idx.tolist(),
+            lat_idx.tolist(),
+            np.broadcast_to(size, codes.shape).tolist(),
+            codes.tolist()
+        )
+    ]
+
+def hazard_deck(
+    df: pd.DataFrame,
+    mesh_column: str,
+    center: dict,
+    zoom: float,
+    height: int = 700,
+    alert_column: str = '警報注意報'
+) -> pdk.Deck:
+    """deck.glハザードマップ作成関数
+
+    警報・注意報ごとにPolygonLayerを分け、色はレイヤ単位で指定する
+    多角形は区画番号から文字列のアクセサ(pydeckが@@=式に変換する)でクライアント側で
+    組み立てるため、GeoJSONを送るplotlyに比べ送信量が一桁小さい
+
+    Args:
+        df (DataFrame): 警報注意情報
+        mesh_column (str): メッシュコードの列名(1～3次メッシュ)
+        center (dict): 地図の中心(lat, lon)
+        zoom (float): 初期ズーム
+        height (int): 地図の高さ[px]
+        alert_column (str): 警報・注意報の列名
+
+    Returns:
+        Deck: 描画オブジェクト
+
+    """
+    alerts = pd.Categorical(df[alert_column], categories=ALERT_ORDER)
+    codes = df[mesh_column].to_numpy(dtype=np.int64)
+
+    layers = []
+    for index, category in enumerate(ALERT_ORDER):
+        if not (selected := alerts.codes == index).any():
+            continue
+
+        cells = build_cells(codes[selected])
+        layers.append(
+            pdk.Layer(
+                'PolygonLayer',
+                id=category,
+                data=_compact_cells(cells),
+                get_polygon=_polygon_expression(cells),
+                get_fill_color=[
+                    int(round(v * 255)) for v in to_rgb(cmn.CATEGORY_VS_COLOR[category])
+                ],
+                stroked=False,
+                filled=True,
+                pickable=True,
+                opacity=OPACITY
+            )
+        )
+
+    return pdk.Deck(
+        layers=layers,
+        initial_view_state=pdk.ViewState(
+            latitude=float(center['lat']),
+            longitude=float(center['lon']),
+            zoom=zoom
+        ),
+        tooltip={'text': '{m}'},
+        map_style=MAP_STYLE,
+        height=height
+    )
+
+def _polygon_expression(cells: list) -> str:
+    # 一辺の長さが全メッシュで等しい場合は式に埋め込み、送信する項目を減らす
+    sizes = {cell['s'] for cell in cells}
+    s = str(sizes.pop()) if len(sizes) == 1 else 's'
+
+    return (
+        f'[[100 + x / 80, y / 120], [100 + x / 80, (y + {s}) / 120], '
+        f'[100 + (x + {s}) / 80, (y + {s}) / 120], [100 + (x + {s}) / 80, y / 120]]'
+    )
+
+def _compact_cells(cells: list) -> list:
+    # 一辺の長さが全メッシュで等しい場合は送信しない
+    if len({cell['s'] for cell in cells}) > 1:
+        return cells
+
+    return [{'x': cell['x'], 'y': cell['y'], 'm': cell['m']} for cell in cells]
@@ -0,0 +1,404 @@
+import os
+import json
+import logging
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import src.common as cmn
+import src.geo.mesh_adjacency as ma
+import src.store.result_store as rs
+import src.store.result_loader as rl
+import src.store.result_catalog as rc
+import src.store.sightings as sg
+import src.store.sighting_log as slog
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+ALERT_ORDER = list(cmn.CATEGORY_VS_COLOR.keys())    # － < 安全 < 目撃 < 遭遇 < 襲撃
+ALERT_KINDS = ['目撃', '遭遇', '襲撃']    # 出没情報から観測される警報・注意報(危険度の低い順)
+EVENT_VS_KIND = {    # 出没情報の種別 → 警報・注意報
+    '目撃': '目撃',
+    '食害': '遭遇',
+    '物的被害': '遭遇',
+    '遭遇': '遭遇',
+    '人的被害': '襲撃',
+    '襲撃': '襲撃'
+}
+DEFAULT_KIND = '目撃'    # 種別のない出没情報(登録フォーム等)の扱い
+NEIGHBORHOOD = 1    # 出没地点から警報・注意報を引き上げる範囲[3次メッシュ区画](1: 周囲8メッシュ)
+ABC_COLUMN = 'ABC区分'
+VERSION_FILENAME = '.incremental.json'    # 版数と取り込み済みの登録番号
+# 目撃情報の登録時に警報・注意報を差分反映するか(0: 反映せず、コマンドでの反映のみ)
+AUTO_UPDATE = os.environ.get('WHM_INCREMENTAL_ALERTS', '1') != '0'
+
+logger = logging.getLogger(__name__)
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class IncrementalAlertUpdater:
+    """警報・注意報の差分更新処理
+
+    公開済みの解析結果(予測しない)を基準に、新しい出没情報が落ちた3次メッシュとその近傍
+    (mesh_adjacency のkリング)だけの警報・注意報、前期今期の差分、
+    該当する市区町村の合計数を更新し、全件の再計算を待たずに新しい版として公開する
+        警報・注意報: 現在の値と近傍で観測された最も危険な種別のうち危険な方(週次の再計算までは下げない)
+        ABC区分: メッシュ別の出没件数の多い順の累積割合を cmn.abc_categorizer で区分
+    ABC区分は全メッシュの順位に依存するため、bootstrapで期間内の全出没件数を読み込んだ場合に限り、
+    かつ公開済みの解析結果にABC区分の列があるときのみ更新する(列を新たに追加することはない)
+
+    Args:
+        period (str): 期間(YYYYMMDD-YYYYMMDD)
+        animal (str): 対象生物
+        neighborhood (int): 警報・注意報を引き上げる範囲[3次メッシュ区画]
+
+    """
+    def __init__(self, period: str, animal: str, neighborhood: int=NEIGHBORHOOD):
+        self.period = period
+        self.animal = animal
+        self.neighborhood = neighborhood
+        self.result_dir = rs.RESULTS_ROOT.joinpath(period, animal)
+        (start, end) = period.split('-')
+        self.start = pd.Timestamp(dt.strptime(start, '%Y%m%d'))
+        self.end = pd.Timestamp(dt.strptime(end, '%Y%m%d'))
+        self._lock = threading.Lock()
+
+        self.alert = self._read('alert')
+        self._has_abc = ABC_COLUMN in self.alert.columns
+        self._bootstrapped = False
+        self.diff = self._read('diff') if self._path('diff').exists() else None
+        self.region = self._read('region') if self._path('region').exists() else None
+
+        # 解析結果の3次メッシュを含む1次メッシュで隣接インデックスを作る
+        codes = self.alert['grid3rd'].to_numpy(dtype=np.int64)
+        self.adjacency = ma.get_adjacency(tuple(np.unique(cmn.calc_grid_parent_array(codes, 1)).tolist()))
+        self._rows = self.adjacency.positions(codes)    # 解析結果の行 → 隣接インデックスの頂点番号
+        self.counts = np.zeros((len(self.adjacency.codes), len(ALERT_KINDS)), dtype=np.int64)
+        self._window = self.adjacency.k_ring_matrix(neighborhood).astype(np.int64)
+
+        state = self._read_version()
+        self.version = state['version']
+        self.checkpoint = state['checkpoint']
+
+    def bootstrap(self, sightings: pd.DataFrame, reports: pd.DataFrame=None):
+        """出没件数初期化処理
+
+        期間内の出没情報(目撃情報一覧)と反映済みの登録済み目撃情報から
+        メッシュ別・種別の出没件数を作り、ABC区分を付け直す
+
+        Args:
+            sightings (DataFrame): animal, date, lat, lon, head, category の列を持つ出没情報
+            reports (DataFrame): 反映済みの登録済み目撃情報(sighting_log.read_reportsの形式)
+
+        """
+        with self._lock:
+            self.counts[:] = 0
+            self._accumulate(sightings)
+            if reports is not None:
+                self._accumulate(reports)
+            self._bootstrapped = True
+            self._update_abc()
+
+    def apply(self, rows: pd.DataFrame) -> dict:
+        """出没情報反映処理
+
+        Args:
+            rows (DataFrame): animal, date, lat(またはgrid3rd), lon, head, category(任意) の列を持つ新しい出没情報
+
+        Returns:
+            dict: 更新結果
+                meshes (ndarray): 再計算した3次メッシュ
+                changed (ndarray): 警報・注意報が変わった3次メッシュ
+                municipalities (int): 合計数を更新した市区町村数
+
+        """
+        with self._lock:
+            (codes, kinds, heads) = self._accumulate(rows)
+            if len(codes) == 0:
+                return {'meshes': codes, 'changed': codes, 'municipalities': 0}
+
+            # 新しい出没地点の近傍にあるメッシュだけを再計算する
+            affected = self.adjacency.k_ring(codes, self.neighborhood)
+            window = self._window[self.adjacency.positions(affected)] @ self.counts
+            seen = window > 0
+            # 近傍で観測された最も危険な種別の順位(観測なしは0)
+            observed = np.where(
+                seen.any(axis=1),
+                ALERT_ORDER.index(ALERT_KINDS[0]) + seen.shape[1] - 1 - np.argmax(seen[:, ::-1], axis=1),
+                0
+            )
+
+            rows_index = pd.Index(self.alert['grid3rd'].to_numpy(dtype=np.int64))
+            targets = rows_index.get_indexer(affected)
+            present = targets >= 0
+            targets = targets[present]
+            current = _alert_rank(self.alert['警報注意報'].to_numpy()[targets])
+            # 観測された種別が現在の値より危険なときだけ引き上げる
+            raised = np.maximum(current, observed[present])
+            changed = raised != current
+            levels = self.alert['警報注意報'].astype(object).to_numpy()
+            levels[targets[changed]] = np.array(ALERT_ORDER, dtype=object)[raised[changed]]
+            self.alert['警報注意報'] = levels
+            self._update_abc()
+
+            changed_codes = affected[present][changed]
+            self._update_diff(changed_codes, levels[targets[changed]])
+            municipalities = self._update_region(codes, kinds, heads)
+            self.version += 1
+
+            return {'meshes': affected, 'changed': changed_codes, 'municipalities': municipalities}
+
+    def publish(self, checkpoint: int=None) -> int:
+        """新しい版の公開処理
+
+        更新した解析結果をCSV(cp932)として一時ファイル経由で置き換え、Arrow IPCへ取り込み直す
+        共有キャッシュは元ファイルの更新を検知して次の参照時に読み直す
+
+        Args:
+            checkpoint (int): 反映済みの登録番号(sighting_logのid)
+
+        Returns:
+            int: 公開した版数
+
+        """
+        with self._lock:
+            frames = {'alert': self.alert, 'diff': self.diff, 'region': self.region}
+            for kind, df in frames.items():
+                if df is None:
+                    continue
+                csvpath = self._path(kind)
+                tmppath = csvpath.with_name(f'.{csvpath.name}.tmp')
+                df.to_csv(tmppath, index=False, encoding=rs.CSV_ENCODING)
+                os.replace(tmppath, csvpath)
+                rs.ingest_csv(csvpath, force=True)
+            rc.refresh_dir(self.result_dir)    # 解析結果カタログのチェックサムを更新する
+
+            if checkpoint is not None:
+                self.checkpoint = checkpoint
+            self._write_version()
+
+            return self.version
+
+    def _accumulate(self, rows: pd.DataFrame) -> tuple:
+        # 対象生物・期間内の出没情報をメッシュ別・種別の件数に加算する
+        rows = rows[rows['animal'] == self.animal]
+        dates = pd.to_datetime(rows['date'])
+        rows = rows[(dates >= self.start) & (dates <= self.end)]
+        if 'grid3rd' in rows.columns:
+            rows = rows[rows['grid3rd'].notna()]
+            codes = rows['grid3rd'].to_numpy(dtype=np.int64)
+        else:
+            rows = rows[rows['lat'].notna() & rows['lon'].notna()]
+            codes = cmn.calc_grid_array(rows['lon'].to_numpy(), rows['lat'].to_numpy(), level=3)
+
+        events = rows['category'] if 'category' in rows.columns else pd.Series(DEFAULT_KIND, index=rows.index)
+        kinds = events.map(EVENT_VS_KIND).fillna(DEFAULT_KIND).map(ALERT_KINDS.index).to_numpy(dtype=np.int64)
+        heads = rows['head'].to_numpy(dtype=np.int64)
+
+        positions = self.adjacency.positions(codes)
+        inside = positions >= 0
+        np.add.at(self.counts, (positions[inside], kinds[inside]), 1)
+
+        return (codes[inside], kinds[inside], heads[inside])
+
+    def _update_abc(self):
+        # 全出没件数を読み込み済みで、公開済みの解析結果にABC区分があるときのみ付け直す
+        if self._bootstrapped and self._has_abc:
+            self.alert[ABC_COLUMN] = self._abc()
+
+    def _abc(self) -> np.ndarray:
+        # 出没件数の多い順の累積割合でABC区分を求める(出没のないメッシュは空欄)
+        totals = np.where(self._rows >= 0, self.counts[np.maximum(self._rows, 0)].sum(axis=1), 0)
+        categories = np.full(len(totals), '', dtype=object)
+        if totals.sum() == 0:
+            return categories
+
+        order = np.argsort(-totals, kind='stable')
+        ratios = np.cumsum(totals[order]) / totals.sum()
+        observed = totals[order] > 0
+        categorize = np.vectorize(cmn.abc_categorizer, otypes=[object])
+        categories[order[observed]] = categorize(ratios[observed])
+
+        return categories
+
+    def _update_diff(self, codes: np.ndarray, levels: np.ndarray):
+        # 前期今期の差分情報の今期の値を更新する
+        if self.diff is None or len(codes) == 0:
+            return
+
+        column = next(col for col in ('警報注意報(今回)', '警報注意報(今期)') if col in self.diff.columns)
+        targets = pd.Index(self.diff['grid3rd'].to_numpy(dtype=np.int64)).get_indexer(codes)
+        present = targets >= 0
+        values = self.diff[column].astype(object).to_numpy()
+        values[targets[present]] = levels[present]
+        self.diff[column] = values
+
+    def _update_region(self, codes: np.ndarray, kinds: np.ndarray, heads: np.ndarray) -> int:
+        # 出没地点のメッシュが属する市区町村の種別ごとの合計数に加算する
+        if self.region is None:
+            return 0
+
+        rows_index = pd.Index(self.alert['grid3rd'].to_numpy(dtype=np.int64))
+        found = rows_index.get_indexer(codes)
+        keep = found >= 0
+        added = pd.DataFrame({
+            '都道府県名': self.alert['都道府県名'].astype(object).to_numpy()[found[keep]],
+            '市区町村名': self.alert['市区町村名'].astype(object).to_numpy()[found[keep]],
+            'column': [f'{ALERT_KINDS[kind]}合計数' for kind in kinds[keep]],
+            'head': heads[keep]
+        }).pivot_table(
+            index=['都道府県名', '市区町村名'],
+            columns='column',
+            values='head',
+            aggfunc='sum',
+            fill_value=0
+        )
+
+        region = self.region.set_index(['都道府県名', '市区町村名'])
+        matched = added.index.intersection(region.index)
+        for col in added.columns:
+            region.loc[matched, col] = region.loc[matched, col].to_numpy() + added.loc[matched, col].to_numpy()
+        self.region = region.reset_index()[self.region.columns]
+
+        return len(matched)
+
+    def _path(self, kind: str) -> Path:
+        return self.result_dir.joinpath(rl.FILE_KINDS[kind])
+
+    def _read(self, kind: str) -> pd.DataFrame:
+        # 公開済みの解析結果を型変換前の形で読み込む(CSVへ書き戻すため)
+        return pd.read_csv(self._path(kind), encoding=rs.CSV_ENCODING)
+
+    def _read_version(self) -> dict:
+        path = self.result_dir.joinpath(VERSION_FILENAME)
+        if not path.exists():
+            return {'version': 0, 'checkpoint': 0}
+
+        return json.loads(path.read_text(encoding='utf-8'))
+
+    def _write_version(self):
+        path = self.result_dir.joinpath(VERSION_FILENAME)
+        tmppath = path.with_name(f'{path.name}.tmp')
+        tmppath.write_text(
+            json.dumps({'version': self.version, 'checkpoint': self.checkpoint}),
+            encoding='utf-8'
+        )
+        os.replace(tmppath, path)
+
+class AlertUpdateScheduler:
+    """警報・注意報の差分反映依頼処理
+
+    書き込まれた目撃情報の出没日を期間に含む解析結果(期間・対象生物)ごとに
+    update_from_reports をバックグラウンドの1スレッドで順に実行する
+    同じ期間・対象生物の未着手の依頼は1回にまとめる(反映は前回の登録番号より後の全件を対象とする)
+
+    Args:
+        path (Path): 登録済み目撃情報のSQLiteパス
+
+    """
+    def __init__(self, path: Path=slog.SIGHTING_DB_PATH):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='incremental-alerts')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def targets(self, reports: pd.DataFrame) -> list:
+        """反映対象算出処理
+
+        Args:
+            reports (DataFrame): date, animal の列を持つ目撃情報
+
+        Returns:
+            list: (期間, 対象生物)の一覧
+
+        """
+        dates = pd.to_datetime(reports['date'])
+        targets = []
+        for period in rc.RESULT_CATALOG.periods():
+            (start, end) = (pd.Timestamp(dt.strptime(day, '%Y%m%d')) for day in period.split('-'))
+            animals = set(reports.loc[(dates >= start) & (dates <= end), 'animal'])
+            targets += [(period, animal) for animal in rc.RESULT_CATALOG.animals(period) if animal in animals]
+
+        return targets
+
+    def schedule(self, reports: pd.DataFrame):
+        """反映依頼処理
+
+        Args:
+            reports (DataFrame): 書き込まれた目撃情報(sighting_log.read_reportsの形式)
+
+        """
+        for target in self.targets(reports):
+            with self._lock:
+                if target in self._pending:
+                    continue
+                self._pending.add(target)
+            self._executor.submit(self._update, target)
+
+    def _update(self, target: tuple):
+        # 実行を始めた後の登録は次の依頼で反映する
+        with self._lock:
+            self._pending.discard(target)
+
+        try:
+            result = update_from_reports(*target, path=self.path)
+            logger.info('警報・注意報を差分反映しました: %s %s', target, result)
+        except Exception:
+            logger.exception('警報・注意報の差分反映に失敗しました: %s', target)
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def update_from_reports(period: str, animal: str, path: Path=slog.SIGHTING_DB_PATH) -> dict:
+    """登録済み目撃情報の差分反映処理
+
+    前回反映した登録番号より後の目撃情報だけを反映し、新しい版として公開する
+    反映の前に期間内の目撃情報一覧と反映済みの登録済み目撃情報で出没件数を初期化する
+
+    Args:
+        period (str): 期間(YYYYMMDD-YYYYMMDD)
+        animal (str): 対象生物
+        path (Path): 登録済み目撃情報のSQLiteパス
+
+    Returns:
+        dict: 更新結果(applyの戻り値に version, checkpoint を加えたもの)
+
+    """
+    updater = IncrementalAlertUpdater(period, animal)
+    reports = slog.read_reports(path)
+    applied = reports['id'] <= updater.checkpoint
+    if applied.all():
+        return {'version': updater.version, 'checkpoint': updater.checkpoint}
+
+    try:
+        sightings = sg.SIGHTINGS.select(animal=animal, start=updater.start, end=updater.end)
+    except FileNotFoundError:
+        # 出没件数を初期化できないときはABC区分を更新しない
+        logger.warning('目撃情報一覧がないため、ABC区分は更新しません: %s', sg.SIGHTINGS.path)
+    else:
+        updater.bootstrap(sightings, reports[applied])
+
+    reports = reports[~applied]
+    result = updater.apply(reports)
+    result['checkpoint'] = int(reports['id'].max())
+    result['version'] = updater.publish(checkpoint=result['checkpoint'])
+
+    return result
+
+def _alert_rank(values: np.ndarray) -> np.ndarray:
+    # 警報・注意報を危険度の順位(－:0, 安全:1, 目撃:2, 遭遇:3, 襲撃:4)に変換する
+    return pd.Categorical(values, categories=ALERT_ORDER).codes.astype(np.int64).clip(min=0)
+
+ALERT_SCHEDULER = AlertUpdateScheduler()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='登録済み目撃情報を警報・注意報へ差分反映する')
+    parser.add_argument('period', help='期間(YYYYMMDD-YYYYMMDD)')
+    parser.add_argument('animal', help='対象生物')
+    args = parser.parse_args()
+    print(update_from_reports(args.period, args.animal))
@@ -0,0 +1,279 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime as dt
+import src.store.result_store as rs
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+CATALOG_PATH = rs.STORE_ROOT.joinpath('catalog.json')    # 生成した解析結果カタログ
+NO_PREDICT = '予測しない'
+PERIOD_PATTERN = re.compile(r'^\d{8}-\d{8}$')    # 期間(YYYYMMDD-YYYYMMDD)
+HORIZON_PATTERN = re.compile(r'^(\d+)週間先$')    # 予測フォルダ(N週間先)
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class ResultCatalog:
+    """解析結果カタログ
+
+    生成済みのカタログファイルをプロセス内で一度だけ読み込み、期間・対象生物・予測の一覧と
+    解析結果フォルダの特定を辞書の参照だけで行う
+    カタログファイルが更新されたときは読み直し、存在しないとき、または解析結果フォルダに
+    期間フォルダが追加・削除された(フォルダの更新日時がカタログより新しい)ときは作成し直す
+
+    Args:
+        path (Path): カタログファイルのパス
+        results_root (Path): 解析結果のルートフォルダ
+
+    """
+    def __init__(self, path: Path=CATALOG_PATH, results_root: Path=rs.RESULTS_ROOT):
+        self.path = Path(path)
+        self.results_root = Path(results_root)
+        self._stamp = None
+        self._catalog = None
+        self._lock = threading.Lock()
+
+    def get(self) -> dict:
+        """カタログ取得処理
+
+        Returns:
+            dict: カタログ(読み取り専用として扱うこと)
+
+        """
+        with self._lock:
+            if self._outdated():
+                write_catalog(build_catalog(self.results_root), self.path)
+
+            stat = self.path.stat()
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if stamp != self._stamp:
+                self._catalog = json.loads(self.path.read_text(encoding='utf-8'))
+                self._stamp = stamp
+
+            return self._catalog
+
+    def periods(self) -> list:
+        """期間一覧取得処理
+
+        Returns:
+            list: 期間(昇順)
+
+        """
+        return sorted(self.get()['periods'].keys())
+
+    def animals(self, period: str) -> list:
+        """対象生物一覧取得処理
+
+        Args:
+            period (str): 期間
+
+        Returns:
+            list: 対象生物
+
+        """
+        return list(self.get()['periods'].get(period, {}).keys())
+
+    def horizons(self, period: str, animal: str) -> list:
+        """予測一覧取得処理
+
+        Args:
+            period (str): 期間
+            animal (str): 対象生物
+
+        Returns:
+            list: 予測しない、N週間先 の一覧
+
+        """
+        return list(self.get()['periods'].get(period, {}).get(animal, {}).keys())
+
+    def entry(self, period: str, animal: str, horizon: str=NO_PREDICT):
+        """解析結果情報取得処理
+
+        Args:
+            period (str): 期間
+            animal (str): 対象生物
+            horizon (str): 予測選択
+
+        Returns:
+            dict | None: dir(resultsからの相対パス)、signature(表示期間)、files(ファイル種別ごとの情報)
+                カタログにないときはNone
+
+        """
+        return self.get()['periods'].get(period, {}).get(animal, {}).get(horizon)
+
+    def _outdated(self) -> bool:
+        # カタログがないとき、または解析結果フォルダ直下(期間フォルダの追加・削除)がカタログより新しいときTrue
+        try:
+            catalog_mtime = self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return True
+
+        try:
+            return self.results_root.stat().st_mtime_ns > catalog_mtime
+        except FileNotFoundError:
+            return False
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def build_catalog(results_root: Path=rs.RESULTS_ROOT) -> dict:
+    """カタログ作成処理
+
+    results配下を走査し、期間・対象生物・予測ごとの解析結果フォルダと各ファイルの
+    行数・SHA-256・サイズ・更新日時をまとめる
+    予測フォルダは「N週間先」と期間(YYYYMMDD-YYYYMMDD)の両方の命名に対応し、
+    期間の命名のものは開始日の昇順に1週間先、2週間先、…とする
+
+    Args:
+        results_root (Path): 解析結果のルートフォルダ
+
+    Returns:
+        dict: カタログ
+
+    """
+    results_root = Path(results_root)
+    periods = {}
+    for period_dir in sorted(results_root.iterdir()):
+        if not (period_dir.is_dir() and PERIOD_PATTERN.match(period_dir.name)):
+            continue
+
+        animals = {}
+        for animal_dir in sorted(p for p in period_dir.iterdir() if p.is_dir()):
+            horizons = {NO_PREDICT: describe_dir(animal_dir, results_root, period_dir.name)}
+            for horizon, dirpath in _predicted_dirs(animal_dir):
+                signature = f'{period_dir.name}({horizon})'
+                if dirpath.name != horizon:
+                    signature = f'{period_dir.name}({horizon}: {dirpath.name})'
+                horizons[horizon] = describe_dir(dirpath, results_root, signature)
+            animals[animal_dir.name] = horizons
+
+        periods[period_dir.name] = animals
+
+    return {
+        'generated_at': dt.now().isoformat(timespec='seconds'),
+        'periods': periods
+    }
+
+def describe_dir(dirpath: Path, results_root: Path, signature: str) -> dict:
+    """解析結果フォルダ情報作成処理
+
+    Args:
+        dirpath (Path): 解析結果フォルダ
+        results_root (Path): 解析結果のルートフォルダ
+        signature (str): 表示期間
+
+    Returns:
+        dict: dir、signature、files(ファイル種別ごとの name, rows, sha256, size, mtime_ns)
+
+    """
+    files = {}
+    for filename in rs.RESULT_FILENAMES:
+        csvpath = dirpath / filename
+        if csvpath.exists():
+            files[filename] = describe_file(csvpath)
+
+    return {
+        'dir': dirpath.relative_to(results_root).as_posix(),
+        'signature': signature,
+        'files': files
+    }
+
+def describe_file(csvpath: Path) -> dict:
+    """ファイル情報作成処理
+
+    Args:
+        csvpath (Path): CSVパス
+
+    Returns:
+        dict: rows(ヘッダを除く行数), sha256, size, mtime_ns
+
+    """
+    digest = hashlib.sha256()
+    lines = 0
+    last = b'\n'
+    with open(csvpath, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+            lines += chunk.count(b'\n')
+            last = chunk[-1:]
+    if last != b'\n':
+        lines += 1    # 末尾に改行のない最終行
+
+    stat = csvpath.stat()
+    return {
+        'rows': max(lines - 1, 0),
+        'sha256': digest.hexdigest(),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+def write_catalog(catalog: dict, path: Path=CATALOG_PATH):
+    """カタログ書き出し処理
+
+    Args:
+        catalog (dict): カタログ
+        path (Path): カタログファイルのパス
+
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmppath = path.with_name(f'.{path.name}.tmp')
+    tmppath.write_text(json.dumps(catalog, ensure_ascii=False, indent=1), encoding='utf-8')
+    os.replace(tmppath, path)
+
+def refresh_dir(dirpath: Path, path: Path=CATALOG_PATH, results_root: Path=rs.RESULTS_ROOT):
+    """カタログの部分更新処理
+
+    解析結果フォルダ一つ分のファイル情報だけを作り直してカタログを書き出す
+
+    Args:
+        dirpath (Path): 更新した解析結果フォルダ
+        path (Path): カタログファイルのパス
+        results_root (Path): 解析結果のルートフォルダ
+
+    """
+    path = Path(path)
+    if not path.exists():
+        write_catalog(build_catalog(results_root), path)
+        return
+
+    catalog = json.loads(path.read_text(encoding='utf-8'))
+    relpath = Path(dirpath).relative_to(results_root).as_posix()
+    for animals in catalog['periods'].values():
+        for horizons in animals.values():
+            for entry in horizons.values():
+                if entry['dir'] == relpath:
+                    entry.update(describe_dir(Path(dirpath), results_root, entry['signature']))
+    write_catalog(catalog, path)
+
+def _predicted_dirs(animal_dir: Path) -> list:
+    # 予測フォルダを(予測選択の表記, フォルダ)の一覧にする
+    predicted_root = animal_dir / 'predicted'
+    if not predicted_root.is_dir():
+        return []
+
+    dirs = [p for p in predicted_root.iterdir() if p.is_dir()]
+    named = sorted(
+        (int(m.group(1)), p) for p in dirs if (m := HORIZON_PATTERN.match(p.name))
+    )
+    ranged = sorted(p for p in dirs if PERIOD_PATTERN.match(p.name))
+
+    return (
+        [(p.name, p) for _, p in named] +
+        [(f'{week}週間先', p) for week, p in enumerate(ranged, start=1)]
+    )
+
+RESULT_CATALOG = ResultCatalog()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='解析結果カタログを作成する')
+    parser.add_argument('--output', default=str(CATALOG_PATH), help='カタログファイルのパス')
+    args = parser.parse_args()
+    write_catalog(build_catalog(), Path(args.output))
+    print(args.output, '作成完了')
@@ -0,0 +1,350 @@
+import os
+import threading
+from pathlib import Path
+from collections import OrderedDict
+import pandas as pd
+import src.store.result_store as rs
+import src.store.result_catalog as rc
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+NO_PREDICT = rc.NO_PREDICT
+FILE_KINDS = {
+    'alert': '警報注意情報.csv',
+    'diff': 'diff.csv',
+    'region': '地域別警報注意報一覧.csv'
+}
+# キャッシュの上限[MB] 環境変数で上書き可能
+CACHE_MAX_MB = int(os.environ.get('WHM_RESULT_CACHE_MB', '1024'))
+LOCK_STRIPES = 64    # 同じキーの読み込みを1回にまとめるロックの数(キーのハッシュ値で割り当てる)
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class ResultCache:
+    """解析結果キャッシュ
+
+    (期間, 対象生物, 予測, ファイル種別)をキーに解析結果をプロセス内で共有するキャッシュ
+    元ファイルの更新日時とサイズが変わったときは読み直し、
+    メモリ使用量が上限を超えたときは最も古く参照されたものから破棄する
+    解析結果から作成した派生データ(空間インデックス等)も解析結果と同じ寿命で保持する
+
+    Args:
+        max_bytes (int): キャッシュが保持するデータの合計上限[byte]
+
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()    # key → {stamp, frame, nbytes, derived}
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        # キーごとにロックを作ると破棄されたキーの分だけ増え続けるため、固定数のロックを共用する
+        self._key_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+
+    def get(self, key: tuple, csvpath: Path, stamp=None) -> pd.DataFrame:
+        """解析結果取得処理
+
+        キャッシュ済みかつ元ファイルが変わっていなければキャッシュを、
+        そうでなければ読み込んだうえでキャッシュして返す
+
+        Args:
+            key (tuple): キャッシュキー
+            csvpath (Path): results配下のCSVパス
+            stamp (object): カタログ上の元ファイルの署名(チェックサム、カタログにないときはNone)
+
+        Returns:
+            DataFrame: キャッシュ済みデータの浅いコピー
+
+        """
+        return self._load(key, csvpath, stamp)['frame'].copy(deep=False)
+
+    def get_derived(self, key: tuple, csvpath: Path, name: str, builder, stamp=None):
+        """派生データ取得処理
+
+        解析結果から作成する派生データを一度だけ作成して共有する
+        解析結果が読み直されたときは派生データも作り直す
+
+        Args:
+            key (tuple): キャッシュキー
+            csvpath (Path): results配下のCSVパス
+            name (str): 派生データ名
+            builder (callable): 解析結果を受け取り派生データを返す関数
+            stamp (object): カタログ上の元ファイルの署名(カタログにないときはNone)
+
+        Returns:
+            object: 派生データ(読み取り専用として扱うこと)
+
+        """
+        entry = self._load(key, csvpath, stamp)
+        with self._key_lock(key):
+            if name not in entry['derived']:
+                derived = builder(entry['frame'].copy(deep=False))
+                nbytes = sizeof(derived)
+                with self._lock:
+                    entry['derived'][name] = derived
+                    if self._entries.get(key) is entry:
+                        entry['nbytes'] += nbytes
+                        self._nbytes += nbytes
+                        self._evict()
+
+            return entry['derived'][name]
+
+    @property
+    def nbytes(self) -> int:
+        """保持しているデータの合計[byte]"""
+        return self._nbytes
+
+    def contains(self, key: tuple, csvpath: Path, stamp=None) -> bool:
+        """キャッシュ済み判定処理
+
+        Args:
+            key (tuple): キャッシュキー
+            csvpath (Path): results配下のCSVパス
+            stamp (object): カタログ上の元ファイルの署名(カタログにないときはNone)
+
+        Returns:
+            bool: 同じ署名のデータを保持しているか(参照順は更新しない)
+
+        """
+        stamp = (stamp, file_stamp(csvpath))
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry['stamp'] == stamp
+
+    def clear(self):
+        """キャッシュ全削除処理"""
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def _key_lock(self, key: tuple) -> threading.RLock:
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def _load(self, key: tuple, csvpath: Path, stamp=None) -> dict:
+        # カタログを更新せずにCSVだけ書き換えられたときも読み直すため、ファイル署名も併せて比較する
+        stamp = (stamp, file_stamp(csvpath))
+        with self._lock:
+            entry = self._lookup(key, stamp)
+            if entry is not None:
+                return entry
+
+        # 同じキーの読み込みは一度だけ行い、他のセッションはその完了を待つ
+        with self._key_lock(key):
+            with self._lock:
+                entry = self._lookup(key, stamp)
+                if entry is not None:
+                    return entry
+
+            df = rs.read_result(csvpath)
+            entry = {
+                'stamp': stamp,
+                'frame': df,
+                'nbytes': sizeof(df),
+                'derived': {}
+            }
+            with self._lock:
+                self._discard(key)
+                self._entries[key] = entry
+                self._nbytes += entry['nbytes']
+                self._evict()
+
+        return entry
+
+    def _lookup(self, key: tuple, stamp: tuple):
+        if key not in self._entries:
+            return None
+
+        entry = self._entries[key]
+        if entry['stamp'] != stamp:
+            # 元ファイルが更新されているため破棄する
+            self._discard(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return entry
+
+    def _discard(self, key: tuple):
+        if key in self._entries:
+            entry = self._entries.pop(key)
+            self._nbytes -= entry['nbytes']
+
+    def _evict(self):
+        # 直近に参照したものは上限を超えていても残す
+        while self._nbytes > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._nbytes -= entry['nbytes']
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def file_stamp(csvpath: Path) -> tuple:
+    """ファイル署名算出関数
+
+    元のCSVと取り込み済みファイルの更新日時とサイズからなる署名を算出する
+
+    Args:
+        csvpath (Path): results配下のCSVパス
+
+    Returns:
+        tuple: ファイル署名
+
+    """
+    stamp = []
+    for path in (Path(csvpath), rs.store_path(csvpath)):
+        try:
+            stat = path.stat()
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+
+    return tuple(stamp)
+
+def sizeof(obj) -> int:
+    """メモリ使用量概算関数
+
+    Args:
+        obj (object): DataFrameまたはnbytes属性を持つオブジェクト
+
+    Returns:
+        int: メモリ使用量[byte](不明な場合は0)
+
+    """
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+
+    return int(getattr(obj, 'nbytes', 0))
+
+def resolve_result_dir(period: str, animal: str, horizon: str=NO_PREDICT) -> tuple:
+    """解析結果フォルダ特定処理
+
+    解析結果カタログを参照して特定する(ファイルシステムは参照しない)
+    予測フォルダがカタログにない場合は予測しないフォルダへ切り替える
+
+    Args:
+        period (str): 基準期間
+        animal (str): 対象生物
+        horizon (str): 予測選択
+
+    Returns:
+        tuple: 解析結果フォルダ情報
+            Path: 解析結果フォルダ
+            str: 表示期間
+
+    """
+    entry = rc.RESULT_CATALOG.entry(period, animal, horizon)
+    if entry is None:
+        # 予測がない場合は予測しないを選択する
+        entry = rc.RESULT_CATALOG.entry(period, animal, NO_PREDICT)
+    if entry is None:
+        return (rs.RESULTS_ROOT / period / animal, period)
+
+    return (rs.RESULTS_ROOT / entry['dir'], entry['signature'])
+
+def catalog_stamp(period: str, animal: str, horizon: str, kind: str):
+    """カタログ上のファイル署名取得関数
+
+    Args:
+        period (str): 基準期間
+        animal (str): 対象生物
+        horizon (str): 予測選択
+        kind (str): ファイル種別(alert, diff, region)
+
+    Returns:
+        str | None: CSVのSHA-256(カタログにないときはNone)
+
+    """
+    entry = rc.RESULT_CATALOG.entry(period, animal, horizon)
+    if entry is None:
+        entry = rc.RESULT_CATALOG.entry(period, animal, NO_PREDICT)
+    if entry is None or (info := entry['files'].get(FILE_KINDS[kind])) is None:
+        return None
+
+    return info['sha256']
+
+def load_result(period: str, animal: str, horizon: str, kind: str) -> pd.DataFrame:
+    """解析結果読み込み処理
+
+    全セッション共有のキャッシュを通して解析結果を取得する
+    返り値はキャッシュの浅いコピーのため、列の追加・置換・行の抽出は自由に行えるが
+    既存列の値をその場で書き換えてはならない
+
+    Args:
+        period (str): 基準期間
+        animal (str): 対象生物
+        horizon (str): 予測選択
+        kind (str): ファイル種別(alert, diff, region)
+
+    Returns:
+        DataFrame: 解析結果
+
+    """
+    dirpath, _ = resolve_result_dir(period, animal, horizon)
+    return RESULT_CACHE.get(
+        (dirpath.relative_to(rs.RESULTS_ROOT).as_posix(), kind),
+        dirpath / FILE_KINDS[kind],
+        stamp=catalog_stamp(period, animal, horizon, kind)
+    )
+
+def load_derived(
+    period: str, 
+    animal: str, 
+    horizon: str, 
+    kind: str, 
+    name: str, 
+    builder
+):
+    """派生データ読み込み処理
+
+    全セッション共有のキャッシュを通して解析結果から作成した派生データを取得する
+    派生データはload_resultが返すデータと同じ行順の解析結果から作成される
+
+    Args:
+        period (str): 基準期間
+        animal (str): 対象生物
+        horizon (str): 予測選択
+        kind (str): ファイル種別(alert, diff, region)
+        name (str): 派生データ名
+        builder (callable): 解析結果を受け取り派生データを返す関数
+
+    Returns:
+        object: 派生データ(読み取り専用として扱うこと)
+
+    """
+    dirpath, _ = resolve_result_dir(period, animal, horizon)
+    return RESULT_CACHE.get_derived(
+        (dirpath.relative_to(rs.RESULTS_ROOT).as_posix(), kind),
+        dirpath / FILE_KINDS[kind],
+        name,
+        builder,
+        stamp=catalog_stamp(period, animal, horizon, kind)
+    )
+
+def load_summary(period: str, animal: str, horizon: str, kind: str) -> pd.DataFrame:
+    """都道府県別集計読み込み処理
+
+    取り込み時に作成した都道府県別集計(なければ解析結果から一度だけ集計したもの)を
+    全セッション共有のキャッシュを通して取得する
+
+    Args:
+        period (str): 基準期間
+        animal (str): 対象生物
+        horizon (str): 予測選択
+        kind (str): ファイル種別(alert, diff)
+
+    Returns:
+        DataFrame: 都道府県別の集計結果(読み取り専用として扱うこと)
+
+    """
+    dirpath, _ = resolve_result_dir(period, animal, horizon)
+    csvpath = dirpath / FILE_KINDS[kind]
+    return load_derived(
+        period, 
+        animal, 
+        horizon, 
+        kind, 
+        'summary', 
+        lambda df: rs.read_summary(csvpath, df)
+    )
+
+RESULT_CACHE = ResultCache(max_bytes=CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,157 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import src.store.result_store as rs
+import src.store.result_loader as rl
+import src.store.result_catalog as rc
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+HORIZONS = [rl.NO_PREDICT] + [f'{i}週間先' for i in range(1, 10)]    # 予測選択の並び
+PREFETCH_WORKERS = int(os.environ.get('WHM_PREFETCH_WORKERS', '2'))    # 先読みのスレッド数
+# 先読みを行うキャッシュ使用量の上限[MB](キャッシュ自体の上限より小さくし、表示中のデータを追い出さない)
+PREFETCH_MAX_MB = int(os.environ.get('WHM_PREFETCH_MB', str(rl.CACHE_MAX_MB // 2)))
+
+logger = logging.getLogger(__name__)
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class ResultPrefetcher:
+    """解析結果先読み処理
+
+    表示した基準期間・予測選択の前後(次の期間、次の予測を優先)の解析結果と派生データを
+    バックグラウンドのスレッドで共有キャッシュへ読み込んでおく
+    新しい選択で先読みを依頼すると、前の依頼のうち未完了の分は取り消す
+    キャッシュの使用量が上限に達したときは先読みを行わない
+
+    Args:
+        cache (ResultCache): 読み込み先の共有キャッシュ
+        max_workers (int): 先読みのスレッド数
+        max_bytes (int): 先読みを行うキャッシュ使用量の上限[byte]
+
+    """
+    def __init__(
+        self,
+        cache: rl.ResultCache = rl.RESULT_CACHE,
+        max_workers: int = PREFETCH_WORKERS,
+        max_bytes: int = PREFETCH_MAX_MB * 1024 * 1024
+    ):
+        self.cache = cache
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='result-prefetch'
+        )
+        self._futures = []
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def neighbors(self, period: str, animal: str, horizon: str) -> list:
+        """先読み対象算出処理
+
+        Args:
+            period (str): 基準期間
+            animal (str): 対象生物
+            horizon (str): 予測選択
+
+        Returns:
+            list: (基準期間, 対象生物, 予測選択)の一覧(先読みする順)
+
+        """
+        periods = rc.RESULT_CATALOG.periods()
+        targets = []
+        if period in periods:
+            i = periods.index(period)
+            targets += [(p, animal, horizon) for p in periods[i + 1:i + 2] + periods[max(i - 1, 0):i]]
+        if horizon in HORIZONS:
+            i = HORIZONS.index(horizon)
+            targets += [(period, animal, h) for h in HORIZONS[i + 1:i + 2] + HORIZONS[max(i - 1, 0):i]]
+
+        # カタログにない予測(予測しないへ切り替わるもの)は先読みしない
+        return [
+            target for target in targets
+            if rc.RESULT_CATALOG.entry(*target) is not None
+        ]
+
+    def schedule(
+        self,
+        period: str,
+        animal: str,
+        horizon: str,
+        kinds: list = ['alert'],
+        derived: list = [],
+        summaries: list = []
+    ):
+        """先読み依頼処理
+
+        Args:
+            period (str): 表示した基準期間
+            animal (str): 対象生物
+            horizon (str): 表示した予測選択
+            kinds (list): 読み込むファイル種別(alert, diff, region)
+            derived (list): 作成する派生データ(ファイル種別, 派生データ名, 作成関数)
+            summaries (list): 読み込む都道府県別集計のファイル種別
+
+        """
+        with self._lock:
+            self._cancel()
+            generation = self._generation
+            self._futures = [
+                self._executor.submit(self._prefetch, generation, target, kinds, derived, summaries)
+                for target in self.neighbors(period, animal, horizon)
+            ]
+
+    def cancel(self):
+        """先読み取り消し処理
+
+        未着手の先読みを取り消し、実行中の先読みは次のファイルの前で打ち切る
+
+        """
+        with self._lock:
+            self._cancel()
+
+    def _cancel(self):
+        self._generation += 1
+        for future in self._futures:
+            future.cancel()
+        self._futures = []
+
+    def _prefetch(self, generation: int, target: tuple, kinds: list, derived: list, summaries: list):
+        loads = (
+            [(kind, lambda kind=kind: rl.load_result(*target, kind)) for kind in kinds] +
+            [
+                (kind, lambda kind=kind, name=name, builder=builder: rl.load_derived(*target, kind, name, builder))
+                for kind, name, builder in derived
+            ] +
+            [(kind, lambda kind=kind: rl.load_summary(*target, kind)) for kind in summaries]
+        )
+        for kind, load in loads:
+            if generation != self._generation:
+                return
+            if (cost := self._cost(target, kind)) is None:
+                continue
+            if self.cache.nbytes + cost > self.max_bytes:
+                return
+
+            try:
+                load()
+            except Exception:
+                logger.exception('先読みに失敗しました: %s %s', target, kind)
+                return
+
+    def _cost(self, target: tuple, kind: str):
+        # 読み込みで増えるキャッシュ使用量の見積もり(元ファイルがないときはNone)
+        entry = rc.RESULT_CATALOG.entry(*target)
+        info = entry['files'].get(rl.FILE_KINDS[kind]) if entry is not None else None
+        if info is None:
+            return None
+        csvpath = rs.RESULTS_ROOT / entry['dir'] / rl.FILE_KINDS[kind]
+        if self.cache.contains((entry['dir'], kind), csvpath, info['sha256']):
+            return 0    # 解析結果は読み込み済み(派生データの分のみ増える)
+
+        return info['size']
+
+PREFETCHER = ResultPrefetcher()
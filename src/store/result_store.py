@@ -0,0 +1,242 @@
+import os
+import argparse
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import src.store.result_summary as rsum
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+BASEPATH = Path(os.path.dirname(os.path.abspath(__file__))).parent.parent
+# results, store を置くルート 環境変数で上書き可能(合成データでの計測等)
+DATA_ROOT = Path(os.environ.get('WHM_DATA_ROOT', BASEPATH))
+RESULTS_ROOT = DATA_ROOT.joinpath('results')    # 解析結果(cp932のCSV)
+STORE_ROOT = DATA_ROOT.joinpath('store')    # 取り込み後の列指向ファイル(Arrow IPC)
+STORE_SUFFIX = '.arrow'
+CSV_ENCODING = 'cp932'
+RESULT_FILENAMES = (
+    '警報注意情報.csv',
+    'diff.csv',
+    '地域別警報注意報一覧.csv'
+)
+SUMMARY_KINDS = {    # 都道府県別集計を作成するファイルと集計種別
+    '警報注意情報.csv': 'alert',
+    'diff.csv': 'diff'
+}
+SUMMARY_SUFFIX = '_集計'
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def store_path(csvpath: Path) -> Path:
+    """格納先パス算出関数
+
+    results配下のCSVに対応するstore配下のArrow IPCファイルのパスを算出する
+
+    Args:
+        csvpath (Path): results配下のCSVパス
+
+    Returns:
+        Path: store配下のArrow IPCファイルパス
+
+    """
+    relpath = Path(csvpath).relative_to(RESULTS_ROOT)
+    return STORE_ROOT.joinpath(relpath).with_suffix(STORE_SUFFIX)
+
+def summary_path(csvpath: Path) -> Path:
+    """集計格納先パス算出関数
+
+    results配下のCSVに対応する都道府県別集計のArrow IPCファイルのパスを算出する
+
+    Args:
+        csvpath (Path): results配下のCSVパス
+
+    Returns:
+        Path: store配下の集計ファイルパス
+
+    """
+    dstpath = store_path(csvpath)
+    return dstpath.with_name(f'{dstpath.stem}{SUMMARY_SUFFIX}{STORE_SUFFIX}')
+
+def to_typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """型付け処理
+
+    CSVから読み込んだデータの型を列指向形式に適した型へ変換する
+        文字列 → カテゴリ(辞書エンコード)
+        整数 → int32以上の最小の整数型
+        浮動小数 → そのまま(メッシュ境界の精度を保つためfloat64)
+
+    Args:
+        df (DataFrame): CSVから読み込んだデータ
+
+    Returns:
+        DataFrame: 型変換後のデータ
+
+    """
+    typed = df.copy()
+    for col in typed.columns:
+        if typed[col].dtype == object:
+            typed[col] = typed[col].astype('category')
+        elif pd.api.types.is_integer_dtype(typed[col]):
+            # int8, int16まで落とすと後段の集計で桁あふれし得るためint32を下限とする
+            downcast = pd.to_numeric(typed[col], downcast='integer')
+            if downcast.dtype.itemsize < 4:
+                downcast = downcast.astype('int32')
+            typed[col] = downcast
+
+    return typed
+
+def ingest_csv(csvpath: Path, force: bool=False) -> Path:
+    """CSV取り込み処理
+
+    cp932のCSVを読み込み、型付けしたうえで非圧縮のArrow IPCファイルへ書き出す
+    非圧縮で書き出すことで読み込み時にメモリマップで参照できる
+
+    Args:
+        csvpath (Path): results配下のCSVパス
+        force (bool): Trueのとき取り込み済みでも再作成する
+
+    Returns:
+        Path: 書き出したArrow IPCファイルパス
+
+    """
+    dstpath = store_path(csvpath)
+    if not force and not is_stale(csvpath):
+        return dstpath
+
+    df = to_typed_frame(
+        pd.read_csv(csvpath, encoding=CSV_ENCODING)
+    )
+    write_table(df, dstpath)
+
+    # 都道府県別集計を作成する
+    if (kind := SUMMARY_KINDS.get(Path(csvpath).name)) is not None:
+        write_table(rsum.summarize(df, kind), summary_path(csvpath))
+
+    return dstpath
+
+def write_table(df: pd.DataFrame, dstpath: Path):
+    """Arrow IPC書き出し処理
+
+    書き込み途中のファイルを読ませないよう一時ファイル経由で置き換える
+
+    Args:
+        df (DataFrame): 書き出すデータ
+        dstpath (Path): 書き出し先パス
+
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    dstpath.parent.mkdir(parents=True, exist_ok=True)
+    tmppath = dstpath.with_name(f'.{dstpath.name}.tmp')
+    with pa.OSFile(str(tmppath), 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmppath, dstpath)
+
+def read_table(srcpath: Path) -> pd.DataFrame:
+    """Arrow IPC読み込み処理
+
+    Args:
+        srcpath (Path): Arrow IPCファイルパス
+
+    Returns:
+        DataFrame: 読み込んだデータ
+
+    """
+    with pa.memory_map(str(srcpath), 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    # 数値列はメモリマップ上のバッファをそのまま参照させる
+    return table.to_pandas(split_blocks=True)
+
+def ingest_results(results_root: Path=RESULTS_ROOT, force: bool=False) -> list:
+    """解析結果一括取り込み処理
+
+    results配下の全ての解析結果CSVをArrow IPCファイルへ変換する
+
+    Args:
+        results_root (Path): 解析結果のルートフォルダ
+        force (bool): Trueのとき取り込み済みでも再作成する
+
+    Returns:
+        list: 書き出したArrow IPCファイルパスのリスト
+
+    """
+    dstpaths = []
+    for filename in RESULT_FILENAMES:
+        for csvpath in sorted(Path(results_root).rglob(filename)):
+            dstpaths.append(ingest_csv(csvpath, force=force))
+            print(csvpath.relative_to(results_root), '取り込み完了')
+
+    return dstpaths
+
+def is_stale(csvpath: Path) -> bool:
+    """取り込み要否判定関数
+
+    Arrow IPCファイルが存在しない、または元のCSVより古いときTrueを返す
+
+    Args:
+        csvpath (Path): results配下のCSVパス
+
+    Returns:
+        bool: 取り込みが必要かどうか
+
+    """
+    dstpath = store_path(csvpath)
+    if not dstpath.exists():
+        return True
+
+    return dstpath.stat().st_mtime < Path(csvpath).stat().st_mtime
+
+def read_result(csvpath: Path) -> pd.DataFrame:
+    """解析結果読み込み処理
+
+    取り込み済みのArrow IPCファイルがあればメモリマップで読み込み、
+    なければ(もしくはCSVより古ければ)CSVを読み込んで同じ型に変換する
+
+    Args:
+        csvpath (Path): results配下のCSVパス
+
+    Returns:
+        DataFrame: 解析結果
+
+    """
+    if is_stale(csvpath):
+        return to_typed_frame(
+            pd.read_csv(csvpath, encoding=CSV_ENCODING)
+        )
+
+    return read_table(store_path(csvpath))
+
+def read_summary(csvpath: Path, df: pd.DataFrame=None) -> pd.DataFrame:
+    """都道府県別集計読み込み処理
+
+    取り込み時に作成した集計があれば読み込み、なければ解析結果から集計する
+
+    Args:
+        csvpath (Path): results配下のCSVパス(警報注意情報.csvまたはdiff.csv)
+        df (DataFrame): 読み込み済みの解析結果(Noneのときは読み込む)
+
+    Returns:
+        DataFrame: 都道府県別の集計結果
+
+    """
+    srcpath = summary_path(csvpath)
+    if not is_stale(csvpath) and srcpath.exists():
+        return read_table(srcpath)
+
+    if df is None:
+        df = read_result(csvpath)
+
+    return rsum.summarize(df, SUMMARY_KINDS[Path(csvpath).name])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='解析結果CSVをArrow IPCへ取り込む')
+    parser.add_argument('--force', action='store_true', help='取り込み済みのファイルも再作成する')
+    args = parser.parse_args()
+    ingest_results(force=args.force)
+
+    # 取り込みに合わせて解析結果カタログも作り直す
+    import src.store.result_catalog as rc
+    rc.write_catalog(rc.build_catalog())
@@ -0,0 +1,131 @@
+import pandas as pd
+import src.common as cmn
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+ALERT_LEVELS = list(cmn.CATEGORY_VS_COLOR.keys())[1:]    # 安全 < 目撃 < 遭遇 < 襲撃
+PREF_COLUMN = '都道府県コード'
+ALERT_COLUMN = '警報注意報'
+TRANSITION_COLUMNS = ['警報注意報(前期)', '警報注意報(今期)']
+DIFF_RENAME_COLUMNS = {
+    '警報注意報(前回)': '警報注意報(前期)',
+    '警報注意報(今回)': '警報注意報(今期)',
+}
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def to_alert_categorical(values) -> pd.Categorical:
+    """警報・注意報の順序付きカテゴリ変換関数
+
+    Args:
+        values (array_like): 警報・注意報
+
+    Returns:
+        Categorical: 安全 < 目撃 < 遭遇 < 襲撃 の順序を持つカテゴリ
+
+    """
+    return pd.Categorical(values, categories=ALERT_LEVELS, ordered=True)
+
+def count_alerts(df: pd.DataFrame, by: list=[]) -> pd.DataFrame:
+    """警報・注意報別地点数集計関数
+
+    Args:
+        df (DataFrame): 警報注意情報
+        by (list): 警報・注意報の前に付ける集計キー(都道府県コード等)
+
+    Returns:
+        DataFrame: 集計キー、警報注意報、地点数 の列を持つ集計結果
+
+    """
+    return _count(df, by, [ALERT_COLUMN])
+
+def count_transitions(diff: pd.DataFrame, by: list=[]) -> pd.DataFrame:
+    """前期今期の組み合わせ別地点数集計関数
+
+    Args:
+        diff (DataFrame): 前期今期の差分情報(列名は前期・今期に揃えたもの)
+        by (list): 組み合わせの前に付ける集計キー(都道府県コード等)
+
+    Returns:
+        DataFrame: 集計キー、警報注意報(前期)、警報注意報(今期)、地点数 の列を持つ集計結果
+
+    """
+    return _count(diff, by, TRANSITION_COLUMNS)
+
+def summarize(df: pd.DataFrame, kind: str) -> pd.DataFrame:
+    """都道府県別集計関数
+
+    取り込み時及びキャッシュ作成時に一度だけ行う都道府県別の集計
+
+    Args:
+        df (DataFrame): 警報注意情報(kind=alert)または差分情報(kind=diff)
+        kind (str): ファイル種別(alert, diff)
+
+    Returns:
+        DataFrame: 都道府県別の集計結果
+
+    """
+    if kind == 'alert':
+        return count_alerts(df, by=[PREF_COLUMN])
+
+    return count_transitions(df.rename(columns=DIFF_RENAME_COLUMNS), by=[PREF_COLUMN])
+
+def select_prefecture(summary: pd.DataFrame, prefcode: int) -> pd.DataFrame:
+    """都道府県別集計の抽出関数
+
+    Args:
+        summary (DataFrame): 都道府県別の集計結果
+        prefcode (int): 都道府県コード
+
+    Returns:
+        DataFrame: 都道府県コード列を除いた対象都道府県の集計結果
+
+    """
+    selected = summary[summary[PREF_COLUMN] == prefcode]
+    return selected.drop(columns=[PREF_COLUMN]).reset_index(drop=True)
+
+def hazard_list(diff: pd.DataFrame) -> pd.DataFrame:
+    """ハザードリスト作成関数
+
+    前期今期の差分情報から今期が安全のメッシュを除き、前期・今期の順序で並べる
+
+    Args:
+        diff (DataFrame): 前期今期の差分情報
+
+    Returns:
+        DataFrame: ハザードリスト
+
+    """
+    _diff = diff.rename(columns=DIFF_RENAME_COLUMNS)
+    _diff = _diff[_diff['警報注意報(今期)'] != '安全'].copy()
+    for col in TRANSITION_COLUMNS:
+        _diff[col] = to_alert_categorical(_diff[col])
+
+    return _diff.sort_values(by=TRANSITION_COLUMNS, ascending=True, kind='stable')
+
+def style_alerts(df: pd.DataFrame, subset: list):
+    """警報・注意報の色付け関数
+
+    Args:
+        df (DataFrame): 表示するデータ
+        subset (list): 色付けする列名
+
+    Returns:
+        Styler: 警報・注意報の列を色付けしたデータ
+
+    """
+    return df.style.applymap(
+        lambda s: f'background-color: {cmn.CATEGORY_VS_COLOR[s]}; color: black;',
+        subset=subset
+    )
+
+def _count(df: pd.DataFrame, by: list, alert_columns: list) -> pd.DataFrame:
+    # 警報・注意報を順序付きカテゴリにして集計し、出現した組み合わせのみを順序どおりに返す
+    frame = df[by].copy()
+    for col in alert_columns:
+        frame[col] = to_alert_categorical(df[col])
+    counts = frame.groupby(by + alert_columns, observed=True, sort=True).size()
+
+    return counts.reset_index(name='地点数')
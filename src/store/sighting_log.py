@@ -0,0 +1,417 @@
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime as dt
+import numpy as np
+import pandas as pd
+import src.common as cmn
+import src.geo.geocoder as gc
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+BASEPATH = Path(os.path.dirname(os.path.abspath(__file__))).parent.parent
+# store を置くルートは環境変数で上書き可能(合成データでの計測等)
+DATA_ROOT = Path(os.environ.get('WHM_DATA_ROOT', BASEPATH))
+SIGHTING_DB_PATH = DATA_ROOT.joinpath('store', 'sightings.sqlite')    # 登録された目撃情報
+PHOTO_ROOT = DATA_ROOT.joinpath('store', 'photos')    # 目撃写真(内容のハッシュ値で格納)
+FAILED_PATH = DATA_ROOT.joinpath('store', 'sightings_failed.jsonl')    # 書き込めなかった目撃情報
+BATCH_SIZE = 256    # 1回のコミットでまとめて書き込む件数の上限
+FLUSH_INTERVAL = 0.2    # 先頭の登録から書き込むまでに後続の登録を待つ時間[s]
+WRITE_RETRY = 3    # 書き込みに失敗した目撃情報を1件ずつ書き込み直す回数
+RETRY_INTERVAL = 0.5    # 書き込み直すまでの待ち時間[s](回数ごとに倍にする)
+GEOCODE_WORKERS = 4    # 住所を経度緯度へ変換するスレッド数
+REPORT_COLUMNS = [
+    'report_id', 'received_at', 'date', 'animal', 'category', 'head', 'address',
+    'lat', 'lon', 'grid3rd', 'photo', 'situation', 'remarks'
+]
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sightings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_id TEXT NOT NULL UNIQUE,
+    received_at TEXT NOT NULL,
+    date TEXT NOT NULL,
+    animal TEXT NOT NULL,
+    category TEXT,
+    head INTEGER NOT NULL,
+    address TEXT,
+    lat REAL,
+    lon REAL,
+    grid3rd INTEGER,
+    photo TEXT,
+    situation TEXT,
+    remarks TEXT
+);
+CREATE INDEX IF NOT EXISTS sightings_grid3rd ON sightings (grid3rd);
+CREATE INDEX IF NOT EXISTS sightings_date ON sightings (date);
+"""
+
+logger = logging.getLogger(__name__)
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class PhotoStore:
+    """目撃写真格納庫
+
+    写真を内容のSHA-256で名前付けして格納する(同じ写真は一度だけ保存される)
+    格納先は root/先頭2文字/次の2文字/ハッシュ値.拡張子 とする
+
+    Args:
+        root (Path): 格納先のルートフォルダ
+
+    """
+    def __init__(self, root: Path=PHOTO_ROOT):
+        self.root = Path(root)
+
+    def path(self, digest: str, suffix: str) -> Path:
+        """格納先パス算出処理
+
+        Args:
+            digest (str): 写真のSHA-256
+            suffix (str): 拡張子(.jpg等)
+
+        Returns:
+            Path: 格納先パス
+
+        """
+        return self.root.joinpath(digest[:2], digest[2:4], f'{digest}{suffix.lower()}')
+
+    def put(self, data: bytes, suffix: str) -> str:
+        """写真格納処理
+
+        Args:
+            data (bytes): 写真のバイト列
+            suffix (str): 拡張子(.jpg等)
+
+        Returns:
+            str: 格納した写真の名前(ハッシュ値.拡張子)
+
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        dstpath = self.path(digest, suffix)
+        if not dstpath.exists():
+            dstpath.parent.mkdir(parents=True, exist_ok=True)
+            tmppath = dstpath.with_name(f'.{dstpath.name}.{uuid.uuid4().hex}.tmp')
+            tmppath.write_bytes(data)
+            os.replace(tmppath, dstpath)
+
+        return dstpath.name
+
+class SightingWriter:
+    """目撃情報書き込み処理
+
+    登録はキューに積むだけで即座に戻り、バックグラウンドのスレッドが
+    まとまった件数ごとに1トランザクションでSQLite(WALモード)へ書き込む
+    住所の経度緯度への変換は書き込みとは別のスレッドで行い、変換を終えたものから書き込みのキューへ積む
+    書き込み時に3次メッシュの付与と写真の格納を行う
+    まとめた書き込みに失敗したときは1件ずつ書き込み直し、それでも失敗したものは
+    失敗記録(1行1件のJSON)へ退避する
+
+    Args:
+        path (Path): SQLiteのパス
+        photo_store (PhotoStore): 目撃写真格納庫
+        batch_size (int): 1回のコミットでまとめて書き込む件数の上限
+        flush_interval (float): 先頭の登録から書き込むまでに後続の登録を待つ時間[s]
+        on_commit (callable): 書き込んだ目撃情報(id と REPORT_COLUMNS の列を持つDataFrame)を受け取る関数
+        failed_path (Path): 書き込めなかった目撃情報の退避先
+
+    """
+    def __init__(
+        self,
+        path: Path = SIGHTING_DB_PATH,
+        photo_store: PhotoStore = None,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        on_commit = None,
+        failed_path: Path = FAILED_PATH
+    ):
+        self.path = Path(path)
+        self.photo_store = photo_store if photo_store is not None else PhotoStore()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_commit = on_commit
+        self.failed_path = Path(failed_path)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._geocoder = ThreadPoolExecutor(max_workers=GEOCODE_WORKERS, thread_name_prefix='sighting-geocoder')
+        self._geocoding = set()    # 住所を変換中の登録
+        connect(self.path).close()    # スキーマを作成しておく
+
+    def submit(
+        self,
+        date,
+        animal: str,
+        head: int,
+        category: str = None,
+        address: str = None,
+        lat: float = None,
+        lon: float = None,
+        photo: bytes = None,
+        photo_suffix: str = '.jpg',
+        situation: str = None,
+        remarks: str = None
+    ) -> str:
+        """目撃情報登録処理
+
+        Args:
+            date (date): 目撃年月日
+            animal (str): 目撃動物名
+            head (int): 目撃頭数
+            category (str): 種別(目撃、食害、物的被害、人的被害)
+            address (str): 住所(経度緯度がないとき書き込み前に経度緯度へ変換する)
+            lat (float): 緯度
+            lon (float): 経度
+            photo (bytes): 目撃写真
+            photo_suffix (str): 目撃写真の拡張子
+            situation (str): 状況説明
+            remarks (str): 備考
+
+        Returns:
+            str: 受付番号
+
+        """
+        report = {
+            'report_id': uuid.uuid4().hex,
+            'received_at': dt.now().isoformat(timespec='seconds'),
+            'date': str(date),
+            'animal': animal,
+            'category': category or None,
+            'head': int(head),
+            'address': address or None,
+            'lat': None if lat is None else float(lat),
+            'lon': None if lon is None else float(lon),
+            'grid3rd': None,
+            'photo': (photo, photo_suffix) if photo else None,
+            'situation': situation or None,
+            'remarks': remarks or None
+        }
+        if report['lat'] is None and report['address']:
+            # 住所の変換(通信)は書き込みを妨げないよう別のスレッドで行う
+            with self._lock:
+                future = self._geocoder.submit(self._geocode, report)
+                self._geocoding.add(future)
+            future.add_done_callback(self._geocoding.discard)
+        else:
+            self._enqueue(report)
+
+        return report['report_id']
+
+    def flush(self):
+        """書き込み待ち処理
+
+        登録済みの目撃情報が全て書き込まれるまで待つ
+
+        """
+        with self._lock:
+            geocoding = list(self._geocoding)
+        wait(geocoding)
+        self._queue.join()
+
+    def _enqueue(self, report: dict):
+        self._ensure_started()
+        self._queue.put(report)
+
+    def _geocode(self, report: dict):
+        try:
+            point = gc.get_geocoder().geocode(report['address'])
+            if point is not None:
+                (report['lon'], report['lat']) = point
+        except Exception:
+            logger.exception('住所の変換に失敗しました: %s', report['address'])
+        finally:
+            # 変換に失敗したときも経度緯度なしで書き込む
+            self._enqueue(report)
+
+    def _ensure_started(self):
+        # 書き込みスレッドは最初の登録時に起動する
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='sighting-writer',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        db = connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            # 先頭の登録からflush_intervalの間に届いた登録(以降はキューに残っている分)をまとめる
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                if not self._write_batch(db, batch):
+                    for report in batch:
+                        self._write_one(db, report)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, db: sqlite3.Connection, batch: list) -> bool:
+        # まとめて書き込み、失敗したときはFalseを返す
+        try:
+            self._write(db, batch)
+            return True
+        except Exception:
+            logger.exception('目撃情報のまとめた書き込みに失敗したため、1件ずつ書き込みます(%d件)', len(batch))
+            return False
+
+    def _write_one(self, db: sqlite3.Connection, report: dict):
+        # 1件ずつ待ち時間を延ばしながら書き込み直し、書き込めなければ失敗記録へ退避する
+        for attempt in range(WRITE_RETRY):
+            if attempt > 0:
+                time.sleep(RETRY_INTERVAL * 2 ** (attempt - 1))
+            try:
+                self._write(db, [report])
+                return
+            except Exception:
+                logger.exception(
+                    '目撃情報の書き込みに失敗しました(%d/%d回目): %s', attempt + 1, WRITE_RETRY, report['report_id']
+                )
+
+        try:
+            self.failed_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.failed_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(_failed_record(report), ensure_ascii=False) + '\n')
+            logger.error('書き込めなかった目撃情報を退避しました: %s → %s', report['report_id'], self.failed_path)
+        except Exception:
+            logger.exception('目撃情報を退避できませんでした: %s', _failed_record(report))
+
+    def _write(self, db: sqlite3.Connection, batch: list):
+        for report in batch:
+            # 写真は内容のハッシュ値で格納し、名前のみを記録する(書き込み直すときは格納済み)
+            if isinstance(report['photo'], tuple):
+                report['photo'] = self.photo_store.put(*report['photo'])
+
+        # 3次メッシュはまとめて算出する
+        located = [report for report in batch if report['lat'] is not None]
+        if located:
+            grid3rd = cmn.calc_grid_array(
+                np.array([report['lon'] for report in located]),
+                np.array([report['lat'] for report in located]),
+                level=3
+            )
+            for report, code in zip(located, grid3rd.tolist()):
+                report['grid3rd'] = code
+
+        with db:
+            db.executemany(
+                f'INSERT OR IGNORE INTO sightings ({", ".join(REPORT_COLUMNS)}) '
+                f'VALUES ({", ".join("?" * len(REPORT_COLUMNS))})',
+                [tuple(report[col] for col in REPORT_COLUMNS) for report in batch]
+            )
+
+        if self.on_commit is not None:
+            try:
+                self.on_commit(
+                    pd.read_sql_query(
+                        f'SELECT id, {", ".join(REPORT_COLUMNS)} FROM sightings '
+                        f'WHERE report_id IN ({", ".join("?" * len(batch))}) ORDER BY id',
+                        db,
+                        params=[report['report_id'] for report in batch]
+                    )
+                )
+            except Exception:
+                logger.exception('書き込み後の処理に失敗しました')
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def connect(path: Path=SIGHTING_DB_PATH) -> sqlite3.Connection:
+    """SQLite接続処理
+
+    WALモードで接続し、読み込みが書き込みを待たないようにする
+
+    Args:
+        path (Path): SQLiteのパス
+
+    Returns:
+        Connection: 接続
+
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(str(path), timeout=30.0)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')    # WALではコミットごとのfsyncを省いても破損しない
+    db.executescript(SCHEMA)
+
+    return db
+
+def read_reports(path: Path=SIGHTING_DB_PATH, after_id: int=0) -> pd.DataFrame:
+    """登録済み目撃情報読み込み処理
+
+    Args:
+        path (Path): SQLiteのパス
+        after_id (int): この番号より後に書き込まれたものだけを読み込む
+
+    Returns:
+        DataFrame: id と REPORT_COLUMNS の列を持つ目撃情報(書き込み順)
+
+    """
+    db = connect(path)
+    try:
+        return pd.read_sql_query(
+            f'SELECT id, {", ".join(REPORT_COLUMNS)} FROM sightings WHERE id > ? ORDER BY id',
+            db,
+            params=(after_id,)
+        )
+    finally:
+        db.close()
+
+def _failed_record(report: dict) -> dict:
+    # 退避用の記録(格納できていない写真は大きさのみを残す)
+    record = dict(report)
+    if isinstance(record['photo'], tuple):
+        record['photo'] = f'未格納({len(record["photo"][0])}byte)'
+
+    return record
+
+_WRITER = None
+_WRITER_LOCK = threading.Lock()
+
+def get_writer() -> SightingWriter:
+    """目撃情報書き込み処理取得関数
+
+    プロセス内で一つだけ作成し、終了時には書き込み待ちの登録を書き込む
+
+    Returns:
+        SightingWriter: 目撃情報書き込み処理
+
+    """
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = SightingWriter(on_commit=_after_commit)
+            atexit.register(_WRITER.flush)
+
+        return _WRITER
+
+def _after_commit(reports: pd.DataFrame):
+    # 書き込んだ目撃情報を出没頭数ロールアップへ加算し、警報・注意報の差分反映を依頼する
+    # (どちらもこのモジュールを参照するためここで読み込む)
+    import src.store.sighting_rollup as srl
+    import src.store.incremental_alerts as ia
+    srl.SIGHTING_ROLLUP.add_reports(reports)
+    if ia.AUTO_UPDATE:
+        ia.ALERT_SCHEDULER.schedule(reports)
@@ -0,0 +1,266 @@
+import threading
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import src.store.sightings as sg
+import src.store.sighting_log as slog
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+NATIONWIDE = '全国'
+PERIOD_FREQS = {    # 集計単位 → pandasの期間種別
+    '週': 'W-SUN',
+    '月': 'M',
+    '四半期': 'Q',
+    '年': 'Y'
+}
+HASH_COLUMNS = ['animal', 'pref_name', 'date', 'head']    # 区間の変更検出に用いる列
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class SightingRollup:
+    """出没頭数ロールアップ
+
+    (動物名, 都道府県名, 集計区間)ごとの出没頭数と出没件数を密な配列で保持する
+    集計区間は週と月の境界の両方で区切った区間(週の月またぎ部分を分けたもの)とし、
+    週・月・四半期・年の合計はいずれも区間の連続した範囲の和として切り出せる
+    都道府県の先頭は全国の合計とし、地域を問わない集計も同じ切り出しで求める
+    新しい出没情報はaddで加算するだけで反映され、既存の区間を集計し直すことはない
+    登録フォームから登録された目撃情報は書き込み時にadd_reportsで加算される
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """初期化処理"""
+        self.animals = {}
+        self.prefectures = {NATIONWIDE: 0}
+        self._starts = np.array([], dtype='datetime64[D]')
+        self._heads = np.zeros((0, 1, 0), dtype=np.int64)
+        self._rows = np.zeros((0, 1, 0), dtype=np.int64)
+        self._segments = np.zeros(0, dtype=np.uint64)    # 区間ごとの元ファイルの行のハッシュ値の和
+        self._groups = {}
+        self._source = None
+        self._report_id = None    # 加算済みの登録された目撃情報の番号(未読み込みのときNone)
+
+    def sync(self, repository: sg.SightingsRepository=sg.SIGHTINGS, reports_path: Path=slog.SIGHTING_DB_PATH):
+        """目撃情報リポジトリとの同期処理
+
+        リポジトリが元ファイルを読み直したときは、行が変わった区間だけを集計し直す
+        初回は登録された目撃情報も読み込み、以降はadd_reportsによる加算で反映する
+
+        Args:
+            repository (SightingsRepository): 目撃情報リポジトリ
+            reports_path (Path): 登録された目撃情報のSQLiteのパス(Noneのとき読み込まない)
+
+        """
+        df = repository.frame()
+        with self._lock:
+            if self._source is not df:
+                self._replace_source(df)
+                self._source = df
+            if self._report_id is not None:
+                return
+            self._report_id = 0
+
+        if reports_path is not None and Path(reports_path).exists():
+            self.add_reports(slog.read_reports(reports_path))
+
+    def add(self, df: pd.DataFrame):
+        """出没情報加算処理
+
+        Args:
+            df (DataFrame): animal, pref_name, date, head の列を持つ出没情報
+
+        """
+        with self._lock:
+            self._add(df)
+
+    def add_reports(self, reports: pd.DataFrame):
+        """登録された目撃情報加算処理
+
+        未加算の番号のものだけを加算する(初回の同期の前に呼ばれたときは同期時にまとめて読み込む)
+        都道府県は住所の先頭から求め、求められないときは全国の合計にのみ加算する
+
+        Args:
+            reports (DataFrame): id, date, animal, head, address の列を持つ登録された目撃情報
+
+        """
+        with self._lock:
+            if self._report_id is None or len(reports) == 0:
+                return
+
+            reports = reports[reports['id'] > self._report_id]
+            if len(reports) == 0:
+                return
+
+            prefectures = [name for name in self.prefectures if name != NATIONWIDE]
+            self._add(
+                pd.DataFrame({
+                    'animal': reports['animal'].to_numpy(),
+                    'pref_name': [
+                        next((name for name in prefectures if str(address).startswith(name)), NATIONWIDE)
+                        for address in reports['address'].fillna('')
+                    ],
+                    'date': pd.to_datetime(reports['date']).to_numpy(),
+                    'head': reports['head'].to_numpy(dtype=np.int64)
+                })
+            )
+            self._report_id = int(reports['id'].max())
+
+    def totals(self, animal: str, pref_name: str=NATIONWIDE, unit: str='週') -> pd.DataFrame:
+        """期間別出没頭数取得処理
+
+        Args:
+            animal (str): 動物名
+            pref_name (str): 都道府県名(全国のとき全都道府県の合計)
+            unit (str): 集計単位(週、月、四半期、年)
+
+        Returns:
+            DataFrame: 集計単位の列(期間の文字列表記)と head の列を持つ、出没のあった期間の合計
+
+        """
+        with self._lock:
+            a = self.animals.get(animal)
+            p = self.prefectures.get(pref_name)
+            (starts, labels) = self._groups.get(unit, (np.array([], dtype=np.int64), np.array([])))
+            if a is None or p is None or len(starts) == 0:
+                return pd.DataFrame({unit: pd.Series(dtype=str), 'head': pd.Series(dtype=np.int64)})
+
+            heads = np.add.reduceat(self._heads[a, p], starts)
+            rows = np.add.reduceat(self._rows[a, p], starts)
+
+        # 出没情報のない期間は除く(生データをgroupbyした場合と同じ結果になる)
+        observed = rows > 0
+        return pd.DataFrame({unit: labels[observed], 'head': heads[observed]})
+
+    def _replace_source(self, df: pd.DataFrame):
+        # 区間ごとの行のハッシュ値の和を比べ、変わった区間だけ旧い行を減算して新しい行を加算する
+        new_slots = np.array([], dtype=np.int64)
+        if len(df):
+            dates = df['date'].to_numpy().astype('datetime64[D]')
+            self._extend_timeline(dates.min(), dates.max())
+            new_slots = self._slots(dates)
+        segments = np.zeros(len(self._starts), dtype=np.uint64)
+        np.add.at(segments, new_slots, _row_hashes(df) if len(df) else np.array([], dtype=np.uint64))
+        changed = np.flatnonzero(segments != self._segments)
+
+        if self._source is not None and len(self._source):
+            old = self._source
+            old_slots = self._slots(old['date'].to_numpy().astype('datetime64[D]'))
+            self._add(old[np.isin(old_slots, changed)], sign=-1)
+        self._add(df[np.isin(new_slots, changed)])
+        self._segments = segments
+
+    def _slots(self, dates: np.ndarray) -> np.ndarray:
+        # 日付が属する区間の位置
+        return np.searchsorted(self._starts, dates, side='right') - 1
+
+    def _add(self, df: pd.DataFrame, sign: int=1):
+        if len(df) == 0:
+            return
+
+        dates = pd.to_datetime(df['date']).to_numpy().astype('datetime64[D]')
+        self._extend_timeline(dates.min(), dates.max())
+        a = self._axis_index(self.animals, df['animal'])
+        p = self._axis_index(self.prefectures, df['pref_name'])
+        self._grow()
+
+        slots = self._slots(dates)
+        heads = df['head'].to_numpy(dtype=np.int64) * sign
+        # 都道府県別(都道府県が不明なものを除く)と全国の両方へ加算する
+        prefectural = p != 0
+        for (rows, index) in ((prefectural, p[prefectural]), (slice(None), np.zeros_like(p))):
+            np.add.at(self._heads, (a[rows], index, slots[rows]), heads[rows])
+            np.add.at(self._rows, (a[rows], index, slots[rows]), sign)
+
+    def _axis_index(self, axis: dict, values: pd.Series) -> np.ndarray:
+        # 未登録の値を末尾に追加し、各行の番号を返す
+        (uniques, inverse) = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+        for value in uniques:
+            axis.setdefault(value, len(axis))
+
+        return np.array([axis[value] for value in uniques], dtype=np.int64)[inverse]
+
+    def _grow(self):
+        # 動物名・都道府県名の追加分だけ配列を広げる
+        pad = [
+            (0, len(self.animals) - self._heads.shape[0]),
+            (0, len(self.prefectures) - self._heads.shape[1]),
+            (0, 0)
+        ]
+        self._heads = np.pad(self._heads, pad)
+        self._rows = np.pad(self._rows, pad)
+
+    def _extend_timeline(self, first: np.datetime64, last: np.datetime64):
+        # 区間は年単位で確保し、範囲外の日付が来たときだけ作り直す
+        if len(self._starts) and self._starts[0] <= first and last < self._end:
+            return
+
+        if len(self._starts):
+            first = min(first, self._starts[0])
+            last = max(last, self._end - np.timedelta64(1, 'D'))
+        years = pd.period_range(
+            pd.Timestamp(first).to_period('Y'),
+            pd.Timestamp(last).to_period('Y'),
+            freq='Y'
+        )
+        days = pd.date_range(years[0].start_time, years[-1].end_time.normalize(), freq='D')
+
+        # 月曜日または月初を区間の開始日とする
+        boundary = (days.dayofweek == 0) | (days.day == 1)
+        starts = days[boundary].to_numpy().astype('datetime64[D]')
+
+        # 既存の区間は新しい区間の一部となるため、値を対応する位置へ移す
+        if len(self._starts):
+            positions = np.searchsorted(starts, self._starts)
+            heads = np.zeros(self._heads.shape[:2] + (len(starts),), dtype=np.int64)
+            rows = np.zeros_like(heads)
+            heads[:, :, positions] = self._heads
+            rows[:, :, positions] = self._rows
+            segments = np.zeros(len(starts), dtype=np.uint64)
+            segments[positions] = self._segments
+            (self._heads, self._rows, self._segments) = (heads, rows, segments)
+        else:
+            self._heads = np.zeros(self._heads.shape[:2] + (len(starts),), dtype=np.int64)
+            self._rows = np.zeros_like(self._heads)
+            self._segments = np.zeros(len(starts), dtype=np.uint64)
+
+        self._starts = starts
+        self._end = (years[-1].end_time.normalize() + pd.Timedelta(days=1)).to_datetime64().astype(
+            'datetime64[D]'
+        )
+        self._groups = {
+            unit: _period_groups(days[boundary], freq) for unit, freq in PERIOD_FREQS.items()
+        }
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def load_rollup() -> SightingRollup:
+    """出没頭数ロールアップ取得処理
+
+    Returns:
+        SightingRollup: 目撃情報リポジトリと同期済みのロールアップ
+
+    """
+    SIGHTING_ROLLUP.sync()
+    return SIGHTING_ROLLUP
+
+def _row_hashes(df: pd.DataFrame) -> np.ndarray:
+    # 集計に関わる列の値から行ごとのハッシュ値を求める
+    return pd.util.hash_pandas_object(df[HASH_COLUMNS], index=False).to_numpy(dtype=np.uint64)
+
+def _period_groups(starts: pd.DatetimeIndex, freq: str) -> tuple:
+    # 区間の開始日を期間に変換し、期間が切り替わる区間の位置と期間の文字列表記を返す
+    periods = starts.to_period(freq)
+    codes = periods.asi8
+    changed = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+
+    return (changed, periods[changed].astype(str).to_numpy())
+
+SIGHTING_ROLLUP = SightingRollup()
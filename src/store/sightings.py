@@ -0,0 +1,171 @@
+import os
+import threading
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+#==================================================================================================#
+# 定数
+#--------------------------------------------------------------------------------------------------#
+BASEPATH = Path(os.path.dirname(os.path.abspath(__file__))).parent.parent
+# data を置くルートは環境変数で上書き可能(合成データでの計測等)
+SIGHTINGS_PATH = Path(os.environ.get('WHM_DATA_ROOT', BASEPATH)).joinpath('data', 'fauna', '全国危険生物出没情報一覧.csv')
+CSV_ENCODING = 'cp932'
+SIGHTING_DTYPES = {
+    'pref_code': 'int32',
+    'pref_name': 'category',
+    'city_code': 'int32',
+    'city_name': 'category',
+    'animal': 'category',
+    'year': 'int32',    # 出没年月(年×100+月)の計算で桁あふれしないよう int32 とする
+    'month': 'int8',
+    'lat': 'float32',
+    'lon': 'float32',
+    'head': 'int32',
+    'category': 'category'
+}
+SIGHTING_COLUMNS = [
+    'pref_code', 'pref_name', 'city_code', 'city_name',
+    'animal', 'date', 'year', 'month', 'lat', 'lon', 'head', 'category'
+]
+
+#==================================================================================================#
+# クラス
+#--------------------------------------------------------------------------------------------------#
+class SightingsRepository:
+    """目撃情報リポジトリ
+
+    全国危険生物出没情報一覧をプロセス内で一度だけ読み込み、省メモリな型で保持する
+    内部では出没日の昇順に並べて保持し、期間指定は二分探索による切り出しで行う
+    元ファイルの更新日時とサイズが変わったときは読み直す
+
+    Args:
+        path (Path): 全国危険生物出没情報一覧のCSVパス(cp932)
+
+    """
+    def __init__(self, path: Path=SIGHTINGS_PATH):
+        self.path = Path(path)
+        self._stamp = None
+        self._df = None
+        self._lock = threading.Lock()
+
+    def frame(self) -> pd.DataFrame:
+        """全件取得処理
+
+        Returns:
+            DataFrame: 出没日の昇順に並んだ全件(読み取り専用として扱うこと)
+
+        """
+        stat = self.path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if self._stamp != stamp:
+                self._df = read_sightings(self.path)
+                self._stamp = stamp
+
+            return self._df
+
+    def animals(self) -> list:
+        """動物名一覧取得処理
+
+        Returns:
+            list: 直近に出没したものから順に並べた動物名
+
+        """
+        return _recent_unique(self.frame(), 'animal')
+
+    def prefectures(self) -> list:
+        """都道府県名一覧取得処理
+
+        Returns:
+            list: 直近に出没したものから順に並べた都道府県名
+
+        """
+        return _recent_unique(self.frame(), 'pref_name')
+
+    def date_range(self) -> tuple:
+        """出没日の範囲取得処理
+
+        Returns:
+            tuple: (最小の出没日, 最大の出没日)
+
+        """
+        df = self.frame()
+        return (df['date'].iloc[0], df['date'].iloc[-1])
+
+    def select(
+        self,
+        animal: str=None,
+        pref_name: str=None,
+        start=None,
+        end=None
+    ) -> pd.DataFrame:
+        """目撃情報抽出処理
+
+        Args:
+            animal (str): 動物名(Noneのとき全て)
+            pref_name (str): 都道府県名(Noneのとき全国)
+            start (date): 出没日の下限(当日を含む、Noneのとき制限なし)
+            end (date): 出没日の上限(当日を含む、Noneのとき制限なし)
+
+        Returns:
+            DataFrame: 出没日の降順に並んだ抽出結果
+
+        """
+        df = self.frame()
+
+        # 出没日の昇順に並んでいるため、期間は二分探索で切り出す
+        dates = df['date'].to_numpy()
+        lower = 0 if start is None else np.searchsorted(
+            dates, np.datetime64(pd.Timestamp(start)), side='left'
+        )
+        upper = len(df) if end is None else np.searchsorted(
+            dates, np.datetime64(pd.Timestamp(end)), side='right'
+        )
+        df = df.iloc[lower:upper]
+
+        mask = np.ones(len(df), dtype=bool)
+        if animal is not None:
+            mask &= (df['animal'] == animal).to_numpy()
+        if pref_name is not None:
+            mask &= (df['pref_name'] == pref_name).to_numpy()
+
+        return df[mask].iloc[::-1]
+
+#==================================================================================================#
+# 関数
+#--------------------------------------------------------------------------------------------------#
+def read_sightings(path: Path=SIGHTINGS_PATH) -> pd.DataFrame:
+    """目撃情報読み込み処理
+
+    CSVを読み込み、カテゴリ・datetime64・float32等の省メモリな型へ変換して出没日の昇順に並べる
+
+    Args:
+        path (Path): 全国危険生物出没情報一覧のCSVパス(cp932)
+
+    Returns:
+        DataFrame: 目撃情報
+
+    """
+    df = pd.read_csv(
+        path,
+        index_col=0,
+        encoding=CSV_ENCODING,
+        dtype={col: dtype for col, dtype in SIGHTING_DTYPES.items() if dtype == 'category'}
+    )
+    df['date'] = pd.to_datetime(df['date'], format='%Y/%m/%d')
+    df = df[SIGHTING_COLUMNS].astype(
+        {col: dtype for col, dtype in SIGHTING_DTYPES.items() if dtype != 'category'}
+    )
+
+    return df.sort_values(by=['date'], ascending=True, kind='stable')
+
+def _recent_unique(df: pd.DataFrame, column: str) -> list:
+    # 出没日の降順で最初に現れた順に並べる(カテゴリの番号で重複を除く)
+    codes = df[column].cat.codes.to_numpy()[::-1]
+    _, first = np.unique(codes, return_index=True)
+    order = np.sort(first)
+    categories = df[column].cat.categories
+    return [categories[code] for code in codes[order] if code >= 0]
+
+SIGHTINGS = SightingsRepository()